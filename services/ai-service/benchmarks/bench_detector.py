@@ -0,0 +1,410 @@
+"""
+Detector Benchmark and Regression Suite
+Generates synthetic metric series with known injected anomalies (spikes,
+level shifts) on top of daily seasonality, noise and data gaps, then runs
+every detection method through both the CLI main() path and the direct
+class/function path. Latency, peak memory, precision and recall are
+recorded and optionally compared against a JSON baseline. Fully offline.
+
+Usage (from services/ai-service):
+    python benchmarks/bench_detector.py --scales 100 1000 10000
+    python benchmarks/bench_detector.py --save-baseline benchmarks/detector_baseline.json
+    python benchmarks/bench_detector.py --baseline benchmarks/detector_baseline.json
+
+The feature engine is also compared against the pandas implementation it
+replaced (kept below as the reference): time, peak memory and the largest
+per-column difference, on the plain series and on variants with a non-UTC
+offset and with zero values (infinite pct_change). A parity failure makes
+the exit code 1.
+
+The forecast suite fits a fleet of one-day series at once, half of them
+trending towards a maximum they reach within about two hours, and reports
+latency, peak memory, how many trending series got a predicted breach and
+how many flat ones got a false one.
+
+Scales up to 10,000,000 points are supported; each point is a dict, so the
+largest scales need several GB of memory, and the CLI path additionally
+serializes the whole series to JSON.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import anomaly_detection  # noqa: E402
+from feature_engine import FEATURE_COLUMNS, FeatureEngine  # noqa: E402
+
+DEFAULT_SCALES = [100, 1000, 10000]
+DEFAULT_METHODS = ['isolation_forest', 'threshold']
+PATHS = ['class', 'cli']
+DEFAULT_FORECAST_FLEETS = [100, 1000, 5000]
+
+POINTS_PER_DAY = 288  # 5-minute datapoints
+LEVEL_SHIFT_LABELLED_POINTS = 3  # points after a level shift that count as anomalous
+
+# Runs the CLI entry point exactly as ai-service does (JSON on stdin, JSON on
+# stdout) and reports the child's peak RSS on stderr
+CLI_WRAPPER = (
+    "import resource, runpy, sys\n"
+    "sys.argv = [sys.argv[1]]\n"
+    "runpy.run_path(sys.argv[0], run_name='__main__')\n"
+    "sys.stderr.write('MAXRSS=%d' % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+)
+
+
+def generate_series(n_points, seed=0, spike_rate=0.01, level_shifts=2, gap_rate=0.005,
+                    base=50.0, amplitude=15.0, noise=2.0):
+    """
+    Build a synthetic 5-minute series; returns (metrics_data, anomaly_indices, thresholds)
+    where anomaly_indices are positions in metrics_data that were injected as anomalies
+    """
+    rng = np.random.default_rng(seed)
+    total = n_points
+
+    # Gaps: drop whole runs of points so timestamps jump
+    gap_mask = np.zeros(total, dtype=bool)
+    n_gaps = int(total * gap_rate / 10)
+    for start in rng.integers(0, max(1, total - 10), size=n_gaps):
+        gap_mask[start:start + 10] = True
+
+    steps = np.arange(total)
+    values = base + amplitude * np.sin(2 * np.pi * steps / POINTS_PER_DAY) + rng.normal(0, noise, total)
+
+    labels = np.zeros(total, dtype=bool)
+
+    # Level shifts: persistent offset; only the first few points are labelled anomalous
+    for start in rng.integers(total // 10, max(total // 10 + 1, total - 1), size=level_shifts):
+        values[start:] += rng.choice([-1, 1]) * amplitude * 1.5
+        labels[start:start + LEVEL_SHIFT_LABELLED_POINTS] = True
+
+    # Spikes: single-point excursions well outside the seasonal band
+    n_spikes = max(1, int(total * spike_rate))
+    spike_positions = rng.choice(total, size=n_spikes, replace=False)
+    values[spike_positions] += rng.choice([-1, 1], size=n_spikes) * rng.uniform(6, 10, size=n_spikes) * amplitude
+    labels[spike_positions] = True
+
+    keep = ~gap_mask
+    values = values[keep]
+    labels = labels[keep]
+    steps = steps[keep]
+
+    start_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    metrics_data = [
+        {
+            'timestamp': (start_time + timedelta(minutes=5 * int(step))).isoformat(),
+            'metricValue': float(value),
+            'metricName': 'CPUUtilization'
+        }
+        for step, value in zip(steps, values)
+    ]
+
+    # Threshold band wide enough to contain seasonality, noise and level shifts
+    band = amplitude * 1.5 * level_shifts + amplitude + 4 * noise
+    thresholds = {'CPUUtilization': {'min': base - band, 'max': base + band}}
+
+    return metrics_data, set(np.flatnonzero(labels).tolist()), thresholds
+
+
+def score(result, truth):
+    """Precision and recall of the reported anomaly indices against the injected ones"""
+    detected = {a['index'] for a in result.get('anomalies', [])}
+    true_positives = len(detected & truth)
+    precision = true_positives / len(detected) if detected else 0.0
+    recall = true_positives / len(truth) if truth else 1.0
+    return round(precision, 4), round(recall, 4)
+
+
+def run_class_path(method, metrics_data, thresholds):
+    tracemalloc.start()
+    started = time.perf_counter()
+    if method == 'isolation_forest':
+        result = anomaly_detection.MetricsAnomalyDetector().detect_anomalies(metrics_data)
+    elif method == 'threshold':
+        result = anomaly_detection.detect_threshold_anomalies(metrics_data, thresholds)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+    latency = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, latency, peak
+
+
+def run_cli_path(method, metrics_data, thresholds):
+    payload = json.dumps({'method': method, 'metrics_data': metrics_data, 'thresholds': thresholds})
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-c', CLI_WRAPPER, os.path.join(SRC_DIR, 'anomaly_detection.py')],
+        input=payload, capture_output=True, text=True
+    )
+    latency = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"CLI run failed: {proc.stderr[-2000:]}")
+
+    peak = 0
+    for line in proc.stderr.splitlines():
+        if line.startswith('MAXRSS='):
+            # ru_maxrss is KiB on Linux
+            peak = int(line.split('=', 1)[1]) * 1024
+    return json.loads(proc.stdout), latency, peak
+
+
+def run_suite(scales, methods, paths, repeats, seed):
+    results = {}
+    for scale in scales:
+        metrics_data, truth, thresholds = generate_series(scale, seed=seed)
+        for method in methods:
+            for path in paths:
+                latencies = []
+                peak = 0
+                result = None
+                for _ in range(repeats):
+                    runner = run_class_path if path == 'class' else run_cli_path
+                    result, latency, run_peak = runner(method, metrics_data, thresholds)
+                    latencies.append(latency)
+                    peak = max(peak, run_peak)
+
+                precision, recall = score(result, truth)
+                key = f"{method}/{path}/{scale}"
+                results[key] = {
+                    'method': method,
+                    'path': path,
+                    'points': len(metrics_data),
+                    'injected_anomalies': len(truth),
+                    'detected_anomalies': result.get('anomaly_count', 0),
+                    'latency_seconds': round(min(latencies), 6),
+                    'peak_memory_bytes': peak,
+                    'precision': precision,
+                    'recall': recall,
+                    'error': result.get('error')
+                }
+                print(f"{key}: {results[key]['latency_seconds']:.4f}s, "
+                      f"{peak / 1e6:.1f} MB, precision={precision}, recall={recall}", file=sys.stderr)
+    return results
+
+
+def pandas_reference_features(metrics_data):
+    """The pandas prepare_features the NumPy engine replaced; the parity and speed reference"""
+    import pandas as pd
+
+    df = pd.DataFrame(metrics_data)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values('timestamp')
+    df['hour'] = df['timestamp'].dt.hour
+    df['day_of_week'] = df['timestamp'].dt.dayofweek
+    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+    df['value_rolling_mean_12'] = df['metricValue'].rolling(window=12, min_periods=1).mean()
+    df['value_rolling_std_12'] = df['metricValue'].rolling(window=12, min_periods=1).std()
+    df['value_rolling_mean_24'] = df['metricValue'].rolling(window=24, min_periods=1).mean()
+    df['value_diff'] = df['metricValue'].diff()
+    df['value_pct_change'] = df['metricValue'].pct_change()
+    df['z_score'] = (df['metricValue'] - df['value_rolling_mean_12']) / (df['value_rolling_std_12'] + 1e-6)
+    df = df.fillna(0)
+    return df[FEATURE_COLUMNS].values
+
+
+def feature_variants(metrics_data):
+    """The series as generated, shifted to a +05:30 offset, and with every 50th value zero"""
+    offset = timezone(timedelta(hours=5, minutes=30))
+    yield 'utc', metrics_data
+    yield 'offset', [
+        {**point, 'timestamp': datetime.fromisoformat(point['timestamp']).astimezone(offset).isoformat()}
+        for point in metrics_data
+    ]
+    yield 'zeros', [
+        {**point, 'metricValue': 0.0} if position % 50 == 0 else point
+        for position, point in enumerate(metrics_data)
+    ]
+
+
+def max_column_errors(reference, features):
+    """Largest relative difference per feature column; infinities must match exactly"""
+    errors = {}
+    for column, name in enumerate(FEATURE_COLUMNS):
+        expected = reference[:, column].astype(np.float64)
+        actual = features[:, column].astype(np.float64)
+        finite = np.isfinite(expected)
+        if not np.array_equal(np.isfinite(actual), finite) or \
+                not np.array_equal(expected[~finite], actual[~finite]):
+            errors[name] = float('inf')
+            continue
+        diff = np.abs(expected[finite] - actual[finite]) / (np.abs(expected[finite]) + 1.0)
+        errors[name] = float(diff.max()) if diff.size else 0.0
+    return errors
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    latency = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, latency, peak
+
+
+def run_feature_suite(scales, repeats, seed, max_error):
+    """pandas reference vs NumPy engine: latency, peak memory and parity per scale and variant"""
+    results = {}
+    engine = FeatureEngine(reuse_buffers=False)
+    for scale in scales:
+        metrics_data, _, _ = generate_series(scale, seed=seed)
+        for variant, data in feature_variants(metrics_data):
+            runs = {}
+            for name, func in (('pandas', pandas_reference_features), ('numpy', lambda d: engine.compute(d).matrix)):
+                measured = [measure(func, data) for _ in range(repeats)]
+                runs[name] = (measured[0][0], min(m[1] for m in measured), max(m[2] for m in measured))
+
+            errors = max_column_errors(runs['pandas'][0], runs['numpy'][0])
+            key = f"features/{variant}/{scale}"
+            results[key] = {
+                'points': len(data),
+                'pandas_latency_seconds': round(runs['pandas'][1], 6),
+                'numpy_latency_seconds': round(runs['numpy'][1], 6),
+                'pandas_peak_memory_bytes': runs['pandas'][2],
+                'numpy_peak_memory_bytes': runs['numpy'][2],
+                'speedup': round(runs['pandas'][1] / runs['numpy'][1], 2) if runs['numpy'][1] else None,
+                'max_relative_error': errors,
+                'parity': all(error <= max_error for error in errors.values())
+            }
+            print(f"{key}: pandas {runs['pandas'][1]:.4f}s/{runs['pandas'][2] / 1e6:.1f} MB, "
+                  f"numpy {runs['numpy'][1]:.4f}s/{runs['numpy'][2] / 1e6:.1f} MB, "
+                  f"parity={results[key]['parity']}", file=sys.stderr)
+    return results
+
+
+def forecast_fleet(n_series, seed, threshold=90.0):
+    """
+    One-day series, each in a group with an idle companion resource (as a
+    service group holds several resources); the even series rise linearly
+    and reach `threshold` two hours after their last point
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    timestamps = [(start + timedelta(minutes=5 * i)).isoformat() for i in range(POINTS_PER_DAY)]
+    groups = []
+    for index in range(n_series):
+        values = 50 + rng.normal(0, 1.0, POINTS_PER_DAY)
+        if index % 2 == 0:
+            # Linear crossing 24 steps (2 hours) after the last point
+            values += np.arange(POINTS_PER_DAY) * (threshold - 50) / (POINTS_PER_DAY + 24)
+        idle = 10 + rng.normal(0, 0.5, POINTS_PER_DAY)
+        metrics_data = []
+        for resource_id, series_values in ((f"r{index}", values), (f"r{index}-idle", idle)):
+            metrics_data.extend({'timestamp': ts, 'resourceId': resource_id, 'metricName': 'CPUUtilization',
+                                 'statistic': 'Average', 'metricValue': float(value)}
+                                for ts, value in zip(timestamps, series_values))
+        groups.append({
+            'name': f"series-{index}",
+            'method': 'forecast',
+            'thresholds': {'CPUUtilization': {'max': threshold}},
+            'metrics_data': metrics_data
+        })
+    return groups
+
+
+def run_forecast_suite(fleets, repeats, seed):
+    """Batched breach forecasting over whole fleets: latency, memory, detected and false breaches"""
+    results = {}
+    for n_series in fleets:
+        groups = forecast_fleet(n_series, seed)
+        measured = [measure(anomaly_detection.detect_anomalies_batch, groups, 'forecast') for _ in range(repeats)]
+        result = measured[0][0]
+        breaching = {breach['resource_id'] for group in result['groups'].values()
+                     for breach in group['predicted_breaches']}
+        flagged = [i for i in range(n_series) if f"r{i}" in breaching]
+        # Idle companions never breach; one flagged means series were mixed up
+        flagged_idle = sum(1 for i in range(n_series) if f"r{i}-idle" in breaching)
+        trending = (n_series + 1) // 2
+        latency = min(m[1] for m in measured)
+        key = f"forecast/{n_series}"
+        results[key] = {
+            'series': n_series,
+            'points': 2 * n_series * POINTS_PER_DAY,
+            'latency_seconds': round(latency, 6),
+            'peak_memory_bytes': max(m[2] for m in measured),
+            'series_per_second': round(n_series / latency, 1) if latency else None,
+            'breach_recall': round(sum(1 for i in flagged if i % 2 == 0) / trending, 4) if trending else None,
+            'false_breach_rate': round((sum(1 for i in flagged if i % 2) + flagged_idle)
+                                       / max(2 * n_series - trending, 1), 4)
+        }
+        print(f"{key}: {latency:.3f}s, recall {results[key]['breach_recall']}, "
+              f"false {results[key]['false_breach_rate']}", file=sys.stderr)
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance, quality_tolerance):
+    """Flag slower/larger runs beyond `tolerance` and precision/recall drops beyond `quality_tolerance`"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get('results', {}).get(key) or baseline.get('forecast', {}).get(key)
+        if not previous:
+            continue
+        for name in ('latency_seconds', 'peak_memory_bytes'):
+            if previous.get(name) and (current[name] - previous[name]) / previous[name] > tolerance:
+                regressions.append({'run': key, 'metric': name, 'baseline': previous[name], 'current': current[name]})
+        for name in ('precision', 'recall'):
+            if previous.get(name) is not None and previous[name] - current[name] > quality_tolerance:
+                regressions.append({'run': key, 'metric': name, 'baseline': previous[name], 'current': current[name]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark anomaly detection methods on synthetic series')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS)
+    parser.add_argument('--repeats', type=int, default=1, help='Runs per case; the fastest is reported')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--baseline', help='Compare against a saved baseline JSON')
+    parser.add_argument('--save-baseline', help='Write the results as a new baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative latency/memory growth')
+    parser.add_argument('--quality-tolerance', type=float, default=0.05, help='Allowed precision/recall drop')
+    parser.add_argument('--skip-features', action='store_true', help='Skip the feature engine comparison')
+    parser.add_argument('--feature-max-error', type=float, default=1e-5,
+                        help='Allowed relative feature difference from the pandas reference (float32 storage)')
+    parser.add_argument('--skip-forecast', action='store_true', help='Skip the batched forecast suite')
+    parser.add_argument('--forecast-fleets', type=int, nargs='+', default=DEFAULT_FORECAST_FLEETS,
+                        help='Series counts for the forecast suite')
+    args = parser.parse_args()
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'results': run_suite(args.scales, args.methods, args.paths, args.repeats, args.seed)
+    }
+
+    exit_code = 0
+    if not args.skip_features:
+        report['features'] = run_feature_suite(args.scales, args.repeats, args.seed, args.feature_max_error)
+        exit_code = 0 if all(result['parity'] for result in report['features'].values()) else 1
+
+    if not args.skip_forecast:
+        report['forecast'] = run_forecast_suite(args.forecast_fleets, args.repeats, args.seed)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare_to_baseline(
+            {**report['results'], **report.get('forecast', {})}, baseline, args.tolerance, args.quality_tolerance)
+        exit_code = 1 if report['regressions'] else exit_code
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
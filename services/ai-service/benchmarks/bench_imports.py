@@ -0,0 +1,158 @@
+"""
+Cold Start Benchmark for the Detector
+Runs each case in a fresh interpreter under `python -X importtime` and
+reports wall time, total import time and the slowest imports. Each case
+also lists modules that must stay unloaded on that path (the threshold check
+must not load numpy, pandas or scikit-learn); loading one is always a
+regression, independent of the machine.
+
+Usage (from services/ai-service):
+    python benchmarks/bench_imports.py
+    python benchmarks/bench_imports.py --save-baseline benchmarks/imports_baseline.json
+    python benchmarks/bench_imports.py --baseline benchmarks/imports_baseline.json
+
+Exit code is 1 when a forbidden module is loaded, or with --baseline when a
+case's time regresses by more than --tolerance (default 50%).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+HEAVY_MODULES = ['numpy', 'pandas', 'sklearn']
+
+THRESHOLD_INPUT = json.dumps({
+    'method': 'threshold',
+    'thresholds': {'CPUUtilization': {'max': 90}},
+    'metrics_data': [
+        {'timestamp': f"2024-01-01T00:{minute:02d}:00Z", 'metricName': 'CPUUtilization', 'metricValue': value}
+        for minute, value in enumerate([40, 45, 95, 50])
+    ],
+    'score_after': '2024-01-01T00:00:00Z'
+})
+
+# name -> (code run in the child, stdin, modules that must not be loaded)
+CASES = {
+    'import': ("import anomaly_detection", None, HEAVY_MODULES),
+    'threshold_cli': (
+        "import runpy, sys\n"
+        f"sys.argv = [{os.path.join(SRC_DIR, 'anomaly_detection.py')!r}]\n"
+        "runpy.run_path(sys.argv[0], run_name='__main__')",
+        THRESHOLD_INPUT, HEAVY_MODULES),
+    'isolation_forest_setup': ("import anomaly_detection\nanomaly_detection.MetricsAnomalyDetector()", None, []),
+}
+
+# Prints the loaded top-level packages on stderr after the case ran
+MODULES_SUFFIX = (
+    "\nimport sys as _sys, json as _json\n"
+    "_sys.stderr.write('\\nMODULES=' + _json.dumps(sorted({m.split('.')[0] for m in _sys.modules})) + '\\n')\n"
+)
+
+TRACKED_RESULTS = ['wall_time_seconds', 'import_time_seconds']
+
+
+def parse_importtime(stderr, top_n):
+    """(total seconds of top-level imports, slowest imports by cumulative time) from -X importtime output"""
+    total_us = 0
+    rows = []
+    for line in stderr.splitlines():
+        fields = line[len('import time:'):].split('|') if line.startswith('import time:') else []
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2]
+        # Nested imports are indented under the module that imported them
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += int(fields[1])
+        rows.append({'module': name.strip(), 'self_us': int(fields[0]), 'cumulative_us': int(fields[1])})
+    rows.sort(key=lambda row: row['cumulative_us'], reverse=True)
+    return total_us / 1e6, rows[:top_n]
+
+
+def run_case(name, top_n):
+    code, stdin, forbidden = CASES[name]
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code + MODULES_SUFFIX],
+        input=stdin or '', capture_output=True, text=True, cwd=SRC_DIR,
+        env={**os.environ, 'PYTHONPATH': SRC_DIR}
+    )
+    wall_time = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"Case {name} failed: {proc.stderr[-2000:]}")
+
+    loaded = []
+    for line in proc.stderr.splitlines():
+        if line.startswith('MODULES='):
+            loaded = json.loads(line[len('MODULES='):])
+    import_time, slowest = parse_importtime(proc.stderr, top_n)
+    return {
+        'wall_time_seconds': round(wall_time, 4),
+        'import_time_seconds': round(import_time, 4),
+        'forbidden_loaded': sorted(set(forbidden) & set(loaded)),
+        'slowest_imports': slowest
+    }
+
+
+def run_suite(cases, repeats, top_n):
+    results = {}
+    for name in cases:
+        runs = [run_case(name, top_n) for _ in range(repeats)]
+        results[name] = min(runs, key=lambda run: run['wall_time_seconds'])
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Cases that load a forbidden module or got slower than the baseline by more than the tolerance"""
+    regressions = []
+    for name, current in results.items():
+        if current['forbidden_loaded']:
+            regressions.append({'case': name, 'metric': 'forbidden_loaded', 'current': current['forbidden_loaded']})
+        previous = (baseline or {}).get('results', {}).get(name, {})
+        for metric in TRACKED_RESULTS:
+            if previous.get(metric) and (current[metric] - previous[metric]) / previous[metric] > tolerance:
+                regressions.append({
+                    'case': name,
+                    'metric': metric,
+                    'baseline': previous[metric],
+                    'current': current[metric],
+                    'change_percent': round((current[metric] - previous[metric]) / previous[metric] * 100, 1)
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold start and import time of the detector')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per case; the fastest is reported')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports listed per case')
+    parser.add_argument('--baseline', help='Compare against a saved baseline JSON')
+    parser.add_argument('--save-baseline', help='Write the results as a new baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative time growth')
+    args = parser.parse_args()
+
+    report = {
+        'python': sys.version.split()[0],
+        'results': run_suite(args.cases, args.repeats, args.top)
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report['regressions'] = compare_to_baseline(report['results'], baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    return 1 if report['regressions'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,46 @@
 """
 Anomaly Detection Module for Cloud Pulse 360
-Uses Isolation Forest for detecting anomalies in time series metrics
+Uses Isolation Forest for detecting anomalies in time series metrics, and
+batched Holt-Winters forecasts to predict threshold breaches before they happen
 """
 
-import numpy as np
-import pandas as pd
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import cProfile
+import io
 import json
+import os
+import pstats
 import sys
+import threading
+import time
 import warnings
+from collections import Counter
 
 warnings.filterwarnings('ignore')
 
+# numpy and scikit-learn are imported inside the Isolation Forest code path (pandas
+# only to parse unusual timestamp formats): they take most of a second to load,
+# and threshold checks need none of them
+
+def parse_epoch(value):
+    """Epoch seconds of an ISO-8601 timestamp (naive values are UTC), parsed without pandas"""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        import pandas as pd
+        parsed = pd.Timestamp(value).to_pydatetime()
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
 class MetricsAnomalyDetector:
     def __init__(self):
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import StandardScaler
+        from feature_engine import FeatureEngine
+        
+        # Feature buffers are reused across the series of a batch
+        self.features = FeatureEngine()
         self.scaler = StandardScaler()
         self.model = IsolationForest(
             contamination=0.1,  # Expected proportion of anomalies
@@ -25,47 +50,18 @@ class MetricsAnomalyDetector:
         
     def prepare_features(self, metrics_data):
         """
-        Prepare features for anomaly detection
+        Prepare features for anomaly detection: a float32 matrix with one row
+        per point (sorted by timestamp) and FEATURE_COLUMNS as columns
         """
-        df = pd.DataFrame(metrics_data)
-        
-        # Convert timestamp to datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
-        
-        # Extract time-based features
-        df['hour'] = df['timestamp'].dt.hour
-        df['day_of_week'] = df['timestamp'].dt.dayofweek
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-        
-        # Calculate rolling statistics
-        df['value_rolling_mean_12'] = df['metricValue'].rolling(window=12, min_periods=1).mean()
-        df['value_rolling_std_12'] = df['metricValue'].rolling(window=12, min_periods=1).std()
-        df['value_rolling_mean_24'] = df['metricValue'].rolling(window=24, min_periods=1).mean()
-        
-        # Calculate rate of change
-        df['value_diff'] = df['metricValue'].diff()
-        df['value_pct_change'] = df['metricValue'].pct_change()
-        
-        # Z-score from rolling mean
-        df['z_score'] = (df['metricValue'] - df['value_rolling_mean_12']) / (df['value_rolling_std_12'] + 1e-6)
-        
-        # Fill NaN values
-        df = df.fillna(0)
-        
-        # Select features for anomaly detection
-        feature_columns = [
-            'metricValue', 'hour', 'day_of_week', 'is_weekend',
-            'value_rolling_mean_12', 'value_rolling_std_12', 'value_rolling_mean_24',
-            'value_diff', 'value_pct_change', 'z_score'
-        ]
-        
-        return df, feature_columns
+        return self.features.compute(metrics_data)
     
-    def detect_anomalies(self, metrics_data):
+    def detect_anomalies(self, metrics_data, score_after=None):
         """
-        Detect anomalies in metrics data
+        Detect anomalies in metrics data. With score_after, every point is
+        used for features and model fitting but only later points are scored.
         """
+        import numpy as np
+        
         try:
             if len(metrics_data) < 10:
                 return {
@@ -76,13 +72,10 @@ class MetricsAnomalyDetector:
                     'message': 'Insufficient data points for anomaly detection (minimum 10 required)'
                 }
             
-            df, feature_columns = self.prepare_features(metrics_data)
-            
-            # Prepare features
-            X = df[feature_columns].values
+            features = self.prepare_features(metrics_data)
             
             # Scale features
-            X_scaled = self.scaler.fit_transform(X)
+            X_scaled = self.scaler.fit_transform(features.matrix)
             
             # Fit and predict anomalies
             anomaly_labels = self.model.fit_predict(X_scaled)
@@ -95,19 +88,25 @@ class MetricsAnomalyDetector:
             normalized_scores = (anomaly_scores - anomaly_scores.min()) / (anomaly_scores.max() - anomaly_scores.min())
             anomaly_scores_01 = 1 - normalized_scores  # Invert so higher = more anomalous
             
+            # Points up to score_after were scored by an earlier request
+            if score_after is None:
+                scored = np.ones(len(features), dtype=bool)
+            else:
+                scored = features.utc_us > round(parse_epoch(score_after) * 10**6)
+            scored_points = int(scored.sum())
+            
             # Create results
             anomalies = []
-            for idx, (is_anom, score) in enumerate(zip(is_anomaly, anomaly_scores_01)):
-                if is_anom:
-                    anomalies.append({
-                        'index': int(idx),
-                        'timestamp': df.iloc[idx]['timestamp'].isoformat(),
-                        'metric_value': float(df.iloc[idx]['metricValue']),
-                        'anomaly_score': float(score),
-                        'z_score': float(df.iloc[idx]['z_score']),
-                        'rolling_mean': float(df.iloc[idx]['value_rolling_mean_12']),
-                        'deviation_percent': float(abs(df.iloc[idx]['z_score']) * 100) if df.iloc[idx]['value_rolling_std_12'] > 0 else 0
-                    })
+            for idx in np.flatnonzero(is_anomaly & scored):
+                anomalies.append({
+                    'index': int(idx),
+                    'timestamp': features.isoformat(idx),
+                    'metric_value': float(features.values[idx]),
+                    'anomaly_score': float(anomaly_scores_01[idx]),
+                    'z_score': float(features.z_score[idx]),
+                    'rolling_mean': float(features.rolling_mean_12[idx]),
+                    'deviation_percent': float(abs(features.z_score[idx]) * 100) if features.rolling_std_12[idx] > 0 else 0
+                })
             
             # Sort by anomaly score (highest first)
             anomalies.sort(key=lambda x: x['anomaly_score'], reverse=True)
@@ -116,7 +115,8 @@ class MetricsAnomalyDetector:
                 'anomalies': anomalies,
                 'anomaly_count': len(anomalies),
                 'total_points': len(metrics_data),
-                'anomaly_rate': len(anomalies) / len(metrics_data),
+                'scored_points': scored_points,
+                'anomaly_rate': len(anomalies) / scored_points if scored_points else 0.0,
                 'model_params': {
                     'contamination': 0.1,
                     'n_estimators': 100
@@ -137,13 +137,16 @@ class MetricsAnomalyDetector:
                 'anomaly_rate': 0.0
             }
 
-def detect_threshold_anomalies(metrics_data, thresholds):
+def detect_threshold_anomalies(metrics_data, thresholds, score_after=None):
     """
     Simple threshold-based anomaly detection
     """
     anomalies = []
+    cutoff = parse_epoch(score_after) if score_after is not None else None
     
     for idx, point in enumerate(metrics_data):
+        if cutoff is not None and parse_epoch(point['timestamp']) <= cutoff:
+            continue
         value = point['metricValue']
         metric_name = point.get('metricName', 'unknown')
         
@@ -181,6 +184,164 @@ def detect_threshold_anomalies(metrics_data, thresholds):
         'detection_method': 'threshold_based'
     }
 
+def forecast_breaches(groups, thresholds=None, horizon_seconds=None):
+    """
+    Predict when each series of each group will cross its configured min/max.
+    A group may hold several resources, so a series is one (resourceId,
+    metricName, statistic); thresholds are looked up by metric name. All
+    series of all groups are fitted together in one vectorized pass; `groups`
+    is a list of (metrics_data, thresholds) and one result dict is returned
+    per group.
+    """
+    from forecasting import BatchForecaster, DEFAULT_HORIZON_SECONDS
+    
+    forecaster = BatchForecaster(horizon_seconds=float(horizon_seconds or DEFAULT_HORIZON_SECONDS))
+    series, limits, owners = [], [], []
+    results = []
+    for position, (metrics_data, group_thresholds) in enumerate(groups):
+        by_series = {}
+        for point in metrics_data:
+            key = (point.get('resourceId'), point.get('metricName', 'unknown'), point.get('statistic'))
+            by_series.setdefault(key, []).append(point)
+        
+        skipped = []
+        for (resource_id, metric_name, statistic), points in by_series.items():
+            labels = {'resource_id': resource_id, 'metric_name': metric_name, 'statistic': statistic}
+            prepared = forecaster.prepare(points)
+            if prepared is None:
+                skipped.append(labels)
+                continue
+            series.append(prepared)
+            limits.append((group_thresholds or thresholds or {}).get(metric_name, {}))
+            owners.append((position, labels))
+        results.append({
+            'anomalies': [],
+            'anomaly_count': 0,
+            'total_points': len(metrics_data),
+            'forecasts': [],
+            'predicted_breaches': [],
+            'insufficient_data': skipped,
+            'detection_method': 'forecast'
+        })
+    
+    for (position, labels), forecast in zip(owners, forecaster.forecast(series, limits)):
+        results[position]['forecasts'].append({**labels, **forecast})
+        results[position]['predicted_breaches'].extend(
+            {**labels, **breach} for breach in forecast['predicted_breaches'])
+    for result in results:
+        result['predicted_breaches'].sort(key=lambda breach: breach['seconds_until'])
+        result['breach_count'] = len(result['predicted_breaches'])
+    return results
+
+def detect_anomalies_batch(groups, method='isolation_forest', thresholds=None, horizon_seconds=None):
+    """
+    Run detection on many named groups in one call. Each group is a dict with
+    `name`, `metrics_data` and optionally `score_after`, `method` and
+    `thresholds`; results are keyed by group name, so groups sharing a name
+    are all rejected with an error rather than overwriting each other.
+    Forecast groups are collected and fitted together after the loop.
+    """
+    results = {}
+    detector = None
+    forecast_groups = {}
+    names = Counter(str(group.get('name', position)) for position, group in enumerate(groups))
+    
+    for position, group in enumerate(groups):
+        name = str(group.get('name', position))
+        if names[name] > 1:
+            results[name] = {
+                'error': f'Duplicate group name: {name} is used by {names[name]} groups',
+                'anomalies': [],
+                'anomaly_count': 0
+            }
+            continue
+        group_method = group.get('method', method)
+        metrics_data = group.get('metrics_data', [])
+        score_after = group.get('score_after')
+        
+        if group_method == 'forecast':
+            forecast_groups[name] = (metrics_data, group.get('thresholds', thresholds or {}))
+        elif group_method == 'isolation_forest':
+            # The model is refit on every call, so one detector serves all groups
+            detector = detector or MetricsAnomalyDetector()
+            results[name] = detector.detect_anomalies(metrics_data, score_after)
+        elif group_method == 'threshold':
+            results[name] = detect_threshold_anomalies(
+                metrics_data, group.get('thresholds', thresholds or {}), score_after)
+        else:
+            results[name] = {
+                'error': f'Unknown detection method: {group_method}',
+                'anomalies': [],
+                'anomaly_count': 0
+            }
+    
+    if forecast_groups:
+        for name, result in zip(forecast_groups, forecast_breaches(list(forecast_groups.values()),
+                                                                     horizon_seconds=horizon_seconds)):
+            results[name] = result
+    
+    return {
+        'groups': results,
+        'group_count': len(results),
+        'total_points': sum(r.get('total_points', 0) for r in results.values()),
+        'anomaly_count': sum(r.get('anomaly_count', 0) for r in results.values()),
+        'breach_count': sum(r.get('breach_count', 0) for r in results.values()),
+        'failed_groups': sorted(name for name, r in results.items() if r.get('error'))
+    }
+
+def profile_call(func, *args, top_n=30, sample_interval=0.005):
+    """
+    Run func under cProfile and a stack sampler; returns (result, profile)
+    where profile holds the top-N functions and folded stacks for flamegraphs
+    """
+    target_thread = threading.get_ident()
+    stacks = Counter()
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(sample_interval):
+            frame = sys._current_frames().get(target_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                stacks[';'.join(reversed(stack))] += 1
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        result = func(*args)
+    finally:
+        profiler.disable()
+        stop.set()
+        sampler.join()
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    top_functions = sorted(
+        (
+            {
+                'function': f"{function} ({os.path.basename(filename)}:{line})",
+                'ncalls': nc,
+                'tottime': round(tt, 6),
+                'cumtime': round(ct, 6)
+            }
+            for (filename, line, function), (cc, nc, tt, ct, _) in stats.stats.items()
+        ),
+        key=lambda row: row['cumtime'],
+        reverse=True
+    )[:top_n]
+
+    return result, {
+        'duration_seconds': round(time.perf_counter() - started, 6),
+        'top_functions': top_functions,
+        'folded_stacks': '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+    }
+
 def main():
     try:
         # Read input from stdin
@@ -188,13 +349,36 @@ def main():
         
         method = input_data.get('method', 'isolation_forest')
         metrics_data = input_data.get('metrics_data', [])
+        score_after = input_data.get('score_after')
+        profile = bool(input_data.get('profile', False))
+        horizon_seconds = input_data.get('horizon_seconds')
+        profile_data = None
         
-        if method == 'isolation_forest':
+        if 'groups' in input_data:
+            groups = input_data['groups']
+            thresholds = input_data.get('thresholds', {})
+            if profile:
+                result, profile_data = profile_call(detect_anomalies_batch, groups, method, thresholds, horizon_seconds)
+            else:
+                result = detect_anomalies_batch(groups, method, thresholds, horizon_seconds)
+        elif method == 'isolation_forest':
             detector = MetricsAnomalyDetector()
-            result = detector.detect_anomalies(metrics_data)
+            if profile:
+                result, profile_data = profile_call(detector.detect_anomalies, metrics_data, score_after)
+            else:
+                result = detector.detect_anomalies(metrics_data, score_after)
         elif method == 'threshold':
             thresholds = input_data.get('thresholds', {})
-            result = detect_threshold_anomalies(metrics_data, thresholds)
+            if profile:
+                result, profile_data = profile_call(detect_threshold_anomalies, metrics_data, thresholds, score_after)
+            else:
+                result = detect_threshold_anomalies(metrics_data, thresholds, score_after)
+        elif method == 'forecast':
+            groups = [(metrics_data, input_data.get('thresholds', {}))]
+            if profile:
+                (result,), profile_data = profile_call(forecast_breaches, groups, None, horizon_seconds)
+            else:
+                (result,) = forecast_breaches(groups, None, horizon_seconds)
         else:
             result = {
                 'error': f'Unknown detection method: {method}',
@@ -202,6 +386,9 @@ def main():
                 'anomaly_count': 0
             }
         
+        if profile_data is not None:
+            result['profile'] = profile_data
+        
         # Output result as JSON
         print(json.dumps(result, default=str))
         
@@ -0,0 +1,258 @@
+"""
+NumPy Feature Engine for Anomaly Detection
+Builds the Isolation Forest feature matrix straight from the metric dicts:
+timestamps are parsed into int64 microseconds, hour/weekday come from epoch
+arithmetic, and rolling statistics come from cumulative sums. Features are
+written into a float32 matrix that can be reused across calls. Isolation
+Forest works in float32 internally, so no precision is lost.
+
+Features match the previous pandas implementation (sort by timestamp,
+rolling windows with min_periods=1, pct_change with forward-filled values,
+NaN filled with 0, infinite pct_change left as is). Hour and weekday use the
+timestamp's own UTC offset, as pandas does for tz-aware timestamps.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+FEATURE_COLUMNS = [
+    'metricValue', 'hour', 'day_of_week', 'is_weekend',
+    'value_rolling_mean_12', 'value_rolling_std_12', 'value_rolling_mean_24',
+    'value_diff', 'value_pct_change', 'z_score'
+]
+
+US_PER_HOUR = 3600 * 10**6
+US_PER_DAY = 24 * US_PER_HOUR
+# 1970-01-01 was a Thursday (Monday == 0)
+EPOCH_WEEKDAY = 3
+
+
+def _split_offset(text):
+    """(local ISO text, UTC offset in seconds or None when naive)"""
+    if text.endswith('Z'):
+        return text[:-1], 0
+    if len(text) > 6 and text[-6] in '+-' and text[-3] == ':':
+        sign = -1 if text[-6] == '-' else 1
+        return text[:-6], sign * (int(text[-5:-3]) * 3600 + int(text[-2:]) * 60)
+    return text, None
+
+
+def _parse_uniform(raw):
+    """
+    Fast path for timestamps that share one layout (the collector's output):
+    the strings become one fixed-width byte matrix, the offset suffix is
+    decoded column-wise and numpy parses the rest. None for anything else.
+    """
+    encoded = np.array(raw, dtype='S')
+    n, width = len(encoded), encoded.dtype.itemsize
+    chars = encoded.view(np.uint8).reshape(n, width)
+    if width < 10 or not chars[:, -1].all():
+        # Shorter strings are NUL padded, so the lengths differ
+        return None
+
+    if (chars[:, -1] == ord('Z')).all():
+        local_width, offsets, aware = width - 1, np.zeros(n, dtype=np.int64), True
+    elif np.isin(chars[:, -6], (ord('+'), ord('-'))).all() and (chars[:, -3] == ord(':')).all():
+        digits = chars[:, -5:].astype(np.int64) - ord('0')
+        sign = np.where(chars[:, -6] == ord('-'), -1, 1)
+        offsets = sign * ((digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60)
+        local_width, aware = width - 6, True
+    elif ((chars[:, -1] >= ord('0')) & (chars[:, -1] <= ord('9'))).all():
+        local_width, offsets, aware = width, np.zeros(n, dtype=np.int64), False
+    else:
+        return None
+
+    local = np.ascontiguousarray(chars[:, :local_width]).view(f'S{local_width}').ravel()
+    return local.astype('datetime64[us]').astype(np.int64), offsets, aware
+
+
+def parse_timestamps(raw):
+    """
+    Timestamps -> (local wall-clock microseconds, UTC offsets in seconds, aware).
+    Naive timestamps are treated as UTC. Formats numpy cannot parse go through pandas.
+    """
+    try:
+        parsed = _parse_uniform(raw)
+        if parsed is not None:
+            return parsed
+        texts, offsets = zip(*(_split_offset(str(value)) for value in raw))
+        aware = offsets[0] is not None
+        if any((offset is not None) != aware for offset in offsets):
+            raise ValueError("Cannot mix tz-aware and naive timestamps")
+        local = np.array(texts, dtype='datetime64[us]').astype(np.int64)
+        offsets = np.array([offset or 0 for offset in offsets], dtype=np.int64)
+    except (ValueError, TypeError, UnicodeError):
+        import pandas as pd
+        parsed = pd.to_datetime(pd.Series(list(raw)))
+        aware = parsed.dt.tz is not None
+        local = (parsed.dt.tz_localize(None) if aware else parsed).values.astype('datetime64[us]').astype(np.int64)
+        utc = (parsed.dt.tz_convert('UTC').dt.tz_localize(None) if aware else parsed).values.astype('datetime64[us]')
+        offsets = (local - utc.astype(np.int64)) // 10**6
+    return local, offsets, aware
+
+
+def _window_sums(cumulative, window):
+    """Sums over the last `window` positions from a cumulative sum with a leading zero"""
+    sums = cumulative[1:].copy()
+    sums[window:] -= cumulative[1:-window]
+    return sums
+
+
+def _rolling(values, valid, window, center, with_std=True):
+    """
+    Rolling mean and sample std (min_periods=1) over the valid points of the
+    last `window` positions, from cumulative sums of the values shifted by `center`
+    """
+    n = len(values)
+    all_valid = valid.all()
+    shifted = values - center
+    if not all_valid:
+        shifted[~valid] = 0.0
+
+    cumulative = np.zeros(n + 1)
+    np.cumsum(shifted, out=cumulative[1:])
+    window_sum = _window_sums(cumulative, window)
+    if all_valid:
+        nobs = np.minimum(np.arange(1, n + 1), window)
+    else:
+        counts = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(valid, out=counts[1:])
+        nobs = _window_sums(counts, window)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = window_sum / nobs
+        std = None
+        if with_std:
+            np.multiply(shifted, shifted, out=shifted)
+            np.cumsum(shifted, out=cumulative[1:])
+            std = _window_sums(cumulative, window)
+            # Sum of squared deviations = sum(x^2) - sum(x) * mean
+            window_sum *= mean
+            std -= window_sum
+            std /= nobs - 1
+            np.maximum(std, 0.0, out=std)
+            np.sqrt(std, out=std)
+            std[nobs < 2] = np.nan
+    mean += center
+    mean[nobs == 0] = np.nan
+    return mean, std, nobs
+
+
+def _same_value_run(values):
+    """Length of the run of equal values ending at each position"""
+    n = len(values)
+    changed = np.ones(n, dtype=bool)
+    changed[1:] = values[1:] != values[:-1]
+    run_start = np.maximum.accumulate(np.where(changed, np.arange(n), 0))
+    return np.arange(n) - run_start + 1
+
+
+class SeriesFeatures:
+    """Feature matrix of one series plus the float64 values reported with anomalies"""
+
+    __slots__ = ('matrix', 'values', 'rolling_mean_12', 'rolling_std_12', 'z_score',
+                 'utc_us', 'local_us', 'offsets', 'aware')
+
+    def __init__(self, matrix, values, rolling_mean_12, rolling_std_12, z_score, utc_us, local_us, offsets, aware):
+        self.matrix = matrix
+        self.values = values
+        self.rolling_mean_12 = rolling_mean_12
+        self.rolling_std_12 = rolling_std_12
+        self.z_score = z_score
+        self.utc_us = utc_us
+        self.local_us = local_us
+        self.offsets = offsets
+        self.aware = aware
+
+    def __len__(self):
+        return len(self.values)
+
+    def isoformat(self, index):
+        """ISO-8601 timestamp of one point, in its own offset (as pandas' Timestamp.isoformat)"""
+        moment = datetime(1970, 1, 1) + timedelta(microseconds=int(self.local_us[index]))
+        if self.aware:
+            moment = moment.replace(tzinfo=timezone(timedelta(seconds=int(self.offsets[index]))))
+        return moment.isoformat()
+
+
+class FeatureEngine:
+    def __init__(self, reuse_buffers=True):
+        # One float32 buffer, grown as needed and shared by consecutive calls
+        self.reuse_buffers = reuse_buffers
+        self._buffer = None
+
+    def _matrix(self, n):
+        if not self.reuse_buffers:
+            return np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+        if self._buffer is None or len(self._buffer) < n:
+            self._buffer = np.empty((max(n, 64), len(FEATURE_COLUMNS)), dtype=np.float32)
+        return self._buffer[:n]
+
+    def compute(self, metrics_data):
+        """
+        Features of one series, sorted by timestamp. With buffer reuse the
+        matrix is only valid until the next call.
+        """
+        n = len(metrics_data)
+        local_us, offsets, aware = parse_timestamps([point['timestamp'] for point in metrics_data])
+        utc_us = local_us - offsets * 10**6
+        # Missing values (None) become NaN
+        values = np.array([point.get('metricValue') for point in metrics_data], dtype=np.float64)
+
+        if n > 1 and (utc_us[1:] < utc_us[:-1]).any():
+            order = np.argsort(utc_us, kind='stable')
+            utc_us, local_us, offsets, values = utc_us[order], local_us[order], offsets[order], values[order]
+
+        valid = ~np.isnan(values)
+        # Shifting by a typical value keeps the cumulative sums of squares well conditioned
+        center = float(np.median(values[valid])) if valid.any() else 0.0
+        mean_12, std_12, nobs_12 = _rolling(values, valid, 12, center)
+        mean_24, _, nobs_24 = _rolling(values, valid, 24, center, with_std=False)
+
+        # Windows of one repeated value are exact, as in pandas
+        run = _same_value_run(values)
+        constant = valid & (run >= nobs_12) & (nobs_12 > 0)
+        mean_12[constant] = values[constant]
+        std_12[constant & (nobs_12 > 1)] = 0.0
+        constant = valid & (run >= nobs_24) & (nobs_24 > 0)
+        mean_24[constant] = values[constant]
+
+        matrix = self._matrix(n)
+        matrix[:, 0] = values
+        matrix[:, 4] = mean_12
+        matrix[:, 5] = std_12
+        matrix[:, 6] = mean_24
+        del mean_24, run, constant
+
+        # Hour and weekday of the local wall-clock time
+        local_days = local_us // US_PER_DAY
+        matrix[:, 1] = (local_us - local_days * US_PER_DAY) // US_PER_HOUR
+        local_days += EPOCH_WEEKDAY
+        local_days %= 7
+        matrix[:, 2] = local_days
+        matrix[:, 3] = local_days >= 5
+        del local_days
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            matrix[0, 7] = np.nan
+            np.subtract(values[1:], values[:-1], out=matrix[1:, 7], casting='unsafe')
+
+            # pct_change forward-fills missing values before comparing neighbours
+            filled = values
+            if not valid.all():
+                last_valid = np.maximum.accumulate(np.where(valid, np.arange(n), -1))
+                filled = np.where(last_valid >= 0, values[np.maximum(last_valid, 0)], np.nan)
+            matrix[0, 8] = np.nan
+            matrix[1:, 8] = filled[1:] / filled[:-1] - 1
+
+            z_score = values - mean_12
+            z_score /= std_12 + 1e-6
+        matrix[:, 9] = z_score
+
+        # fillna(0): NaN only, infinite pct_change stays
+        np.nan_to_num(matrix, copy=False, nan=0.0, posinf=np.inf, neginf=-np.inf)
+        for column in (values, mean_12, std_12, z_score):
+            np.nan_to_num(column, copy=False, nan=0.0, posinf=np.inf, neginf=-np.inf)
+
+        return SeriesFeatures(matrix, values, mean_12, std_12, z_score, utc_us, local_us, offsets, aware)
@@ -0,0 +1,238 @@
+"""
+Batched Forecasting for Threshold-Breach Prediction
+Fits damped-trend Holt models, with additive daily seasonality for series
+that cover at least two seasons, to many series at once. Series are stacked
+left-aligned into one NumPy matrix (one row per series, NaN padded), so the
+smoothing recursion loops over time steps only and updates every series and
+every candidate (alpha, beta) pair together; each series keeps the pair with
+the lowest one-step-ahead error. The fitted models are projected over the
+horizon and the first step that crosses a configured min or max is reported
+as the predicted breach time.
+"""
+
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+
+from feature_engine import parse_timestamps
+
+DEFAULT_HORIZON_SECONDS = 6 * 3600
+DEFAULT_SEASON_SECONDS = 24 * 3600
+# The trend is damped so it halves every this many seconds of projection; this
+# keeps long projections from running away on a short slope
+DEFAULT_TREND_HALF_LIFE_SECONDS = 24 * 3600
+DEFAULT_GAMMA = 0.1
+ALPHAS = (0.2, 0.5, 0.8)
+BETAS = (0.02, 0.1, 0.3)
+MIN_FORECAST_POINTS = 6
+# Points used to initialise the trend
+TREND_INIT_POINTS = 12
+
+
+def isoformat(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+def _stack(series):
+    """Left-aligned float64 matrix of the value arrays, NaN padded, and the row lengths"""
+    lengths = np.array([len(values) for values in series], dtype=np.int64)
+    matrix = np.full((len(series), int(lengths.max())), np.nan)
+    for row, values in enumerate(series):
+        matrix[row, :len(values)] = values
+    return matrix, lengths
+
+
+def _initial_trend(matrix):
+    """Least-squares slope over the first TREND_INIT_POINTS valid steps of each row"""
+    head = matrix[:, :TREND_INIT_POINTS]
+    valid = ~np.isnan(head)
+    t = np.where(valid, np.arange(head.shape[1]), 0.0)
+    y = np.where(valid, head, 0.0)
+    n = np.maximum(valid.sum(axis=1), 1)
+    t_mean, y_mean = t.sum(axis=1) / n, y.sum(axis=1) / n
+    dt = np.where(valid, t - t_mean[:, None], 0.0)
+    variance = (dt * dt).sum(axis=1)
+    slope = (dt * (y - y_mean[:, None])).sum(axis=1) / np.where(variance > 0, variance, 1.0)
+    return np.where(variance > 0, slope, 0.0)
+
+
+def _initial_season(matrix, season_points, seasonal):
+    """Seasonal indices from the first two seasons (value minus the mean of those seasons)"""
+    width = int(season_points[seasonal].max()) if seasonal.any() else 1
+    season = np.zeros((len(matrix), width))
+    for m in np.unique(season_points[seasonal]):
+        rows = np.flatnonzero(seasonal & (season_points == m))
+        head = matrix[rows, :2 * m].reshape(len(rows), 2, m)
+        with np.errstate(invalid='ignore'):
+            phase_mean = np.nanmean(head, axis=1)
+        phase_mean -= np.nanmean(phase_mean, axis=1, keepdims=True)
+        season[rows, :m] = np.nan_to_num(phase_mean)
+    return season
+
+
+def fit(matrix, lengths, season_points, seasonal, damping, alphas=ALPHAS, betas=BETAS, gamma=DEFAULT_GAMMA):
+    """
+    Damped Holt(-Winters) recursion over all rows and parameter pairs, with
+    a per-row damping factor.
+    Returns the final level, trend and seasonal state of the best pair per
+    row, the chosen (alpha, beta) and the one-step residual std.
+    """
+    n_rows = len(matrix)
+    pairs = np.array([(alpha, beta) for alpha in alphas for beta in betas])
+    alpha, beta = pairs[:, 0][None, :], pairs[:, 1][None, :]
+    n_pairs = len(pairs)
+    gammas = np.where(seasonal, gamma, 0.0)[:, None]
+    damping = damping[:, None]
+    rows = np.arange(n_rows)
+
+    first = matrix[:, 0]
+    level = np.repeat(np.nan_to_num(first)[:, None], n_pairs, axis=1)
+    trend = np.repeat(_initial_trend(matrix)[:, None], n_pairs, axis=1)
+    season = np.repeat(_initial_season(matrix, season_points, seasonal)[:, :, None], n_pairs, axis=2)
+    level -= season[:, 0, :]
+    sse = np.zeros((n_rows, n_pairs))
+    errors = np.zeros(n_rows)
+
+    for t in range(1, matrix.shape[1]):
+        x = matrix[:, t]
+        active = t < lengths
+        observed = active & ~np.isnan(x)
+        phase = t % season_points
+        s_prev = season[rows, phase, :]
+
+        damped_trend = damping * trend
+        expected = level + damped_trend
+        error = x[:, None] - (expected + s_prev)
+        new_level = np.where(observed[:, None], alpha * (x[:, None] - s_prev) + (1 - alpha) * expected, expected)
+        new_trend = beta * (new_level - level) + (1 - beta) * damped_trend
+        new_season = np.where(observed[:, None], gammas * (x[:, None] - new_level) + (1 - gammas) * s_prev, s_prev)
+
+        # Rows that ended keep their final state
+        level = np.where(active[:, None], new_level, level)
+        trend = np.where(active[:, None], new_trend, trend)
+        season[rows, phase, :] = np.where(active[:, None], new_season, s_prev)
+        # The first few errors mostly reflect the initial state
+        scored = observed & (t >= 2)
+        sse += np.where(scored[:, None], error * error, 0.0)
+        errors += scored
+
+    best = np.argmin(sse, axis=1)
+    residual_std = np.sqrt(sse[rows, best] / np.maximum(errors, 1))
+    return (level[rows, best], trend[rows, best], season[rows, :, best], pairs[best], residual_std)
+
+
+def project(level, trend, season, lengths, season_points, horizon_points, damping):
+    """Forecasts for steps 1..max(horizon_points) after each row's last point; NaN beyond a row's horizon"""
+    steps = np.arange(1, int(horizon_points.max()) + 1)
+    # Sum of damping^1..damping^h
+    damped = np.cumsum(damping[:, None] ** steps[None, :], axis=1)
+    phases = (lengths[:, None] - 1 + steps[None, :]) % season_points[:, None]
+    forecast = level[:, None] + damped * trend[:, None] + np.take_along_axis(season, phases, axis=1)
+    forecast[steps[None, :] > horizon_points[:, None]] = np.nan
+    return forecast
+
+
+def _first_true(mask):
+    """Index of the first True per row, -1 when there is none"""
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), -1)
+
+
+class BatchForecaster:
+    def __init__(self, horizon_seconds=DEFAULT_HORIZON_SECONDS, season_seconds=DEFAULT_SEASON_SECONDS,
+                 trend_half_life_seconds=DEFAULT_TREND_HALF_LIFE_SECONDS):
+        self.horizon_seconds = horizon_seconds
+        self.season_seconds = season_seconds
+        self.trend_half_life = trend_half_life_seconds
+
+    def prepare(self, metrics_data):
+        """(epoch seconds, values) sorted by time, or None without enough points to fit"""
+        points = [point for point in metrics_data if point.get('metricValue') is not None]
+        if len(points) < MIN_FORECAST_POINTS:
+            return None
+        local_us, offsets, _ = parse_timestamps([point['timestamp'] for point in points])
+        epochs = (local_us - offsets * 10**6) / 1e6
+        values = np.array([point['metricValue'] for point in points], dtype=np.float64)
+        order = np.argsort(epochs, kind='stable')
+        return epochs[order], values[order]
+
+    def forecast(self, series, thresholds):
+        """
+        Forecast many series at once. `series` is a list of (epochs, values)
+        and `thresholds` a matching list of {'min': ..., 'max': ...} dicts.
+        Returns one result dict per series.
+        """
+        if not series:
+            return []
+        # Each series keeps its own sampling step; the recursion runs per point
+        steps = np.array([float(np.median(np.diff(epochs))) if len(epochs) > 1 else 300.0
+                          for epochs, _ in series])
+        steps[steps <= 0] = 300.0
+        # Points are regridded so gaps in the data stay gaps (NaN) in the model
+        gridded = []
+        for (epochs, values), step in zip(series, steps):
+            index = np.rint((epochs - epochs[0]) / step).astype(np.int64)
+            row = np.full(int(index[-1]) + 1, np.nan)
+            row[index] = values
+            gridded.append(row)
+        matrix, lengths = _stack(gridded)
+
+        season_points = np.maximum(np.rint(self.season_seconds / steps).astype(np.int64), 1)
+        seasonal = (lengths >= 2 * season_points) & (season_points > 1)
+        season_points = np.where(seasonal, season_points, 1)
+        horizon_points = np.maximum(np.rint(self.horizon_seconds / steps).astype(np.int64), 1)
+        damping = 0.5 ** (steps / self.trend_half_life)
+
+        level, trend, season, params, residual_std = fit(matrix, lengths, season_points, seasonal, damping)
+        forecast = project(level, trend, season, lengths, season_points, horizon_points, damping)
+
+        maximum = np.array([np.nan if (t or {}).get('max') is None else t['max'] for t in thresholds], dtype=float)
+        minimum = np.array([np.nan if (t or {}).get('min') is None else t['min'] for t in thresholds], dtype=float)
+        # Forecast error grows with the square root of the steps ahead
+        spread = residual_std[:, None] * np.sqrt(np.arange(1, forecast.shape[1] + 1))[None, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            above = _first_true(forecast > maximum[:, None])
+            below = _first_true(forecast < minimum[:, None])
+            # Largest z-score past each threshold within the horizon
+            above_z = np.nanmax(np.nan_to_num((forecast - maximum[:, None]) / spread, nan=-np.inf), axis=1)
+            below_z = np.nanmax(np.nan_to_num((minimum[:, None] - forecast) / spread, nan=-np.inf), axis=1)
+
+        last_values = np.array([values[-1] for _, values in series])
+        results = []
+        for row, (epochs, values) in enumerate(series):
+            last_epoch = float(epochs[-1])
+            breaches = []
+            for first, peak_z, limits, threshold_type in ((above, above_z, maximum, 'above_maximum'),
+                                                          (below, below_z, minimum, 'below_minimum')):
+                if first[row] < 0:
+                    continue
+                h = int(first[row]) + 1
+                predicted = float(forecast[row, first[row]])
+                threshold = float(limits[row])
+                # Chance the value is past the threshold at the likeliest step of the horizon
+                probability = 0.5 * (1 + math.erf(min(float(peak_z[row]), 40.0) / math.sqrt(2)))
+                breaches.append({
+                    'threshold_type': threshold_type,
+                    'threshold_value': threshold,
+                    'predicted_time': isoformat(last_epoch + h * steps[row]),
+                    'seconds_until': round(h * float(steps[row]), 1),
+                    'forecast_value': predicted,
+                    'probability': round(probability, 4)
+                })
+            breaches.sort(key=lambda breach: breach['seconds_until'])
+            currently_breaching = bool(last_values[row] > maximum[row] or last_values[row] < minimum[row])
+            results.append({
+                'model': 'holt_winters' if seasonal[row] else 'holt',
+                'alpha': float(params[row, 0]),
+                'beta': float(params[row, 1]),
+                'step_seconds': float(steps[row]),
+                'horizon_seconds': float(horizon_points[row] * steps[row]),
+                'last_timestamp': isoformat(last_epoch),
+                'last_value': float(last_values[row]),
+                'level': float(level[row]),
+                'trend_per_step': float(trend[row]),
+                'residual_std': float(residual_std[row]),
+                'currently_breaching': currently_breaching,
+                'predicted_breaches': breaches
+            })
+        return results
@@ -12,7 +12,8 @@ const agentEngine = require('./agentEngine');
 const app = express();
 const port = 9000;
 
-app.use(bodyParser.json());
+// Batch anomaly requests carry many series per body
+app.use(bodyParser.json({ limit: '50mb' }));
 app.use(cors());
 
 // Load the knowledge base
@@ -140,10 +141,48 @@ app.post('/api/prompt', async (req, res) => {
   }
 });
 
+// Runs anomaly_detection.py once with JSON on stdin and resolves with its JSON output
+function runAnomalyDetection(inputData) {
+    const options = {
+        mode: 'text',
+        pythonPath: 'python3',
+        pythonOptions: ['-u'],
+        scriptPath: path.join(__dirname),
+        args: []
+    };
+
+    return new Promise((resolve, reject) => {
+        const pyshell = new PythonShell('anomaly_detection.py', options);
+        
+        // Send input data to Python script
+        pyshell.send(JSON.stringify(inputData));
+        
+        let output = '';
+        pyshell.on('message', (data) => {
+            output += data;
+        });
+
+        pyshell.end((err, code, signal) => {
+            if (err) {
+                console.error('Python script error:', err);
+                reject(err);
+            } else {
+                try {
+                    const result = JSON.parse(output);
+                    resolve(result);
+                } catch (parseError) {
+                    console.error('Failed to parse Python output:', output);
+                    reject(new Error('Failed to parse anomaly detection results'));
+                }
+            }
+        });
+    });
+}
+
 // Anomaly Detection Endpoint
 app.post('/api/detect-anomalies', async (req, res) => {
     try {
-        const { metrics_data, method = 'isolation_forest', thresholds = {} } = req.body;
+        const { metrics_data, method = 'isolation_forest', thresholds = {}, profile = false, score_after = null, horizon_seconds = null } = req.body;
         
         if (!metrics_data || !Array.isArray(metrics_data) || metrics_data.length === 0) {
             return res.status(400).json({
@@ -153,48 +192,64 @@ app.post('/api/detect-anomalies', async (req, res) => {
 
         console.log(`Running anomaly detection with method: ${method} on ${metrics_data.length} data points`);
 
-        const options = {
-            mode: 'text',
-            pythonPath: 'python3',
-            pythonOptions: ['-u'],
-            scriptPath: path.join(__dirname),
-            args: []
-        };
-
-        const inputData = {
+        // Points at or before score_after are context for rolling features only
+        const results = await runAnomalyDetection({
             method,
             metrics_data,
-            thresholds
-        };
+            thresholds,
+            profile,
+            score_after,
+            // Forecast method only: how far ahead to look for threshold breaches
+            horizon_seconds
+        });
 
-        const results = await new Promise((resolve, reject) => {
-            const pyshell = new PythonShell('anomaly_detection.py', options);
-            
-            // Send input data to Python script
-            pyshell.send(JSON.stringify(inputData));
-            
-            let output = '';
-            pyshell.on('message', (data) => {
-                output += data;
+        console.log(`Anomaly detection completed: ${results.anomaly_count} anomalies found out of ${results.total_points} points`);
+        
+        res.json({
+            success: true,
+            results,
+            timestamp: new Date().toISOString()
+        });
+
+    } catch (error) {
+        console.error('Anomaly detection error:', error);
+        res.status(500).json({
+            error: 'Anomaly detection failed',
+            details: error.message,
+            timestamp: new Date().toISOString()
+        });
+    }
+});
+
+// Batch Anomaly Detection Endpoint: many named groups in one Python run
+app.post('/api/detect-anomalies/batch', async (req, res) => {
+    try {
+        const { groups, method = 'isolation_forest', thresholds = {}, profile = false, horizon_seconds = null } = req.body;
+        
+        if (!groups || !Array.isArray(groups) || groups.length === 0) {
+            return res.status(400).json({
+                error: 'groups is required and must be a non-empty array'
             });
+        }
 
-            pyshell.end((err, code, signal) => {
-                if (err) {
-                    console.error('Python script error:', err);
-                    reject(err);
-                } else {
-                    try {
-                        const result = JSON.parse(output);
-                        resolve(result);
-                    } catch (parseError) {
-                        console.error('Failed to parse Python output:', output);
-                        reject(new Error('Failed to parse anomaly detection results'));
-                    }
-                }
+        const invalid = groups.findIndex(group => !group || !Array.isArray(group.metrics_data));
+        if (invalid !== -1) {
+            return res.status(400).json({
+                error: `groups[${invalid}].metrics_data must be an array`
             });
+        }
+
+        console.log(`Running batch anomaly detection with method: ${method} on ${groups.length} groups`);
+
+        const results = await runAnomalyDetection({
+            method,
+            groups,
+            thresholds,
+            profile,
+            horizon_seconds
         });
 
-        console.log(`Anomaly detection completed: ${results.anomaly_count} anomalies found out of ${results.total_points} points`);
+        console.log(`Batch anomaly detection completed: ${results.anomaly_count} anomalies found in ${results.group_count} groups`);
         
         res.json({
             success: true,
@@ -203,9 +258,9 @@ app.post('/api/detect-anomalies', async (req, res) => {
         });
 
     } catch (error) {
-        console.error('Anomaly detection error:', error);
+        console.error('Batch anomaly detection error:', error);
         res.status(500).json({
-            error: 'Anomaly detection failed',
+            error: 'Batch anomaly detection failed',
             details: error.message,
             timestamp: new Date().toISOString()
         });
@@ -311,11 +366,9 @@ app.post('/api/monitor-anomalies', async (req, res) => {
         
         console.log(`Monitoring anomalies for services: ${services.join(', ')}`);
 
-        const anomalyAlerts = [];
-        
-        for (const service of services) {
+        // Fetch every service's recent metrics in parallel, then score them all in one Python run
+        const serviceMetrics = await Promise.all(services.map(async (service) => {
             try {
-                // Get recent metrics for each service
                 const metricsResponse = await fetch('http://node-service:3000/api/metrics-history/summary', {
                     method: 'GET',
                     headers: { 'Content-Type': 'application/json' },
@@ -330,39 +383,41 @@ app.post('/api/monitor-anomalies', async (req, res) => {
 
                 if (metricsResponse.ok) {
                     const metricsData = await metricsResponse.json();
-                    
-                    if (metricsData.metrics && metricsData.metrics.length > 10) {
-                        // Run anomaly detection
-                        const anomalyResponse = await fetch(`http://localhost:${port}/api/detect-anomalies`, {
-                            method: 'POST',
-                            headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify({
-                                metrics_data: metricsData.metrics,
-                                method: 'isolation_forest'
-                            })
-                        });
-
-                        const anomalyResults = await anomalyResponse.json();
-                        
-                        // Filter high-severity anomalies
-                        const highSeverityAnomalies = anomalyResults.results.anomalies.filter(
-                            anomaly => anomaly.anomaly_score >= alertThreshold
-                        );
-
-                        if (highSeverityAnomalies.length > 0) {
-                            anomalyAlerts.push({
-                                service,
-                                anomalies: highSeverityAnomalies,
-                                severity: 'high',
-                                count: highSeverityAnomalies.length,
-                                timestamp: new Date().toISOString()
-                            });
-                        }
-                    }
+                    return { service, metrics: metricsData.metrics || [] };
                 }
             } catch (serviceError) {
                 console.error(`Error monitoring ${service}:`, serviceError);
             }
+            return { service, metrics: [] };
+        }));
+
+        const groups = serviceMetrics
+            .filter(({ metrics }) => metrics.length > 10)
+            .map(({ service, metrics }) => ({ name: service, metrics_data: metrics }));
+
+        const anomalyAlerts = [];
+        
+        if (groups.length > 0) {
+            const batchResults = await runAnomalyDetection({ method: 'isolation_forest', groups });
+
+            for (const { name: service } of groups) {
+                const serviceResult = batchResults.groups[service] || { anomalies: [] };
+
+                // Filter high-severity anomalies
+                const highSeverityAnomalies = serviceResult.anomalies.filter(
+                    anomaly => anomaly.anomaly_score >= alertThreshold
+                );
+
+                if (highSeverityAnomalies.length > 0) {
+                    anomalyAlerts.push({
+                        service,
+                        anomalies: highSeverityAnomalies,
+                        severity: 'high',
+                        count: highSeverityAnomalies.length,
+                        timestamp: new Date().toISOString()
+                    });
+                }
+            }
         }
 
         res.json({
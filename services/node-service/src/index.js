@@ -29,6 +29,7 @@ const rcaRoutes = require('./routes/rcaRoutes');
 // Add REAL AWS routes for dashboard integration  
 const realAwsRoutes = require('./routes/realAwsRoutes');
 const systemCredentialController = require('./controllers/systemCredentialController');
+const { migrateMetricsHistoryServices } = require('./utils/migrateMetricsHistory');
 
 const app = express();
 const port = 3000;
@@ -745,8 +746,9 @@ db.sequelize.sync({ alter: false }).then(async () => {
         console.error('❌ AzureCredential table sync error:', error);
     }
     
-    // Ensure MetricsHistory table exists
+    // Ensure MetricsHistory table exists and accepts every collected service
     try {
+        await migrateMetricsHistoryServices(db);
         await db.MetricsHistory.sync({ force: false });
         console.log('✅ MetricsHistory table synchronized');
     } catch (error) {
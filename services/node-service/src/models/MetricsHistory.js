@@ -14,7 +14,7 @@ module.exports = (sequelize, DataTypes) => {
         },
         
         service: {
-            type: DataTypes.ENUM('ec2', 'rds', 'lambda', 's3', 'cloudwatch', 'compute', 'storage', 'database'),
+            type: DataTypes.ENUM('ec2', 'rds', 'lambda', 's3', 'elb', 'dynamodb', 'ecs', 'cloudwatch', 'compute', 'storage', 'database'),
             allowNull: false,
             comment: 'Cloud service type'
         },
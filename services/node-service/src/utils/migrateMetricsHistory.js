@@ -0,0 +1,36 @@
+// MetricsHistory schema migration
+// sync({ alter: false }) never changes an existing table, so service values
+// added to the model (elb, dynamodb, ecs) only reach databases created since.
+// Tables whose service column carries a CHECK list without them are rebuilt
+// from the model definition; indexes are restored by the sync that follows.
+
+const getTableSql = async (sequelize, tableName) => {
+    const [rows] = await sequelize.query(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :tableName",
+        { replacements: { tableName } }
+    );
+    return rows.length ? rows[0].sql : null;
+};
+
+const migrateMetricsHistoryServices = async (db) => {
+    const model = db.MetricsHistory;
+    const tableName = model.getTableName();
+    const tableSql = await getTableSql(db.sequelize, tableName);
+    if (!tableSql) {
+        // The table does not exist yet; sync creates it with the current values
+        return false;
+    }
+
+    const serviceCheck = tableSql.match(/[`"]?service[`"]?[^,]*?CHECK\s*\(([^)]*)\)/i);
+    const services = model.rawAttributes.service.values;
+    if (!serviceCheck || services.every((service) => serviceCheck[1].includes(`'${service}'`))) {
+        return false;
+    }
+
+    const { type, allowNull, comment } = model.rawAttributes.service;
+    await db.sequelize.getQueryInterface().changeColumn(tableName, 'service', { type, allowNull, comment });
+    console.log(`✅ ${tableName}.service now accepts: ${services.join(', ')}`);
+    return true;
+};
+
+module.exports = { migrateMetricsHistoryServices };
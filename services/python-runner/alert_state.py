@@ -0,0 +1,292 @@
+"""
+Alert State for the Python Runner
+Turns detected anomalies into incidents. Each anomaly is fingerprinted by
+series and timestamp bucket, so the same point reported again (overlapping
+collection windows, monitoring rescans, retries) is suppressed for the
+dedup TTL. Anomalous buckets of a series that are close together are
+coalesced into one incident, and only incidents that are new, grew or got
+a higher peak score are emitted; an incident without new anomalies for a
+while is emitted once more as resolved. Fingerprints are only dedup keys:
+every incident gets its own id, so one opened after its bucket's
+fingerprint expired never takes over a retained resolved incident. State
+is snapshotted so restarts do not re-alert on anomalies that were already
+reported.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from rollups import parse_timestamp
+
+logger = logging.getLogger('AlertState')
+
+DEFAULT_BUCKET_SECONDS = 300
+DEFAULT_DEDUP_TTL_SECONDS = 6 * 3600
+# Anomalous buckets at most this many buckets apart belong to the same incident
+DEFAULT_MERGE_GAP_BUCKETS = 3
+DEFAULT_RESOLVE_AFTER_SECONDS = 30 * 60
+
+OPENED = 'opened'
+UPDATED = 'updated'
+RESOLVED = 'resolved'
+
+STATUS_OPEN = 'open'
+
+_incident_sequence = itertools.count()
+
+
+def fingerprint(series, bucket):
+    """Stable id of one anomalous timestamp bucket of a series"""
+    return hashlib.sha1(f"{series}|{bucket}".encode()).hexdigest()[:16]
+
+
+def new_incident_id(series, bucket, now):
+    """Id of a new incident; unlike a fingerprint it is never reused by a later incident on the same bucket"""
+    return hashlib.sha1(f"{series}|{bucket}|{now!r}|{next(_incident_sequence)}".encode()).hexdigest()[:16]
+
+
+def isoformat(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+class Incident:
+    """Consecutive anomalous buckets of one series"""
+
+    __slots__ = ('incident_id', 'series', 'metadata', 'first_bucket', 'last_bucket', 'peak_score',
+                 'point_count', 'status', 'opened_at', 'updated_at', 'resolved_at')
+
+    def __init__(self, series, bucket, metadata=None, now=None):
+        now = now if now is not None else time.time()
+        self.incident_id = new_incident_id(series, bucket, now)
+        self.series = series
+        self.metadata = metadata or {}
+        self.first_bucket = bucket
+        self.last_bucket = bucket
+        self.peak_score = 0.0
+        self.point_count = 0
+        self.status = STATUS_OPEN
+        self.opened_at = now
+        self.updated_at = now
+        self.resolved_at = None
+
+    def to_dict(self, bucket_seconds):
+        return {
+            'incident_id': self.incident_id,
+            'series': self.series,
+            'metadata': self.metadata,
+            'status': self.status,
+            'started_at': isoformat(self.first_bucket * bucket_seconds),
+            'last_anomaly_at': isoformat(self.last_bucket * bucket_seconds),
+            'peak_score': self.peak_score,
+            'point_count': self.point_count,
+            'opened_at': isoformat(self.opened_at),
+            'updated_at': isoformat(self.updated_at),
+            'resolved_at': isoformat(self.resolved_at) if self.resolved_at is not None else None
+        }
+
+    def dump(self):
+        return [self.incident_id, self.series, self.metadata, self.first_bucket, self.last_bucket,
+                self.peak_score, self.point_count, self.status, self.opened_at, self.updated_at, self.resolved_at]
+
+    @classmethod
+    def load(cls, data):
+        incident = cls.__new__(cls)
+        (incident.incident_id, incident.series, incident.metadata, incident.first_bucket, incident.last_bucket,
+         incident.peak_score, incident.point_count, incident.status, incident.opened_at, incident.updated_at,
+         incident.resolved_at) = data
+        return incident
+
+
+class AlertStateStore:
+    def __init__(self, bucket_seconds=None, dedup_ttl_seconds=None, merge_gap_buckets=None,
+                 resolve_after_seconds=None, snapshot_path=None):
+        self.bucket_seconds = int(bucket_seconds or os.getenv('ALERT_BUCKET_SECONDS', DEFAULT_BUCKET_SECONDS))
+        self.dedup_ttl = float(dedup_ttl_seconds or os.getenv('ALERT_DEDUP_TTL_SECONDS', DEFAULT_DEDUP_TTL_SECONDS))
+        self.merge_gap = int(merge_gap_buckets or os.getenv('ALERT_MERGE_GAP_BUCKETS', DEFAULT_MERGE_GAP_BUCKETS))
+        self.resolve_after = float(resolve_after_seconds or os.getenv(
+            'ALERT_RESOLVE_AFTER_SECONDS', DEFAULT_RESOLVE_AFTER_SECONDS))
+        self.snapshot_path = snapshot_path if snapshot_path is not None else os.path.join(
+            os.getenv('METRICS_DATA_DIR', '/app/data'), 'alert_state.json')
+
+        self.seen = {}          # fingerprint -> [first seen epoch, score]
+        self.incidents = {}     # incident id -> Incident
+        self._open = {}         # series -> ids of its open incidents
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.stats = {
+            'anomalies_received': 0,
+            'duplicates_suppressed': 0,
+            'incidents_opened': 0,
+            'incidents_updated': 0,
+            'incidents_resolved': 0
+        }
+
+    def _incident_for(self, series, bucket):
+        for incident_id in self._open.get(series, ()):
+            incident = self.incidents[incident_id]
+            if incident.first_bucket - self.merge_gap <= bucket <= incident.last_bucket + self.merge_gap:
+                return incident
+        return None
+
+    def observe(self, series, anomalies, metadata=None, now=None):
+        """
+        Fold one series' anomalies into its incidents. Returns the incidents
+        that are new or changed as (event, incident) pairs.
+        """
+        now = now if now is not None else time.time()
+        touched = {}
+        with self._lock:
+            points = sorted((parse_timestamp(a['timestamp']), float(a.get('anomaly_score', 0))) for a in anomalies)
+            for ts, score in points:
+                self.stats['anomalies_received'] += 1
+                bucket = int(ts // self.bucket_seconds)
+                key = fingerprint(series, bucket)
+                seen = self.seen.get(key)
+                if seen is not None and score <= seen[1]:
+                    self.stats['duplicates_suppressed'] += 1
+                    continue
+
+                incident = self._incident_for(series, bucket)
+                if incident is None:
+                    incident = Incident(series, bucket, metadata, now)
+                    self.incidents[incident.incident_id] = incident
+                    self._open.setdefault(series, set()).add(incident.incident_id)
+                    touched[incident.incident_id] = OPENED
+                    self.stats['incidents_opened'] += 1
+                else:
+                    touched.setdefault(incident.incident_id, UPDATED)
+
+                if seen is None:
+                    # A rescored bucket only raises the peak; it is not another point
+                    self.seen[key] = [now, score]
+                    incident.point_count += 1
+                else:
+                    seen[1] = score
+                incident.first_bucket = min(incident.first_bucket, bucket)
+                incident.last_bucket = max(incident.last_bucket, bucket)
+                incident.peak_score = max(incident.peak_score, score)
+                incident.updated_at = now
+
+            self.stats['incidents_updated'] += sum(1 for event in touched.values() if event == UPDATED)
+            if touched:
+                self._dirty = True
+            return [(event, self.incidents[incident_id]) for incident_id, event in touched.items()]
+
+    def resolve_stale(self, now=None):
+        """Resolve open incidents that have had no new anomalies for resolve_after seconds"""
+        now = now if now is not None else time.time()
+        resolved = []
+        with self._lock:
+            for series in list(self._open):
+                for incident_id in list(self._open[series]):
+                    incident = self.incidents[incident_id]
+                    if now - incident.updated_at < self.resolve_after:
+                        continue
+                    incident.status = RESOLVED
+                    incident.resolved_at = now
+                    self._open[series].discard(incident_id)
+                    resolved.append((RESOLVED, incident))
+                if not self._open[series]:
+                    del self._open[series]
+            self.stats['incidents_resolved'] += len(resolved)
+            if resolved:
+                self._dirty = True
+        return resolved
+
+    def expire(self, now=None):
+        """Forget fingerprints and resolved incidents older than the dedup TTL"""
+        cutoff = (now if now is not None else time.time()) - self.dedup_ttl
+        with self._lock:
+            for key in [key for key, seen in self.seen.items() if seen[0] < cutoff]:
+                del self.seen[key]
+                self._dirty = True
+            for incident_id in [incident_id for incident_id, incident in self.incidents.items()
+                                if incident.status == RESOLVED and incident.resolved_at < cutoff]:
+                del self.incidents[incident_id]
+                self._dirty = True
+
+    def process(self, anomalies_by_series, metadata=None, now=None):
+        """
+        Observe {series: anomalies}, resolve stale incidents and expire old
+        state; returns the events to notify as dicts with an `event` field.
+        `metadata` maps series to labels stored with new incidents.
+        """
+        now = now if now is not None else time.time()
+        events = []
+        for series, anomalies in anomalies_by_series.items():
+            if anomalies:
+                events.extend(self.observe(series, anomalies, (metadata or {}).get(series), now))
+        events.extend(self.resolve_stale(now))
+        self.expire(now)
+        if self._dirty and self.snapshot_path:
+            self.save()
+        return [{'event': event, **incident.to_dict(self.bucket_seconds)} for event, incident in events]
+
+    def list_incidents(self, status=None):
+        with self._lock:
+            incidents = sorted(self.incidents.values(), key=lambda i: i.updated_at, reverse=True)
+            return [incident.to_dict(self.bucket_seconds) for incident in incidents
+                    if status is None or incident.status == status]
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'open_incidents': sum(len(ids) for ids in self._open.values()),
+                'tracked_incidents': len(self.incidents),
+                'fingerprints': len(self.seen),
+                'bucket_seconds': self.bucket_seconds,
+                'dedup_ttl_seconds': self.dedup_ttl,
+                **self.stats
+            }
+
+    def save(self):
+        """Write a snapshot so already reported anomalies are not re-alerted after a restart"""
+        with self._lock:
+            # Copied under the lock: process() runs on the collection and monitoring threads
+            snapshot = {
+                'seen': {key: list(seen) for key, seen in self.seen.items()},
+                'incidents': [incident.dump() for incident in self.incidents.values()]
+            }
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            # Retried by the next process() call
+            with self._lock:
+                self._dirty = True
+            logger.error(f"Failed to save alert state snapshot: {e}")
+
+    def load(self):
+        """Restore a snapshot written by save(); returns the number of incidents loaded"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return 0
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load alert state snapshot: {e}")
+            return 0
+
+        with self._lock:
+            self.seen = snapshot.get('seen', {})
+            for data in snapshot.get('incidents', []):
+                try:
+                    incident = Incident.load(data)
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"Skipping malformed incident in alert state snapshot: {e}")
+                    continue
+                self.incidents[incident.incident_id] = incident
+                if incident.status != RESOLVED:
+                    self._open.setdefault(incident.series, set()).add(incident.incident_id)
+        logger.info(f"Loaded alert state with {len(self.incidents)} incidents")
+        return len(self.incidents)
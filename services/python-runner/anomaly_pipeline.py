@@ -0,0 +1,201 @@
+"""
+Incremental Anomaly Pipeline for the Python Runner
+Scores each series only on datapoints that have not been scored yet. Points
+are read from the local time-series store; every request carries the new
+points plus the few preceding ones the detector's rolling features need
+(score_after tells the detector which points are context only). Detected
+anomalies are cached per series, so monitoring reads results instead of
+re-fetching and rescoring hours of history. Pending series are sent to the
+detector in batches, one request per batch; with a detection planner the
+batches follow its priority order and stop when its budget is spent.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from rollups import parse_timestamp
+
+logger = logging.getLogger('AnomalyPipeline')
+
+# The detector's widest rolling window is 24 points
+DEFAULT_CONTEXT_POINTS = 24
+# IsolationForest needs at least 10 points per request
+MIN_DETECTION_POINTS = 10
+DEFAULT_LOOKBACK_SECONDS = 2 * 3600
+DEFAULT_RESULT_RETENTION_SECONDS = 24 * 3600
+DEFAULT_BATCH_MAX_SERIES = 200
+
+
+def isoformat(ts):
+    return datetime.utcfromtimestamp(ts).isoformat() + '+00:00'
+
+
+class AnomalyPipeline:
+    def __init__(self, store, context_points=None, lookback_seconds=None, result_retention_seconds=None,
+                 batch_max_series=None, planner=None):
+        self.store = store
+        self.planner = planner
+        self.context_points = int(context_points or os.getenv('ANOMALY_CONTEXT_POINTS', DEFAULT_CONTEXT_POINTS))
+        # How far back a series that was never scored is scored on its first run
+        self.lookback = float(lookback_seconds or os.getenv('ANOMALY_LOOKBACK_SECONDS', DEFAULT_LOOKBACK_SECONDS))
+        self.result_retention = float(result_retention_seconds or os.getenv(
+            'ANOMALY_RESULT_RETENTION_SECONDS', DEFAULT_RESULT_RETENTION_SECONDS))
+        self.batch_max_series = int(batch_max_series or os.getenv('ANOMALY_BATCH_MAX_SERIES', DEFAULT_BATCH_MAX_SERIES))
+
+        self.last_scored = {}   # series key -> epoch seconds of the newest scored point
+        self.results = {}       # series key -> {epoch seconds: anomaly}
+        self._lock = threading.Lock()
+        # Collection and monitoring jobs both run the pipeline; one run at a time
+        # keeps them from sending the same unscored points twice
+        self._run_lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'series_sent': 0,
+            'points_sent': 0,
+            'points_scored': 0,
+            'series_up_to_date': 0,
+            'series_insufficient_data': 0,
+            'failed_series': 0
+        }
+
+    def pending(self, key, now=None):
+        """
+        (metrics_data, score_after, newest, new_points, priority) for a series
+        with unscored points, or None when it is up to date or has too little
+        data to score. Priority is the planner's pre-screen score (0 without one).
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            last = self.last_scored.get(key)
+        start = (last if last is not None else now) - self.lookback
+        result = self.store.read(key, start, now)
+        if result is None:
+            return None
+        timestamps, values = result
+
+        first_new = 0 if last is None else int((timestamps <= last).sum())
+        if first_new >= len(timestamps):
+            self.stats['series_up_to_date'] += 1
+            return None
+        begin = max(0, first_new - self.context_points)
+        if len(timestamps) - begin < MIN_DETECTION_POINTS:
+            self.stats['series_insufficient_data'] += 1
+            return None
+
+        metadata = self.store.catalog.get(key, {})
+        metrics_data = [
+            {'source': 'aws', **metadata, 'metricValue': value, 'timestamp': isoformat(ts)}
+            for ts, value in zip(timestamps[begin:].tolist(), values[begin:].tolist())
+        ]
+        score_after = isoformat(last) if last is not None and first_new > 0 else None
+        priority = self.planner.prescreen(key, values, first_new, now) if self.planner else 0.0
+        return metrics_data, score_after, int(timestamps[-1]), len(timestamps) - first_new, priority
+
+    def run(self, keys, detect_batch):
+        """
+        Score the unscored points of the given series. detect_batch receives
+        {key: (metrics_data, score_after)} and returns {key: anomalies}, with
+        None or a missing key for series that failed. Returns {key: new anomalies}.
+        A run waits for one already in progress, then scores only what it left.
+        """
+        with self._run_lock:
+            return self._run(keys, detect_batch)
+
+    def _run(self, keys, detect_batch):
+        pending = {}
+        for key in keys:
+            work = self.pending(key)
+            if work is not None:
+                pending[key] = work
+
+        found = {}
+        if self.planner is None:
+            ordered = list(pending)
+            for offset in range(0, len(ordered), self.batch_max_series):
+                self._score_batch(ordered[offset:offset + self.batch_max_series], pending, detect_batch, found)
+        else:
+            # The budget spans the collection cycle (the owner calls planner.begin_cycle),
+            # so every run within one cycle draws on the same budget
+            overdue, ranked = self.planner.plan({key: work[4] for key, work in pending.items()})
+            # Overdue series are scored whatever the budget; the rest while it lasts
+            for offset in range(0, len(overdue), self.batch_max_series):
+                self._score_batch(overdue[offset:offset + self.batch_max_series], pending, detect_batch, found,
+                                  overdue=True)
+            offset = 0
+            while offset < len(ranked):
+                affordable = self.planner.affordable()
+                size = self.batch_max_series if affordable is None else min(self.batch_max_series, affordable)
+                if size < 1:
+                    self.planner.defer(ranked[offset:])
+                    break
+                self._score_batch(ranked[offset:offset + size], pending, detect_batch, found)
+                offset += size
+
+        self.expire()
+        return found
+
+    def _score_batch(self, keys, pending, detect_batch, found, overdue=False):
+        batch = {key: pending[key] for key in keys}
+        self.stats['requests'] += 1
+        self.stats['series_sent'] += len(batch)
+        self.stats['points_sent'] += sum(len(work[0]) for work in batch.values())
+        started = time.perf_counter()
+        results = detect_batch({key: (work[0], work[1]) for key, work in batch.items()}) or {}
+        elapsed = time.perf_counter() - started
+
+        scored = []
+        with self._lock:
+            for key, (_, _, newest, new_points, _) in batch.items():
+                anomalies = results.get(key)
+                if anomalies is None:
+                    # Left unscored; the next run retries the same points
+                    self.stats['failed_series'] += 1
+                    continue
+                scored.append(key)
+                self.stats['points_scored'] += new_points
+                self.last_scored[key] = newest
+                cached = self.results.setdefault(key, {})
+                for anomaly in anomalies:
+                    cached[parse_timestamp(anomaly['timestamp'])] = anomaly
+                if anomalies:
+                    found[key] = anomalies
+        if self.planner is not None:
+            self.planner.charge(scored, elapsed, overdue=overdue)
+
+    def cached_anomalies(self, keys, since, min_score=0.0):
+        """Cached anomalies of the given series newer than `since`, at or above min_score"""
+        with self._lock:
+            return {
+                key: [a for ts, a in sorted(self.results[key].items())
+                      if ts >= since and a.get('anomaly_score', 0) >= min_score]
+                for key in keys if key in self.results
+            }
+
+    def expire(self, now=None):
+        cutoff = (now if now is not None else time.time()) - self.result_retention
+        with self._lock:
+            for key in list(self.results):
+                cached = self.results[key]
+                for ts in [ts for ts in cached if ts < cutoff]:
+                    del cached[ts]
+                if not cached:
+                    del self.results[key]
+
+    def forget(self, keys):
+        """Drop the scoring state of series the store no longer holds"""
+        with self._lock:
+            for key in keys:
+                self.last_scored.pop(key, None)
+                self.results.pop(key, None)
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'tracked_series': len(self.last_scored),
+                'cached_anomalies': sum(len(cached) for cached in self.results.values()),
+                'context_points': self.context_points,
+                **self.stats
+            }
@@ -0,0 +1,227 @@
+"""
+AWS API Accounting for the Python Runner
+Counts what the collector asks AWS for, from botocore's event system: every
+client the pool creates gets before-parameter-build/after-call handlers, so calls,
+metrics requested and response bytes are recorded per service, operation,
+account and collection cycle without touching the call sites. Counts are
+priced with the CloudWatch request pricing (overridable with
+AWS_API_PRICING) into an estimated cost.
+
+A per-cycle and per-day budget turns the estimate into a guard. At the start
+of a cycle the allowance is the cycle budget, or what is left of the day's
+budget spread over the day's remaining cycles if that is smaller; when the
+full cycle is expected to cost more, the polling planner stretches series'
+polling intervals (coarser collection resolution). Within the cycle,
+batches that would overspend the allowance are cut, lowest-priority series
+first, and the deferred series stay due for the next cycle.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger('ApiAccounting')
+
+# USD per 1,000 units; 'metrics' is billed per metric requested, 'requests' per call
+DEFAULT_PRICING = {
+    'cloudwatch:GetMetricData': {'unit': 'metrics', 'usd_per_1000': 0.01},
+    'cloudwatch:GetMetricStatistics': {'unit': 'requests', 'usd_per_1000': 0.01},
+    'cloudwatch:ListMetrics': {'unit': 'requests', 'usd_per_1000': 0.01},
+    'cloudwatch:DescribeAlarms': {'unit': 'requests', 'usd_per_1000': 0.01},
+}
+MAX_STRETCH = 12
+COST_SMOOTHING = 0.3
+
+
+def _totals():
+    return {'calls': 0, 'metrics_requested': 0, 'response_bytes': 0, 'errors': 0, 'estimated_cost_usd': 0.0}
+
+
+def _add(totals, calls=0, metrics=0, response_bytes=0, errors=0, cost=0.0):
+    totals['calls'] += calls
+    totals['metrics_requested'] += metrics
+    totals['response_bytes'] += response_bytes
+    totals['errors'] += errors
+    totals['estimated_cost_usd'] += cost
+
+
+def _rounded(totals):
+    return {**totals, 'estimated_cost_usd': round(totals['estimated_cost_usd'], 6)}
+
+
+def metrics_requested(operation, params):
+    """CloudWatch metrics a call asks for (GetMetricData bills per query)"""
+    if operation == 'GetMetricData':
+        return len(params.get('MetricDataQueries', []))
+    if operation == 'GetMetricStatistics':
+        return 1
+    return 0
+
+
+def response_size(http_response):
+    """Body bytes of a botocore response, without reading a body that was not read already"""
+    if http_response is None:
+        return 0
+    length = http_response.headers.get('Content-Length')
+    if length is not None and length.isdigit():
+        return int(length)
+    if http_response.raw is None:
+        return 0
+    return len(http_response.content or b'')
+
+
+class ApiAccounting:
+    def __init__(self, cycle_budget_usd=None, daily_budget_usd=None, pricing=None, cycle_seconds=300):
+        # 0 disables a budget
+        self.cycle_budget = float(cycle_budget_usd if cycle_budget_usd is not None else os.getenv(
+            'AWS_CYCLE_BUDGET_USD', 0))
+        self.daily_budget = float(daily_budget_usd if daily_budget_usd is not None else os.getenv(
+            'AWS_DAILY_BUDGET_USD', 0))
+        self.pricing = dict(DEFAULT_PRICING)
+        self.pricing.update(pricing if pricing is not None else json.loads(os.getenv('AWS_API_PRICING', '{}')))
+        self.cycle_seconds = float(cycle_seconds)
+
+        self._lock = threading.Lock()
+        self.cycle_number = 0
+        self.cycle = _totals()
+        self.last_cycle = None
+        self.day = datetime.now(timezone.utc).date()
+        self.today = _totals()
+        self.by_operation = {}      # 'service:Operation' -> totals
+        self.by_account = {}        # account id -> totals
+        self.allowance = None       # USD this cycle may spend, None without a budget
+        self.stretch = 1
+        # Cost of a cycle that polls every due series, smoothed across cycles
+        self.expected_cycle_cost = None
+        self.cycle_deferred = 0
+        self.cycle_deferred_cost = 0.0
+        self.stats = {
+            'cycles': 0,
+            'series_deferred': 0,
+            'degraded_cycles': 0
+        }
+
+    def attach(self, client, account_id, region):
+        """Register the accounting handlers on a new boto3 client"""
+        service = client.meta.service_model.service_name
+        events = client.meta.events
+
+        def before_parameter_build(params, model, context, **kwargs):
+            context['accounting_metrics'] = metrics_requested(model.name, params)
+
+        def after_call(http_response, model, context, **kwargs):
+            failed = http_response is None or http_response.status_code >= 300
+            self.record(service, model.name, account_id, context.get('accounting_metrics', 0),
+                        response_size(http_response), failed)
+
+        events.register('before-parameter-build.*.*', before_parameter_build,
+                        unique_id=f"api-accounting-before-{id(self)}")
+        events.register('after-call.*.*', after_call, unique_id=f"api-accounting-after-{id(self)}")
+
+    def price(self, service, operation, calls=1, metrics=0):
+        rule = self.pricing.get(f"{service}:{operation}")
+        if not rule:
+            return 0.0
+        units = metrics if rule.get('unit') == 'metrics' else calls
+        return units * float(rule.get('usd_per_1000', 0)) / 1000
+
+    def record(self, service, operation, account_id, metrics=0, response_bytes=0, failed=False):
+        cost = self.price(service, operation, 1, metrics)
+        with self._lock:
+            self._roll_day()
+            for totals in (self.cycle, self.today,
+                           self.by_operation.setdefault(f"{service}:{operation}", _totals()),
+                           self.by_account.setdefault(account_id, _totals())):
+                _add(totals, 1, metrics, response_bytes, int(failed), cost)
+        return cost
+
+    def _roll_day(self, now=None):
+        today = (now or datetime.now(timezone.utc)).date()
+        if today != self.day:
+            self.day = today
+            self.today = _totals()
+
+    def begin_cycle(self, cycle_seconds=None, now=None):
+        """
+        Close the previous cycle and set this one's allowance; returns the
+        polling stretch (1 = full resolution) the planner should apply
+        """
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            self._roll_day(now)
+            if cycle_seconds:
+                self.cycle_seconds = float(cycle_seconds)
+            if self.cycle_number:
+                self.last_cycle = {'cycle': self.cycle_number, 'deferred_series': self.cycle_deferred,
+                                   **_rounded(self.cycle)}
+                # What the cycle would have cost without deferrals, at full resolution
+                full_cost = (self.cycle['estimated_cost_usd'] + self.cycle_deferred_cost) * self.stretch
+                self.expected_cycle_cost = full_cost if self.expected_cycle_cost is None else \
+                    self.expected_cycle_cost + COST_SMOOTHING * (full_cost - self.expected_cycle_cost)
+            self.cycle_number += 1
+            self.cycle = _totals()
+            self.cycle_deferred = 0
+            self.cycle_deferred_cost = 0.0
+            self.stats['cycles'] += 1
+
+            allowances = []
+            if self.cycle_budget > 0:
+                allowances.append(self.cycle_budget)
+            if self.daily_budget > 0:
+                midnight = datetime(now.year, now.month, now.day, tzinfo=timezone.utc).timestamp() + 86400
+                cycles_left = max(1.0, (midnight - now.timestamp()) / self.cycle_seconds)
+                allowances.append(max(0.0, self.daily_budget - self.today['estimated_cost_usd']) / cycles_left)
+            self.allowance = min(allowances) if allowances else None
+
+            self.stretch = 1
+            if self.allowance is not None and self.expected_cycle_cost:
+                if self.allowance <= 0:
+                    self.stretch = MAX_STRETCH
+                else:
+                    self.stretch = min(MAX_STRETCH, max(1, math.ceil(self.expected_cycle_cost / self.allowance)))
+            if self.stretch > 1:
+                self.stats['degraded_cycles'] += 1
+                logger.warning(f"AWS API budget: expected cycle cost ${self.expected_cycle_cost:.4f} exceeds "
+                               f"the ${self.allowance:.4f} allowance; polling intervals stretched x{self.stretch}")
+            return self.stretch
+
+    def affordable(self, service, operation, metrics):
+        """How many of `metrics` metrics one more call may request within the cycle allowance"""
+        with self._lock:
+            if self.allowance is None:
+                return metrics
+            remaining = self.allowance - self.cycle['estimated_cost_usd']
+        unit_cost = self.price(service, operation, 0, 1)
+        if unit_cost <= 0:
+            return metrics if self.price(service, operation, 1, 0) <= remaining else 0
+        return max(0, min(metrics, int(remaining / unit_cost + 1e-9)))
+
+    def defer(self, series, metrics=0):
+        """Series (and their GetMetricData queries) left for the next cycle by the budget"""
+        cost = self.price('cloudwatch', 'GetMetricData', 0, metrics)
+        with self._lock:
+            self.cycle_deferred += series
+            self.cycle_deferred_cost += cost
+            self.stats['series_deferred'] += series
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'cycle_budget_usd': self.cycle_budget,
+                'daily_budget_usd': self.daily_budget,
+                'cycle_allowance_usd': round(self.allowance, 6) if self.allowance is not None else None,
+                'expected_cycle_cost_usd': round(self.expected_cycle_cost, 6)
+                if self.expected_cycle_cost is not None else None,
+                'resolution_stretch': self.stretch,
+                'current_cycle': {'cycle': self.cycle_number, 'deferred_series': self.cycle_deferred,
+                                  **_rounded(self.cycle)},
+                'last_cycle': self.last_cycle,
+                'today': {'date': self.day.isoformat(), **_rounded(self.today)},
+                'by_operation': {name: _rounded(totals) for name, totals in sorted(self.by_operation.items())},
+                'by_account': {name: _rounded(totals) for name, totals in sorted(self.by_account.items())},
+                'pricing_usd_per_1000': self.pricing,
+                **self.stats
+            }
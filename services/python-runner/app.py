@@ -1,28 +1,161 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response
+from functools import wraps
+import importlib.util
 import subprocess
 import os
-import boto3
+import sys
 from datetime import datetime, timedelta
 import threading
 import time
 import tempfile
 import shutil
 from pathlib import Path
-try:
-    import git
-except ImportError:
-    git = None
-    print("Warning: GitPython not installed. GitHub integration will not work.")
 
-from metrics_collector import metrics_collector, start_collection_thread
+from instrumentation import (
+    registry, REPO_CLONE_BYTES, REPO_CLONE_SECONDS, RESULT_CACHE_REQUESTS, SCRIPT_QUEUE_DEPTH, SCRIPT_RUN_SECONDS
+)
+from rollups import parse_timestamp
 
 app = Flask(__name__)
 
 # Start the metrics collection thread when the app starts
 collection_thread = None
 
+# GitPython and the collector (boto3, local stores, snapshots) are loaded on
+# first use so the runner starts serving in milliseconds
+GIT_AVAILABLE = importlib.util.find_spec('git') is not None
+if not GIT_AVAILABLE:
+    print("Warning: GitPython not installed. GitHub integration will not work.")
+
+
+def get_metrics_collector(create=True):
+    """The process-wide metrics collector; with create=False, None until something has built it"""
+    if not create and 'metrics_collector' not in sys.modules:
+        return None
+    import metrics_collector
+    return metrics_collector.get_metrics_collector(create)
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """The process-wide script result cache, created on first use"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            from result_cache import ResultCache
+            _result_cache = ResultCache()
+        return _result_cache
+
+
+def credential_identity(credentials):
+    """
+    Who a script runs as, for cache keys: the access key id and region plus a
+    keyed hash of the secret and session token, never the secrets themselves
+    """
+    credentials = credentials or {}
+    return {
+        'aws_access_key_id': credentials.get('aws_access_key_id'),
+        'aws_default_region': credentials.get('aws_default_region'),
+        'secret_digest': get_result_cache().identity_digest(
+            credentials.get('aws_secret_access_key'), credentials.get('aws_session_token'))
+    }
+
+
+def inline_cache_key(data):
+    from result_cache import make_key
+    if not data.get('script'):
+        return None
+    return make_key('inline', data['script'], data.get('env_vars', {}), credential_identity(data.get('credentials')))
+
+
+def github_cache_key(data):
+    """Keyed by the commit the branch points to, so a push invalidates earlier results"""
+    from repo_checkout import authenticated_url, resolve_commit
+    from result_cache import make_key
+    repo_url, script_path = data.get('repo_url'), data.get('script_path')
+    if not repo_url or not script_path or not GIT_AVAILABLE:
+        return None
+    commit = resolve_commit(authenticated_url(repo_url, data.get('github_token')), data.get('branch', 'main'),
+                            timeout=float(os.getenv('GIT_LS_REMOTE_TIMEOUT_SECONDS', 10)))
+    if commit is None:
+        return None
+    return make_key('github', repo_url, commit, script_path, data.get('extra_paths', []),
+                    data.get('env_vars', {}), credential_identity(data.get('credentials')))
+
+
+def cache_script_result(key_func):
+    """
+    Serve repeated identical runs from the result cache when the request sets
+    cache_ttl (seconds, or true for the default). key_func(data) returns the
+    cache key, or None when the result cannot be cached. Responses carry
+    X-Cache (HIT, MISS, COALESCED or BYPASS), Age and Cache-Control headers;
+    a request with Cache-Control: no-cache reruns the script and refreshes
+    the entry.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True) or {}
+            ttl = data.get('cache_ttl')
+            if not ttl:
+                return func(*args, **kwargs)
+            from result_cache import DEFAULT_TTL_SECONDS
+            try:
+                ttl = DEFAULT_TTL_SECONDS if ttl is True else float(ttl)
+            except (TypeError, ValueError):
+                return jsonify({"error": "cache_ttl must be a number of seconds or true"}), 400
+            
+            key = key_func(data)
+            if key is None:
+                RESULT_CACHE_REQUESTS.inc(outcome='bypass')
+                response = make_response(func(*args, **kwargs))
+                response.headers['X-Cache'] = 'BYPASS'
+                return response
+            
+            def compute():
+                response = make_response(func(*args, **kwargs))
+                return response.status_code, response.get_json()
+            
+            refresh = 'no-cache' in request.headers.get('Cache-Control', '')
+            entry, state = get_result_cache().get_or_compute(key, ttl, compute, refresh=refresh)
+            RESULT_CACHE_REQUESTS.inc(outcome=state.lower())
+            
+            now = time.time()
+            response = make_response(jsonify(entry['body']), entry['status'])
+            response.headers['X-Cache'] = state
+            response.headers['X-Cache-Key'] = key[:16]
+            response.headers['Age'] = str(int(max(0, now - entry['created'])))
+            response.headers['Cache-Control'] = f"private, max-age={int(max(0, entry['expires'] - now))}"
+            return response
+        return wrapper
+    return decorator
+
+
+def instrument_script_run(kind):
+    """Record duration, outcome and in-progress count of a script execution endpoint"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = 'error'
+            with SCRIPT_QUEUE_DEPTH.track_in_progress(kind=kind):
+                try:
+                    response = func(*args, **kwargs)
+                    status = response[1] if isinstance(response, tuple) else 200
+                    outcome = 'success' if status < 400 else 'error'
+                    return response
+                finally:
+                    SCRIPT_RUN_SECONDS.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+        return wrapper
+    return decorator
+
 
 @app.route('/execute', methods=['POST'])
+@cache_script_result(inline_cache_key)
+@instrument_script_run('inline')
 def execute_script():
     data = request.json
     script = data.get('script')
@@ -64,19 +197,25 @@ def execute_script():
 
 
 @app.route('/execute-github', methods=['POST'])
+@cache_script_result(github_cache_key)
+@instrument_script_run('github')
 def execute_github_script():
     """
     Execute a Python script from a GitHub repository
     Supports multi-file projects with dependencies
     """
-    if git is None:
+    if not GIT_AVAILABLE:
         return jsonify({"error": "GitPython not installed"}), 500
+    import git
+    from repo_checkout import authenticated_url, checkout
     
     data = request.json
     repo_url = data.get('repo_url')  # https://github.com/user/repo.git
     branch = data.get('branch', 'main')
     script_path = data.get('script_path')  # scripts/main.py or scripts/
     github_token = data.get('github_token')  # Optional for private repos
+    extra_paths = data.get('extra_paths', [])  # More directories/files the script needs besides its own directory
+    sparse = data.get('sparse', True)  # False forces a full shallow clone
     credentials = data.get('credentials', {})
     env_vars = data.get('env_vars', {})
     
@@ -91,15 +230,15 @@ def execute_github_script():
         # Clone repository
         print(f"Cloning {repo_url} (branch: {branch})...")
         
-        if github_token:
-            # Inject token for private repos
-            if 'github.com' in repo_url:
-                auth_url = repo_url.replace('https://', f'https://{github_token}@')
-            else:
-                auth_url = repo_url
-            git.Repo.clone_from(auth_url, workspace, branch=branch, depth=1)
-        else:
-            git.Repo.clone_from(repo_url, workspace, branch=branch, depth=1)
+        # Inject token for private repos
+        auth_url = authenticated_url(repo_url, github_token)
+        
+        # Partial clone with a sparse checkout of the script's directory; falls back to a full shallow clone
+        clone_stats = checkout(auth_url, workspace, branch, script_path, extra_paths, sparse=sparse)
+        REPO_CLONE_SECONDS.observe(clone_stats['clone_seconds'], strategy=clone_stats['strategy'])
+        REPO_CLONE_BYTES.observe(clone_stats['git_dir_bytes'], strategy=clone_stats['strategy'])
+        print(f"Cloned with {clone_stats['strategy']} checkout in {clone_stats['clone_seconds']}s "
+              f"(.git is {clone_stats['git_dir_bytes']} bytes)")
         
         # Determine script to execute
         full_script_path = os.path.join(workspace, script_path)
@@ -231,7 +370,8 @@ def execute_github_script():
             "stderr": result.stderr,
             "returncode": result.returncode,
             "execution_time": execution_time,
-            "generated_files": generated_files
+            "generated_files": generated_files,
+            "clone": clone_stats
         }
         
         if result.returncode != 0:
@@ -265,13 +405,28 @@ def execute_github_script():
         except Exception as e:
             print(f"Failed to cleanup workspace: {e}")
 
+@app.route('/execute/cache', methods=['GET'])
+def result_cache_status():
+    """Entries, size and hit counts of the script result cache"""
+    try:
+        return jsonify(get_result_cache().get_status()), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to get result cache status: {str(e)}"}), 500
+
 @app.route('/metrics/start', methods=['POST'])
 def start_metrics_collection():
     """Start the automated metrics collection"""
     global collection_thread
+    metrics_collector = get_metrics_collector()
     
     try:
         if collection_thread and collection_thread.is_alive():
+            if metrics_collector.is_stopping:
+                # Stopped, but the previous scheduler's last cycle has not finished yet
+                return jsonify({
+                    "error": "Metrics collection is stopping; the current cycle is still finishing",
+                    "status": "stopping"
+                }), 409
             return jsonify({
                 "message": "Metrics collection is already running",
                 "status": "running"
@@ -292,6 +447,7 @@ def start_metrics_collection():
                 return jsonify({"error": "Failed to initialize AWS credentials"}), 400
         
         # Start collection thread
+        from metrics_collector import start_collection_thread
         collection_thread = start_collection_thread()
         
         return jsonify({
@@ -307,6 +463,7 @@ def start_metrics_collection():
 @app.route('/metrics/stop', methods=['POST'])
 def stop_metrics_collection():
     """Stop the automated metrics collection"""
+    metrics_collector = get_metrics_collector()
     try:
         metrics_collector.stop_collection()
         
@@ -322,6 +479,7 @@ def stop_metrics_collection():
 @app.route('/metrics/status', methods=['GET'])
 def get_metrics_collection_status():
     """Get the current status of metrics collection"""
+    metrics_collector = get_metrics_collector()
     try:
         status = metrics_collector.get_collection_status()
         status['thread_alive'] = collection_thread.is_alive() if collection_thread else False
@@ -334,6 +492,7 @@ def get_metrics_collection_status():
 @app.route('/metrics/collect-now', methods=['POST'])
 def collect_metrics_now():
     """Trigger an immediate metrics collection"""
+    metrics_collector = get_metrics_collector()
     try:
         # Configure AWS credentials if provided
         data = request.json or {}
@@ -349,28 +508,280 @@ def collect_metrics_now():
             if not success:
                 return jsonify({"error": "Failed to initialize AWS credentials"}), 400
         
-        # Run immediate collection
-        success = metrics_collector.collect_all_metrics()
+        # Run immediate collection, profiled when ?profile=1 is given
+        profile = request.args.get('profile', '').lower() in ('1', 'true', 'yes')
+        success = metrics_collector.collect_all_metrics(profile=profile)
+        if success is None:
+            return jsonify({
+                "error": "A metrics collection cycle is already running",
+                "status": "running"
+            }), 409
+        profile_id = metrics_collector.last_profile_id if profile else None
         
         if success:
             return jsonify({
                 "message": "Metrics collection completed successfully",
                 "status": "completed",
                 "timestamp": datetime.utcnow().isoformat(),
-                "statistics": metrics_collector.collection_stats
+                "statistics": metrics_collector.collection_stats,
+                "profile_id": profile_id
             }), 200
         else:
             return jsonify({
                 "error": "Metrics collection failed",
-                "statistics": metrics_collector.collection_stats
+                "statistics": metrics_collector.collection_stats,
+                "profile_id": profile_id
             }), 500
             
     except Exception as e:
         return jsonify({"error": f"Failed to collect metrics: {str(e)}"}), 500
 
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """List captured collection-cycle profiles, newest first"""
+    metrics_collector = get_metrics_collector()
+    try:
+        return jsonify({"profiles": metrics_collector.profiler.list_profiles()}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to list profiles: {str(e)}"}), 500
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Return the top-N function statistics of a captured profile"""
+    metrics_collector = get_metrics_collector()
+    record = metrics_collector.profiler.get_profile(profile_id)
+    if record is None:
+        return jsonify({"error": f"Profile not found: {profile_id}"}), 404
+    return jsonify(record), 200
+
+@app.route('/profiles/<profile_id>/stacks', methods=['GET'])
+def get_profile_stacks(profile_id):
+    """Return sampled stacks in folded format (input for flamegraph.pl / speedscope)"""
+    metrics_collector = get_metrics_collector()
+    stacks = metrics_collector.profiler.get_folded_stacks(profile_id)
+    if stacks is None:
+        return jsonify({"error": f"Profile not found: {profile_id}"}), 404
+    return Response(stacks, mimetype='text/plain')
+
+def _query_series(series, start, end, step, aggregation):
+    """One series from the local store, or from the rollups when the range is older than its window"""
+    metrics_collector = get_metrics_collector()
+    if not metrics_collector.tsdb.covers(start):
+        result = metrics_collector.rollups.query(series, start, end, step_seconds=step)
+        return {**result, "source": "rollups"} if result is not None else None
+    
+    result = metrics_collector.tsdb.query(series, start, end, step=step, aggregation=aggregation)
+    if result is None:
+        return None
+    timestamps, values = result
+    
+    return {
+        "series": series,
+        "metadata": metrics_collector.tsdb.catalog.get(series, {}),
+        "source": "tsdb",
+        "step": step,
+        "aggregation": aggregation if step else None,
+        "points": [
+            {"timestamp": datetime.utcfromtimestamp(ts).isoformat() + '+00:00', "value": value}
+            for ts, value in zip(timestamps.tolist(), values.tolist())
+        ]
+    }
+
+@app.route('/metrics/query', methods=['GET'])
+def query_metrics():
+    """
+    Range read of one series (`series`) or of every series matching a tag
+    selector (`selector`, e.g. "service=ec2 and tag:env=prod") from the local
+    store, optionally downsampled to `step` seconds with `agg` (avg, min, max,
+    sum, count, last). Ranges older than the store's window are answered from
+    the rollups instead.
+    """
+    metrics_collector = get_metrics_collector()
+    try:
+        series = request.args.get('series')
+        selector = request.args.get('selector')
+        if not series and not selector:
+            return jsonify({"error": "series or selector is required"}), 400
+        
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else time.time()
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else end - 3600
+        step = int(request.args['step']) if request.args.get('step') else None
+        aggregation = request.args.get('agg', 'avg')
+        
+        if selector:
+            matched = sorted(metrics_collector.series_index.select(selector))
+            results = [_query_series(key, start, end, step, aggregation) for key in matched]
+            return jsonify({
+                "selector": selector,
+                "series_count": len(matched),
+                "results": [result for result in results if result is not None]
+            }), 200
+        
+        result = _query_series(series, start, end, step, aggregation)
+        if result is None:
+            return jsonify({"error": f"Unknown series: {series}"}), 404
+        return jsonify(result), 200
+        
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to query metrics: {str(e)}"}), 500
+
+@app.route('/metrics/quantiles', methods=['GET'])
+def query_quantiles():
+    """
+    Percentiles (`q`, comma-separated, default 0.5,0.95,0.99) over [start, end]
+    of one series, or of every series matching `selector` merged together,
+    e.g. a Lambda's Duration across regions. `per_series=1` adds each
+    series' own percentiles. Served from the rollup sketches.
+    """
+    metrics_collector = get_metrics_collector()
+    try:
+        series = request.args.get('series')
+        selector = request.args.get('selector')
+        if not series and not selector:
+            return jsonify({"error": "series or selector is required"}), 400
+        
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else time.time()
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else end - 86400
+        quantiles = [float(q) for q in request.args.get('q', '0.5,0.95,0.99').split(',')]
+        if any(not 0 <= q <= 1 for q in quantiles):
+            raise ValueError("quantiles must be between 0 and 1")
+        per_series = request.args.get('per_series', '').lower() in ('1', 'true', 'yes')
+        
+        keys = sorted(metrics_collector.series_index.select(selector)) if selector else [series]
+        result = metrics_collector.rollups.quantiles(keys, start, end, quantiles, per_series=per_series)
+        if not selector and result['series_count'] == 0:
+            return jsonify({"error": f"Unknown series: {series}"}), 404
+        return jsonify({"selector": selector, "series": series, "start": start, "end": end, **result}), 200
+        
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to query quantiles: {str(e)}"}), 500
+
+@app.route('/metrics/series', methods=['GET'])
+def list_series():
+    """List indexed series, optionally narrowed by a tag selector; `label` lists the values of one label"""
+    metrics_collector = get_metrics_collector()
+    try:
+        index = metrics_collector.series_index
+        if request.args.get('label'):
+            label = request.args['label']
+            return jsonify({"label": label, "values": index.label_values(label)}), 200
+        
+        selector = request.args.get('selector')
+        matched = index.select(selector)
+        return jsonify({
+            "selector": selector,
+            "series_count": len(matched),
+            "series": index.describe(matched)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({"error": f"Invalid selector: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to list series: {str(e)}"}), 500
+
+@app.route('/metrics/alerts', methods=['GET'])
+def list_alerts():
+    """List anomaly incidents, newest first; `status` narrows to open or resolved ones"""
+    metrics_collector = get_metrics_collector()
+    try:
+        incidents = metrics_collector.alert_state.list_incidents(request.args.get('status'))
+        return jsonify({"incidents": incidents, "count": len(incidents)}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to list alerts: {str(e)}"}), 500
+
+@app.route('/metrics/alerts/correlated', methods=['GET'])
+def list_correlated_alerts():
+    """List the grouped incidents of the latest correlation run, newest first"""
+    metrics_collector = get_metrics_collector()
+    try:
+        incidents = metrics_collector.correlator.list_incidents()
+        return jsonify({"incidents": incidents, "count": len(incidents)}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to list correlated alerts: {str(e)}"}), 500
+
+@app.route('/metrics/rollups/series', methods=['GET'])
+def list_rollup_series():
+    """List the series that have local rollups"""
+    metrics_collector = get_metrics_collector()
+    try:
+        return jsonify({"series": metrics_collector.rollups.list_series()}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to list series: {str(e)}"}), 500
+
+@app.route('/metrics/rollups/query', methods=['GET'])
+def query_rollups():
+    """
+    Range query for one series; served from the coarsest resolution (raw, 1h, 1d)
+    that satisfies the requested step or max_points
+    """
+    metrics_collector = get_metrics_collector()
+    try:
+        series = request.args.get('series')
+        if not series:
+            return jsonify({"error": "series is required"}), 400
+        
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else time.time()
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else end - 86400
+        step = float(request.args['step']) if request.args.get('step') else None
+        max_points = int(request.args['max_points']) if request.args.get('max_points') else None
+        
+        result = metrics_collector.rollups.query(series, start, end, step_seconds=step, max_points=max_points)
+        if result is None:
+            return jsonify({"error": f"Unknown series: {series}"}), 404
+        return jsonify(result), 200
+        
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to query rollups: {str(e)}"}), 500
+
+@app.route('/metrics/accounts', methods=['GET'])
+def get_metrics_accounts():
+    """List the configured AWS accounts and the shard assignment of this instance"""
+    metrics_collector = get_metrics_collector()
+    try:
+        pool = metrics_collector.client_pool
+        return jsonify({
+            "accounts": [account.describe() for account in pool.accounts.values()],
+            "owned_accounts": [account.account_id for account in pool.owned_accounts()],
+            "shard_id": pool.shard_id or None,
+            "shard_members": pool.ring.members if pool.ring else []
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Failed to list accounts: {str(e)}"}), 500
+
+@app.route('/metrics/accounts', methods=['POST'])
+def configure_metrics_accounts():
+    """Replace the set of AWS accounts to collect from"""
+    metrics_collector = get_metrics_collector()
+    try:
+        data = request.json or {}
+        accounts = data.get('accounts')
+        
+        if not isinstance(accounts, list) or not accounts:
+            return jsonify({"error": "accounts must be a non-empty list"}), 400
+        
+        if not metrics_collector.configure_accounts(accounts):
+            return jsonify({"error": "Failed to initialize AWS credentials"}), 400
+        
+        return jsonify({
+            "message": "Accounts configured successfully",
+            "accounts": [account.describe() for account in metrics_collector.client_pool.accounts.values()],
+            "owned_accounts": [account.account_id for account in metrics_collector.client_pool.owned_accounts()]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Failed to configure accounts: {str(e)}"}), 500
+
 @app.route('/metrics/configure', methods=['POST'])
 def configure_metrics_collection():
     """Configure metrics collection parameters"""
+    metrics_collector = get_metrics_collector()
     try:
         data = request.json or {}
         
@@ -401,10 +812,17 @@ def configure_metrics_collection():
     except Exception as e:
         return jsonify({"error": f"Failed to update configuration: {str(e)}"}), 500
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose runner and collector instrumentation in Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
+        # Reports on the collector without building it
+        metrics_collector = get_metrics_collector(create=False)
         status = {
             "service": "python-runner",
             "status": "healthy",
@@ -412,7 +830,7 @@ def health_check():
             "metrics_collector": {
                 "initialized": metrics_collector is not None,
                 "running": metrics_collector.is_running if metrics_collector else False,
-                "aws_clients": metrics_collector.cloudwatch_client is not None if metrics_collector else False
+                "aws_clients": metrics_collector.client_pool.has_accounts() if metrics_collector else False
             }
         }
         
@@ -434,14 +852,24 @@ if __name__ == '__main__':
     print("Available endpoints:")
     print("  POST /execute - Execute Python scripts (inline)")
     print("  POST /execute-github - Execute scripts from GitHub repositories")
+    print("  GET /execute/cache - Script result cache status")
     print("  POST /metrics/start - Start automated metrics collection")
     print("  POST /metrics/stop - Stop metrics collection")
     print("  GET /metrics/status - Get collection status")
-    print("  POST /metrics/collect-now - Trigger immediate collection")
+    print("  POST /metrics/collect-now - Trigger immediate collection (?profile=1 to profile it)")
+    print("  GET /profiles - List captured profiles (/profiles/<id>, /profiles/<id>/stacks)")
     print("  POST /metrics/configure - Configure collection parameters")
+    print("  GET/POST /metrics/accounts - List or configure monitored AWS accounts")
+    print("  GET /metrics/query - Range reads from the local time-series store")
+    print("  GET /metrics/series - Series catalog with tag selectors")
+    print("  GET /metrics/quantiles - Percentiles over any window, merged across series")
+    print("  GET /metrics/alerts - Anomaly incidents")
+    print("  GET /metrics/alerts/correlated - Incidents grouped across series")
+    print("  GET /metrics/rollups/series, /metrics/rollups/query - Local 1h/1d rollups")
+    print("  GET /metrics - Prometheus metrics")
     print("  GET /health - Health check")
     
-    if git:
+    if GIT_AVAILABLE:
         print("✅ GitHub integration enabled")
     else:
         print("⚠️  GitHub integration disabled (GitPython not installed)")
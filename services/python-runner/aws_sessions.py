@@ -0,0 +1,317 @@
+"""
+AWS Session Pool for the Metrics Collector
+Manages lazily created, reusable boto3 clients per account and region,
+refreshes assumed-role credentials before they expire, and shards accounts
+across runner instances with a consistent hash ring
+"""
+
+import bisect
+import functools
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+
+import boto3
+from botocore.config import Config
+from botocore.credentials import AssumeRoleCredentialFetcher, CredentialProvider, DeferredRefreshableCredentials
+from botocore.session import get_session
+
+logger = logging.getLogger('AWSSessionPool')
+
+DEFAULT_REGION = 'us-east-1'
+
+
+class AccountConfig:
+    """One monitored AWS account and the regions to collect from"""
+
+    def __init__(self, account_id, aws_access_key_id=None, aws_secret_access_key=None,
+                 aws_session_token=None, role_arn=None, external_id=None, regions=None,
+                 name=None, session_duration_seconds=3600):
+        self.account_id = str(account_id)
+        self.name = name or self.account_id
+        self.aws_access_key_id = aws_access_key_id
+        self.aws_secret_access_key = aws_secret_access_key
+        self.aws_session_token = aws_session_token
+        self.role_arn = role_arn
+        self.external_id = external_id
+        self.regions = list(regions) if regions else [DEFAULT_REGION]
+        self.session_duration_seconds = int(session_duration_seconds)
+
+    @classmethod
+    def from_dict(cls, data):
+        account_id = data.get('account_id') or data.get('name')
+        if not account_id:
+            raise ValueError("AWS account entry needs an account_id or name")
+        regions = data.get('regions')
+        if not regions:
+            region = data.get('region') or data.get('aws_default_region')
+            regions = [region] if region else None
+        return cls(
+            account_id=account_id,
+            aws_access_key_id=data.get('aws_access_key_id'),
+            aws_secret_access_key=data.get('aws_secret_access_key'),
+            aws_session_token=data.get('aws_session_token'),
+            role_arn=data.get('role_arn'),
+            external_id=data.get('external_id'),
+            regions=regions,
+            name=data.get('name'),
+            session_duration_seconds=data.get('session_duration_seconds', 3600)
+        )
+
+    def fingerprint(self):
+        """Identity used to tell whether cached sessions are still valid after reconfiguration"""
+        return (self.aws_access_key_id, self.aws_secret_access_key, self.aws_session_token,
+                self.role_arn, self.external_id, self.session_duration_seconds)
+
+    def describe(self):
+        """Account details safe to expose over the API (no secrets)"""
+        return {
+            'account_id': self.account_id,
+            'name': self.name,
+            'regions': self.regions,
+            'role_arn': self.role_arn,
+            'credential_source': 'assume_role' if self.role_arn else 'static'
+        }
+
+
+class AssumeRoleCredentials(DeferredRefreshableCredentials):
+    """
+    Assumed-role credentials that refresh within a configurable margin of
+    expiry. botocore has no public setting for the refresh windows; they are
+    the _advisory/_mandatory_refresh_timeout attributes of
+    RefreshableCredentials (botocore 1.31, pinned through boto3 1.28).
+    """
+
+    def __init__(self, refresh_using, refresh_margin_seconds):
+        super().__init__(refresh_using=refresh_using, method='assume-role')
+        self._advisory_refresh_timeout = refresh_margin_seconds
+        self._mandatory_refresh_timeout = min(refresh_margin_seconds, 60)
+
+
+class StaticCredentialProvider(CredentialProvider):
+    """Hands a session a ready-made credentials object through the public provider chain"""
+
+    METHOD = 'assume-role'
+
+    def __init__(self, credentials):
+        super().__init__()
+        self.credentials = credentials
+
+    def load(self):
+        return self.credentials
+
+
+class HashRing:
+    """Consistent hash ring used to split accounts between runner instances"""
+
+    def __init__(self, members, virtual_nodes=100):
+        self.members = sorted(set(members))
+        self._ring = []
+        for member in self.members:
+            for i in range(virtual_nodes):
+                self._ring.append((self._hash(f"{member}#{i}"), member))
+        self._ring.sort()
+        self._keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+    def owner(self, key):
+        if not self._ring:
+            return None
+        idx = bisect.bisect(self._keys, self._hash(key)) % len(self._ring)
+        return self._ring[idx][1]
+
+
+class CollectionTarget:
+    """Clients for a single account/region pair, handed to the collect_* methods"""
+
+    def __init__(self, pool, account, region):
+        self.pool = pool
+        self.account = account
+        self.account_id = account.account_id
+        self.region = region
+
+    def client(self, service_name):
+        return self.pool.get_client(self.account_id, self.region, service_name)
+
+    def __repr__(self):
+        return f"CollectionTarget({self.account_id}, {self.region})"
+
+
+class AWSClientPool:
+    def __init__(self, shard_id=None, shard_members=None, refresh_margin_seconds=None,
+                 client_config=None, session_factory=None, on_client_created=None):
+        self.accounts = {}
+        self.shard_id = shard_id if shard_id is not None else os.getenv('COLLECTOR_SHARD_ID', '')
+        members = shard_members if shard_members is not None else \
+            [m.strip() for m in os.getenv('COLLECTOR_SHARD_MEMBERS', '').split(',') if m.strip()]
+        self.ring = HashRing(members) if members else None
+        if self.ring and self.shard_id not in self.ring.members:
+            logger.warning(f"Shard id '{self.shard_id}' is not in COLLECTOR_SHARD_MEMBERS; no accounts will be collected")
+        self.refresh_margin_seconds = int(refresh_margin_seconds if refresh_margin_seconds is not None
+                                          else os.getenv('ASSUME_ROLE_REFRESH_MARGIN_SECONDS', 300))
+        self.client_config = client_config or Config(max_pool_connections=20)
+        self.session_factory = session_factory or boto3.Session
+        # Called as on_client_created(client, account_id, region) to register event handlers
+        self.on_client_created = on_client_created
+
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._clients = {}
+        # (account_id, region) -> lock held while that session is created outside the pool lock
+        self._creating = {}
+        self.stats = {
+            'sessions_created': 0,
+            'clients_created': 0,
+            'client_reuses': 0,
+            'credential_refreshes': 0
+        }
+
+    def set_accounts(self, accounts):
+        """Replace the monitored accounts; cached clients of removed or changed accounts are dropped"""
+        new_accounts = {}
+        for account in accounts:
+            if isinstance(account, dict):
+                account = AccountConfig.from_dict(account)
+            new_accounts[account.account_id] = account
+
+        with self._lock:
+            for account_id in list(self.accounts):
+                if account_id not in new_accounts or \
+                        new_accounts[account_id].fingerprint() != self.accounts[account_id].fingerprint():
+                    self._evict(account_id)
+            self.accounts = new_accounts
+        logger.info(f"Configured {len(new_accounts)} AWS account(s) for collection")
+
+    def has_accounts(self):
+        return bool(self.accounts)
+
+    def owns(self, account_id):
+        """Whether this runner instance is responsible for the account"""
+        if self.ring is None:
+            return True
+        return self.ring.owner(account_id) == self.shard_id
+
+    def owned_accounts(self):
+        return [account for account_id, account in sorted(self.accounts.items()) if self.owns(account_id)]
+
+    def targets(self):
+        """All account/region pairs this instance should collect from"""
+        return [
+            CollectionTarget(self, account, region)
+            for account in self.owned_accounts()
+            for region in account.regions
+        ]
+
+    def get_client(self, account_id, region, service_name):
+        key = (account_id, region, service_name)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.stats['client_reuses'] += 1
+                return client
+        session, account = self._get_session(account_id, region)
+        client = session.client(service_name, config=self.client_config)
+        if self.on_client_created:
+            self.on_client_created(client, account_id, region)
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                self.stats['client_reuses'] += 1
+                return existing
+            # A client of an account reconfigured meanwhile is used once but not kept
+            if self.accounts.get(account_id) is account:
+                self._clients[key] = client
+            self.stats['clients_created'] += 1
+            return client
+
+    def _get_session(self, account_id, region):
+        """
+        (session, account) for an account/region. Sessions are created outside
+        the pool lock, so one slow credential source does not hold up the
+        other accounts; concurrent requests for the same pair wait for one
+        creation.
+        """
+        key = (account_id, region)
+        with self._lock:
+            account = self.accounts.get(account_id)
+            if account is None:
+                raise KeyError(f"Unknown AWS account: {account_id}")
+            session = self._sessions.get(key)
+            if session is not None:
+                return session, account
+            creating = self._creating.setdefault(key, threading.Lock())
+
+        with creating:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is not None and self.accounts.get(account_id) is account:
+                    return session, account
+            session = self._create_session(account, region)
+            with self._lock:
+                self._creating.pop(key, None)
+                if self.accounts.get(account_id) is account:
+                    self._sessions[key] = session
+                self.stats['sessions_created'] += 1
+            return session, account
+
+    def _create_session(self, account, region):
+        base_session = self.session_factory(
+            aws_access_key_id=account.aws_access_key_id,
+            aws_secret_access_key=account.aws_secret_access_key,
+            aws_session_token=account.aws_session_token,
+            region_name=region
+        )
+        if not account.role_arn:
+            return base_session
+
+        # Assumed-role credentials are fetched on first use and refresh themselves
+        # once they are within the margin of expiry
+        extra_args = {
+            'RoleSessionName': f"cloud-pulse-{account.account_id}",
+            'DurationSeconds': account.session_duration_seconds
+        }
+        if account.external_id:
+            extra_args['ExternalId'] = account.external_id
+        fetcher = AssumeRoleCredentialFetcher(
+            client_creator=functools.partial(base_session.client, config=self.client_config),
+            source_credentials=base_session.get_credentials(),
+            role_arn=account.role_arn,
+            extra_args=extra_args,
+            expiry_window_seconds=self.refresh_margin_seconds
+        )
+
+        def fetch_credentials():
+            credentials = fetcher.fetch_credentials()
+            with self._lock:
+                self.stats['credential_refreshes'] += 1
+            logger.info(f"Assumed role {account.role_arn} until {credentials['expiry_time']}")
+            return credentials
+
+        botocore_session = get_session()
+        botocore_session.get_component('credential_provider').insert_before(
+            'env', StaticCredentialProvider(AssumeRoleCredentials(fetch_credentials, self.refresh_margin_seconds)))
+        return boto3.Session(botocore_session=botocore_session, region_name=region)
+
+    def _evict(self, account_id):
+        for key in [k for k in self._sessions if k[0] == account_id]:
+            del self._sessions[key]
+        for key in [k for k in self._clients if k[0] == account_id]:
+            del self._clients[key]
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'accounts': len(self.accounts),
+                'owned_accounts': [a.account_id for a in self.owned_accounts()],
+                'shard_id': self.shard_id or None,
+                'shard_members': self.ring.members if self.ring else [],
+                'active_sessions': len(self._sessions),
+                'active_clients': len(self._clients),
+                'checked_at': datetime.utcnow().isoformat(),
+                **self.stats
+            }
@@ -0,0 +1,204 @@
+"""
+Offline Benchmark for AWSMetricsCollector
+Runs full collection cycles against fake AWS accounts and a local HTTP sink,
+then reports cycle wall time, AWS API call counts, peak memory and bytes sent.
+
+Usage (from services/python-runner):
+    python benchmarks/bench_collector.py --accounts 2 --instances 200 --functions 300
+    python benchmarks/bench_collector.py --save-baseline benchmarks/collector_baseline.json
+    python benchmarks/bench_collector.py --baseline benchmarks/collector_baseline.json
+
+With --baseline the exit code is 1 when any tracked number regresses by more
+than --tolerance (default 20%).
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RUNNER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RUNNER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the collector's log file, profiles and local stores out of /app when running locally
+os.environ.setdefault('METRICS_LOG_DIR', tempfile.mkdtemp(prefix='bench_logs_'))
+os.environ.setdefault('PROFILE_DIR', os.path.join(os.environ['METRICS_LOG_DIR'], 'profiles'))
+os.environ.setdefault('METRICS_DATA_DIR', tempfile.mkdtemp(prefix='bench_data_'))
+
+from fake_aws import FakeAWSAccount, HTTPSink  # noqa: E402
+from aws_sessions import AWSClientPool  # noqa: E402
+from metrics_collector import AWSMetricsCollector  # noqa: E402
+from polling_planner import PollingPlanner  # noqa: E402
+
+# Lower is better for every tracked number
+TRACKED_RESULTS = ['wall_time_seconds', 'api_calls_total', 'peak_memory_bytes', 'bytes_sent']
+
+
+def build_collector(fake, sink, args):
+    collector = AWSMetricsCollector()
+    collector.client_pool = AWSClientPool(
+        shard_id='', shard_members=[],
+        client_config=collector.client_pool.client_config,
+        session_factory=fake.session_factory,
+        on_client_created=collector.api_accounting.attach
+    )
+    if args.no_rate_limit:
+        for operation in list(collector.rate_limiter.budgets):
+            collector.rate_limiter.budgets[operation] = 1e6
+        collector.rate_limiter.default_rate = 1e6
+    collector.node_service_url = sink.url
+    collector.ai_service_url = sink.url
+    collector.configure_accounts([
+        {
+            'account_id': f"{100000000000 + i}",
+            'aws_access_key_id': 'AKIABENCHMARK',
+            'aws_secret_access_key': 'benchmark',
+            'regions': args.regions
+        }
+        for i in range(args.accounts)
+    ])
+    return collector
+
+
+def run_benchmark(args):
+    fake = FakeAWSAccount(
+        instances=args.instances,
+        db_instances=args.db_instances,
+        functions=args.functions,
+        buckets=args.buckets,
+        regions=args.regions,
+        load_balancers=args.load_balancers,
+        tables=args.tables,
+        clusters=args.clusters,
+        datapoints_per_series=args.datapoints,
+        api_latency_seconds=args.api_latency_ms / 1000.0,
+        throttle_rate=args.throttle_rate
+    )
+
+    with HTTPSink() as sink:
+        collector = build_collector(fake, sink, args)
+        # Connectivity checks made while configuring accounts are not part of a cycle
+        fake.calls.clear()
+
+        cycle_times = []
+        tracemalloc.start()
+        for _ in range(args.cycles):
+            if not args.keep_planner_state:
+                # Cycles run back to back, so a shared planner would skip everything after the first
+                collector.planner = PollingPlanner(base_interval_seconds=collector.planner.base_interval)
+            started = time.perf_counter()
+            collector.collect_all_metrics()
+            cycle_times.append(time.perf_counter() - started)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        aws = fake.report()
+        http = sink.report()
+
+    return {
+        'config': {
+            'accounts': args.accounts,
+            'regions': args.regions,
+            'instances': args.instances,
+            'db_instances': args.db_instances,
+            'functions': args.functions,
+            'buckets': args.buckets,
+            'load_balancers': args.load_balancers,
+            'tables': args.tables,
+            'clusters': args.clusters,
+            'datapoints_per_series': args.datapoints,
+            'api_latency_ms': args.api_latency_ms,
+            'throttle_rate': args.throttle_rate,
+            'cycles': args.cycles,
+            'rate_limited': not args.no_rate_limit,
+            'planner_state_kept': args.keep_planner_state
+        },
+        'results': {
+            'wall_time_seconds': round(sum(cycle_times) / len(cycle_times), 4),
+            'cycle_times_seconds': [round(t, 4) for t in cycle_times],
+            'api_calls_total': aws['api_calls_total'] / args.cycles,
+            'api_calls_by_operation': aws['api_calls'],
+            'throttled_calls': aws['throttled'],
+            'metrics_requested': aws['metrics_requested'],
+            'peak_memory_bytes': peak_memory,
+            'bytes_sent': http['bytes_sent'] / args.cycles,
+            'bytes_by_endpoint': http['bytes_by_endpoint'],
+            'http_requests': http['requests'],
+            'collection_stats': collector.collection_stats,
+            'rate_limiter': collector.rate_limiter.get_status(),
+            'polling_planner': collector.planner.get_status(),
+            'api_accounting': collector.api_accounting.get_status()
+        }
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """Return the tracked results that are worse than the baseline by more than the tolerance"""
+    regressions = []
+    for name in TRACKED_RESULTS:
+        current = report['results'].get(name)
+        previous = baseline.get('results', {}).get(name)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if change > tolerance:
+            regressions.append({
+                'metric': name,
+                'baseline': previous,
+                'current': current,
+                'change_percent': round(change * 100, 1)
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark AWSMetricsCollector against fake AWS accounts')
+    parser.add_argument('--accounts', type=int, default=1)
+    parser.add_argument('--regions', nargs='+', default=['us-east-1'])
+    parser.add_argument('--instances', type=int, default=50)
+    parser.add_argument('--db-instances', type=int, default=10)
+    parser.add_argument('--functions', type=int, default=100)
+    parser.add_argument('--buckets', type=int, default=20)
+    parser.add_argument('--load-balancers', type=int, default=5)
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--clusters', type=int, default=3)
+    parser.add_argument('--datapoints', type=int, default=3, help='Datapoints returned per series')
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help='Simulated latency per AWS call')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of AWS calls that are throttled')
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--no-rate-limit', action='store_true', help='Lift the per-API budgets')
+    parser.add_argument('--keep-planner-state', action='store_true',
+                        help='Share polling planner state across cycles instead of starting each cycle cold')
+    parser.add_argument('--baseline', help='Compare against a saved baseline JSON')
+    parser.add_argument('--save-baseline', help='Write the results as a new baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--verbose', action='store_true', help='Keep collector log output')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    report = run_benchmark(args)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare_to_baseline(report, baseline, args.tolerance)
+        exit_code = 1 if report['regressions'] else 0
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+    print(json.dumps(report, indent=2, default=str))
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Cold Start Benchmark for the Python Runner
+Runs each case in a fresh interpreter under `python -X importtime` and
+reports wall time, total import time and the slowest imports. Each case
+also lists modules that must stay unloaded on that path (importing the app
+or answering /health must not load boto3, GitPython or the collector);
+loading one is always a regression, independent of the machine.
+
+Usage (from services/python-runner):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --save-baseline benchmarks/startup_baseline.json
+    python benchmarks/bench_startup.py --baseline benchmarks/startup_baseline.json
+
+Exit code is 1 when a forbidden module is loaded, or with --baseline when a
+case's time regresses by more than --tolerance (default 50%).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RUNNER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFERRED_MODULES = ['boto3', 'botocore', 'git', 'metrics_collector']
+
+# name -> (code run in the child, modules that must not be loaded)
+CASES = {
+    'import_app': ("import app", DEFERRED_MODULES),
+    'health_request': ("import app\napp.app.test_client().get('/health')", DEFERRED_MODULES),
+    'collector_first_use': ("import app\napp.get_metrics_collector()", []),
+}
+
+# Prints the loaded top-level packages on stderr after the case ran
+MODULES_SUFFIX = (
+    "\nimport sys as _sys, json as _json\n"
+    "_sys.stderr.write('\\nMODULES=' + _json.dumps(sorted({m.split('.')[0] for m in _sys.modules})) + '\\n')\n"
+)
+
+TRACKED_RESULTS = ['wall_time_seconds', 'import_time_seconds']
+
+
+def parse_importtime(stderr, top_n):
+    """(total seconds of top-level imports, slowest imports by cumulative time) from -X importtime output"""
+    total_us = 0
+    rows = []
+    for line in stderr.splitlines():
+        fields = line[len('import time:'):].split('|') if line.startswith('import time:') else []
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2]
+        # Nested imports are indented under the module that imported them
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += int(fields[1])
+        rows.append({'module': name.strip(), 'self_us': int(fields[0]), 'cumulative_us': int(fields[1])})
+    rows.sort(key=lambda row: row['cumulative_us'], reverse=True)
+    return total_us / 1e6, rows[:top_n]
+
+
+def run_case(name, top_n):
+    code, forbidden = CASES[name]
+    # Keep the collector's log file and local stores out of /app when running locally
+    scratch = tempfile.mkdtemp(prefix='bench_startup_')
+    env = {
+        **os.environ,
+        'PYTHONPATH': RUNNER_DIR,
+        'METRICS_LOG_DIR': os.path.join(scratch, 'logs'),
+        'METRICS_DATA_DIR': os.path.join(scratch, 'data'),
+        'PROFILE_DIR': os.path.join(scratch, 'profiles')
+    }
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code + MODULES_SUFFIX],
+        capture_output=True, text=True, cwd=RUNNER_DIR, env=env
+    )
+    wall_time = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"Case {name} failed: {proc.stderr[-2000:]}")
+
+    loaded = []
+    for line in proc.stderr.splitlines():
+        if line.startswith('MODULES='):
+            loaded = json.loads(line[len('MODULES='):])
+    import_time, slowest = parse_importtime(proc.stderr, top_n)
+    return {
+        'wall_time_seconds': round(wall_time, 4),
+        'import_time_seconds': round(import_time, 4),
+        'forbidden_loaded': sorted(set(forbidden) & set(loaded)),
+        'slowest_imports': slowest
+    }
+
+
+def run_suite(cases, repeats, top_n):
+    results = {}
+    for name in cases:
+        runs = [run_case(name, top_n) for _ in range(repeats)]
+        results[name] = min(runs, key=lambda run: run['wall_time_seconds'])
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Cases that load a forbidden module or got slower than the baseline by more than the tolerance"""
+    regressions = []
+    for name, current in results.items():
+        if current['forbidden_loaded']:
+            regressions.append({'case': name, 'metric': 'forbidden_loaded', 'current': current['forbidden_loaded']})
+        previous = (baseline or {}).get('results', {}).get(name, {})
+        for metric in TRACKED_RESULTS:
+            if previous.get(metric) and (current[metric] - previous[metric]) / previous[metric] > tolerance:
+                regressions.append({
+                    'case': name,
+                    'metric': metric,
+                    'baseline': previous[metric],
+                    'current': current[metric],
+                    'change_percent': round((current[metric] - previous[metric]) / previous[metric] * 100, 1)
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold start and import time of the python runner')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per case; the fastest is reported')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports listed per case')
+    parser.add_argument('--baseline', help='Compare against a saved baseline JSON')
+    parser.add_argument('--save-baseline', help='Write the results as a new baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative time growth')
+    args = parser.parse_args()
+
+    report = {
+        'python': sys.version.split()[0],
+        'results': run_suite(args.cases, args.repeats, args.top)
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report['regressions'] = compare_to_baseline(report['results'], baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    return 1 if report['regressions'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Local AWS Stand-in for Collector Benchmarks
+Fake accounts answer real boto3 clients from inside botocore (the same
+before-call hook botocore's Stubber uses), so parameter validation,
+serialization and the event system all run exactly as in production while
+no request ever leaves the process. A small HTTP sink plays node-service
+and ai-service.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+
+class FakeAWSAccount:
+    """Synthetic inventory plus CloudWatch datapoints for one account"""
+
+    def __init__(self, instances=50, db_instances=10, functions=100, buckets=20, load_balancers=0, tables=0,
+                 clusters=0, datapoints_per_series=3, api_latency_seconds=0.0, throttle_rate=0.0, seed=42,
+                 regions=('us-east-1',)):
+        self.instances = instances
+        self.db_instances = db_instances
+        self.functions = functions
+        self.buckets = buckets
+        self.load_balancers = load_balancers
+        self.tables = tables
+        self.clusters = clusters
+        # Buckets are spread over the regions round-robin
+        self.regions = list(regions)
+        self.datapoints_per_series = datapoints_per_series
+        self.api_latency = api_latency_seconds
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+
+        self.calls = Counter()
+        self.throttled = Counter()
+        self.metrics_requested = Counter()
+        self.response_bytes = Counter()
+        self._lock = threading.Lock()
+
+    def session_factory(self, **kwargs):
+        """Drop-in for boto3.Session in AWSClientPool(session_factory=...)"""
+        kwargs['aws_access_key_id'] = kwargs.get('aws_access_key_id') or 'AKIABENCHMARK'
+        kwargs['aws_secret_access_key'] = kwargs.get('aws_secret_access_key') or 'benchmark'
+        session = boto3.Session(**kwargs)
+        session.events.register('before-parameter-build', self._remember_params)
+        session.events.register('before-call', self._handle)
+        return session
+
+    @staticmethod
+    def _remember_params(params, context, **kwargs):
+        context['benchmark_params'] = params
+
+    def _handle(self, model, context, **kwargs):
+        operation = model.name
+        params = context.get('benchmark_params', {})
+
+        if self.api_latency:
+            time.sleep(self.api_latency)
+
+        with self._lock:
+            self.calls[operation] += 1
+            throttle = self.throttle_rate and self.random.random() < self.throttle_rate
+            if throttle:
+                self.throttled[operation] += 1
+
+        if throttle:
+            parsed = {
+                'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'},
+                'ResponseMetadata': {'HTTPStatusCode': 400}
+            }
+            return AWSResponse(None, 400, {}, None), parsed
+
+        handler = getattr(self, f"_op_{operation}", None)
+        parsed = handler(params) if handler else {}
+        parsed.setdefault('ResponseMetadata', {'HTTPStatusCode': 200})
+
+        size = len(json.dumps(parsed, default=str))
+        with self._lock:
+            self.response_bytes[operation] += size
+        return AWSResponse(None, 200, {'content-length': str(size)}, None), parsed
+
+    # Inventory ---------------------------------------------------------------
+
+    def _op_DescribeInstances(self, params):
+        return {'Reservations': [{
+            'Instances': [
+                {
+                    'InstanceId': f"i-{i:017x}",
+                    'InstanceType': 'm5.large',
+                    'State': {'Name': 'running'},
+                    'Tags': [
+                        {'Key': 'Name', 'Value': f"bench-{i}"},
+                        {'Key': 'env', 'Value': 'prod' if i % 3 else 'staging'}
+                    ]
+                }
+                for i in range(self.instances)
+            ]
+        }]}
+
+    def _op_DescribeDBInstances(self, params):
+        return {'DBInstances': [
+            {'DBInstanceIdentifier': f"bench-db-{i}", 'DBInstanceStatus': 'available'}
+            for i in range(self.db_instances)
+        ]}
+
+    def _op_ListFunctions(self, params):
+        # Lambda returns at most 50 functions per page
+        start = int(params.get('Marker', 0))
+        page = {'Functions': [{'FunctionName': f"bench-fn-{i}"}
+                              for i in range(start, min(start + 50, self.functions))]}
+        if start + 50 < self.functions:
+            page['NextMarker'] = str(start + 50)
+        return page
+
+    def _op_ListBuckets(self, params):
+        return {'Buckets': [
+            {'Name': f"bench-bucket-{i}", 'CreationDate': datetime(2024, 1, 1, tzinfo=timezone.utc)}
+            for i in range(self.buckets)
+        ]}
+
+    def _op_GetBucketLocation(self, params):
+        region = self.regions[int(params['Bucket'].rsplit('-', 1)[1]) % len(self.regions)]
+        return {'LocationConstraint': None if region == 'us-east-1' else region}
+
+    def _op_DescribeLoadBalancers(self, params):
+        return {'LoadBalancers': [
+            {
+                'LoadBalancerArn': f"arn:aws:elasticloadbalancing:us-east-1:123456789012:"
+                                   f"loadbalancer/app/bench-alb-{i}/{i:016x}",
+                'LoadBalancerName': f"bench-alb-{i}",
+                'Type': 'application'
+            }
+            for i in range(self.load_balancers)
+        ]}
+
+    def _op_ListTables(self, params):
+        return {'TableNames': [f"bench-table-{i}" for i in range(self.tables)]}
+
+    def _op_ListClusters(self, params):
+        return {'clusterArns': [
+            f"arn:aws:ecs:us-east-1:123456789012:cluster/bench-cluster-{i}" for i in range(self.clusters)
+        ]}
+
+    def _op_ListMetrics(self, params):
+        return {'Metrics': []}
+
+    # CloudWatch --------------------------------------------------------------
+
+    def _timestamps(self, start, end, period):
+        end = end if isinstance(end, datetime) else datetime.utcnow()
+        step = timedelta(seconds=period)
+        return [end - step * (n + 1) for n in range(self.datapoints_per_series)]
+
+    def _op_GetMetricStatistics(self, params):
+        with self._lock:
+            self.metrics_requested['GetMetricStatistics'] += 1
+        period = params.get('Period', 300)
+        datapoints = []
+        for ts in self._timestamps(params.get('StartTime'), params.get('EndTime'), period):
+            value = self.random.uniform(0, 100)
+            point = {'Timestamp': ts, 'Unit': 'None'}
+            for statistic in params.get('Statistics', []):
+                point[statistic] = value
+            datapoints.append(point)
+        return {'Label': params.get('MetricName'), 'Datapoints': datapoints}
+
+    def _op_GetMetricData(self, params):
+        queries = params.get('MetricDataQueries', [])
+        with self._lock:
+            self.metrics_requested['GetMetricData'] += len(queries)
+        results = []
+        for query in queries:
+            stat = query.get('MetricStat', {})
+            timestamps = self._timestamps(params.get('StartTime'), params.get('EndTime'), stat.get('Period', 300))
+            results.append({
+                'Id': query['Id'],
+                'Label': query.get('Label', query['Id']),
+                'Timestamps': timestamps,
+                'Values': [self.random.uniform(0, 100) for _ in timestamps],
+                'StatusCode': 'Complete'
+            })
+        return {'MetricDataResults': results, 'Messages': []}
+
+    def report(self):
+        return {
+            'api_calls': dict(self.calls),
+            'api_calls_total': sum(self.calls.values()),
+            'throttled': dict(self.throttled),
+            'metrics_requested': dict(self.metrics_requested),
+            'response_bytes': sum(self.response_bytes.values())
+        }
+
+
+class HTTPSink:
+    """Stands in for node-service and ai-service; records request counts and body sizes"""
+
+    def __init__(self):
+        self.requests = Counter()
+        self.bytes_received = Counter()
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                sink.requests[self.path] += 1
+                self._reply(404, {'message': 'Not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                path = self.path.split('?')[0]
+                sink.requests[path] += 1
+                sink.bytes_received[path] += len(body)
+                self._reply(*sink.respond(path, body))
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def respond(self, path, body):
+        if path == '/api/metrics-history/store':
+            return 201, {'message': 'Metrics stored successfully'}
+        if path == '/api/detect-anomalies/batch':
+            groups = json.loads(body or b'{}').get('groups', [])
+            return 200, {'success': True, 'results': {
+                'groups': {group['name']: {'anomalies': [], 'anomaly_count': 0} for group in groups},
+                'group_count': len(groups),
+                'anomaly_count': 0
+            }}
+        if path.startswith('/api/detect-anomalies'):
+            return 200, {'success': True, 'results': {'anomalies': [], 'anomaly_count': 0}}
+        if path == '/api/monitor-anomalies':
+            return 200, {'success': True, 'alerts': []}
+        return 404, {'error': 'Not found'}
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def report(self):
+        return {
+            'requests': dict(self.requests),
+            'bytes_sent': sum(self.bytes_received.values()),
+            'bytes_by_endpoint': dict(self.bytes_received)
+        }
@@ -0,0 +1,287 @@
+"""
+Anomaly Correlation for the Python Runner
+Groups anomalies of different series that belong to the same underlying
+problem. The anomalous series are aligned onto a common time grid as one
+NumPy matrix (NaN where a series has no point), and two series are linked
+when their anomaly flags co-occur (Jaccard overlap of the flags, each
+widened by a small tolerance) and their values are correlated over the
+sliding window in which they are flagged. Within a window both measures
+are computed for all flagged series at once as matrix products, in row
+blocks so memory stays bounded with thousands of series. Linked series are
+clustered with union-find, and each cluster is split into incidents
+wherever its anomalies are far apart in time.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from rollups import parse_timestamp
+
+logger = logging.getLogger('AnomalyCorrelation')
+
+DEFAULT_STEP_SECONDS = 300
+# Flags this many grid steps apart still count as co-occurring
+DEFAULT_TOLERANCE_STEPS = 1
+# Values are correlated within windows of this many steps
+DEFAULT_WINDOW_STEPS = 24
+DEFAULT_MIN_COOCCURRENCE = 0.3
+DEFAULT_MIN_CORRELATION = 0.5
+# Anomalies of one cluster further apart than this are separate incidents
+DEFAULT_SPLIT_GAP_STEPS = 6
+DEFAULT_BLOCK_SIZE = 512
+
+
+def isoformat(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+def align(series, step, start=None, end=None):
+    """
+    {key: (timestamps, values)} -> (keys, grid start, value matrix). The
+    matrix has one float32 row per series and one column per grid step;
+    the last point in a step wins and steps without points are NaN.
+    """
+    keys = list(series)
+    if start is None:
+        start = min(int(ts[0]) for ts, _ in series.values() if len(ts))
+    if end is None:
+        end = max(int(ts[-1]) for ts, _ in series.values() if len(ts))
+    start = start // step * step
+    width = (end - start) // step + 1
+
+    matrix = np.full((len(keys), width), np.nan, dtype=np.float32)
+    for row, key in enumerate(keys):
+        timestamps, values = series[key]
+        columns = (np.asarray(timestamps, dtype=np.int64) - start) // step
+        inside = (columns >= 0) & (columns < width)
+        matrix[row, columns[inside]] = np.asarray(values)[inside]
+    return keys, start, matrix
+
+
+def dilate(flags, steps):
+    """Widen each True along the time axis by `steps` columns on both sides"""
+    if steps <= 0:
+        return flags
+    widened = flags.copy()
+    for shift in range(1, steps + 1):
+        widened[:, shift:] |= flags[:, :-shift]
+        widened[:, :-shift] |= flags[:, shift:]
+    return widened
+
+
+def standardize(matrix):
+    """
+    Rows centred and scaled to unit norm, so row products are Pearson
+    correlations. Missing steps are treated as the row mean; constant rows
+    become zero and correlate with nothing.
+    """
+    missing = np.isnan(matrix)
+    counts = np.maximum((~missing).sum(axis=1, keepdims=True), 1)
+    mean = np.where(missing, 0.0, matrix).sum(axis=1, keepdims=True) / counts
+    standardized = np.where(missing, 0.0, matrix - mean).astype(np.float32)
+    norms = np.sqrt(np.einsum('ij,ij->i', standardized, standardized))
+    norms[norms < 1e-12] = np.inf
+    standardized /= norms[:, None]
+    return standardized
+
+
+def linked_pairs(standardized, widened, min_cooccurrence, min_correlation, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    (i, j, correlation, co-occurrence) arrays for the pairs i < j whose flag
+    overlap and value correlation both reach their minimum. Computed one
+    block of rows against all rows at a time.
+    """
+    flags = widened.astype(np.float32)
+    sizes = flags.sum(axis=1)
+    n = len(flags)
+    found = ([], [], [], [])
+    for begin in range(0, n, block_size):
+        stop = min(begin + block_size, n)
+        overlap = flags[begin:stop] @ flags.T
+        union = sizes[begin:stop, None] + sizes[None, :] - overlap
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cooccurrence = np.where(union > 0, overlap / union, 0.0)
+        correlation = standardized[begin:stop] @ standardized.T
+
+        candidates = (cooccurrence >= min_cooccurrence) & (np.abs(correlation) >= min_correlation)
+        # Upper triangle only: each pair once, no self pairs
+        candidates &= np.arange(begin, stop)[:, None] < np.arange(n)[None, :]
+        rows, columns = np.nonzero(candidates)
+        found[0].append(rows + begin)
+        found[1].append(columns)
+        found[2].append(correlation[rows, columns])
+        found[3].append(cooccurrence[rows, columns])
+    return tuple(np.concatenate(part) if part else np.empty(0) for part in found)
+
+
+def connected_components(n, left, right):
+    """Component label of each of n nodes given edges left[k] -- right[k] (union-find)"""
+    parent = np.arange(n)
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return np.array([find(node) for node in range(n)])
+
+
+class AnomalyCorrelator:
+    def __init__(self, step_seconds=None, tolerance_steps=None, window_steps=None, min_cooccurrence=None,
+                 min_correlation=None, split_gap_steps=None, block_size=None):
+        self.step = int(step_seconds or os.getenv('CORRELATION_STEP_SECONDS', DEFAULT_STEP_SECONDS))
+        self.tolerance = int(tolerance_steps if tolerance_steps is not None else os.getenv(
+            'CORRELATION_TOLERANCE_STEPS', DEFAULT_TOLERANCE_STEPS))
+        self.window = int(window_steps or os.getenv('CORRELATION_WINDOW_STEPS', DEFAULT_WINDOW_STEPS))
+        self.min_cooccurrence = float(min_cooccurrence or os.getenv(
+            'CORRELATION_MIN_COOCCURRENCE', DEFAULT_MIN_COOCCURRENCE))
+        self.min_correlation = float(min_correlation or os.getenv(
+            'CORRELATION_MIN_CORRELATION', DEFAULT_MIN_CORRELATION))
+        self.split_gap = int(split_gap_steps or os.getenv('CORRELATION_SPLIT_GAP_STEPS', DEFAULT_SPLIT_GAP_STEPS))
+        self.block_size = int(block_size or os.getenv('CORRELATION_BLOCK_SIZE', DEFAULT_BLOCK_SIZE))
+
+        self.incidents = {}     # incident id -> grouped incident of the latest run
+        self._lock = threading.Lock()
+        self.stats = {
+            'runs': 0,
+            'series_correlated': 0,
+            'pairs_linked': 0,
+            'grouped_incidents_emitted': 0,
+            'last_run_seconds': 0.0
+        }
+
+    def correlate(self, series, anomalies, metadata=None):
+        """
+        Group the anomalies of related series. `series` maps keys to their
+        (timestamps, values) over the window, `anomalies` maps keys to their
+        anomalies. Returns the incidents spanning two or more series, each
+        with `new` set when it was not in the previous run's result.
+        """
+        started = time.perf_counter()
+        flagged = {key: [parse_timestamp(a['timestamp']) for a in found]
+                   for key, found in anomalies.items() if found and key in series and len(series[key][0])}
+        if len(flagged) < 2:
+            return self._publish([], started, 0, 0)
+
+        keys, start, values = align({key: series[key] for key in flagged}, self.step)
+        flags = np.zeros(values.shape, dtype=bool)
+        for row, key in enumerate(keys):
+            columns = (np.array(flagged[key], dtype=np.int64) - start) // self.step
+            flags[row, columns[(columns >= 0) & (columns < flags.shape[1])]] = True
+
+        left, right, correlation, cooccurrence = self._link(values, flags)
+        labels = connected_components(len(keys), left, right)
+        scores = {key: {parse_timestamp(a['timestamp']): float(a.get('anomaly_score', 0)) for a in anomalies[key]}
+                  for key in keys}
+        incidents = []
+        for label in np.unique(labels[left]) if len(left) else []:
+            members = np.flatnonzero(labels == label)
+            edges = labels[left] == label
+            incidents.extend(self._split(
+                [keys[row] for row in members], flags[members], start, scores, metadata or {},
+                float(np.abs(correlation[edges]).mean()), float(cooccurrence[edges].mean())))
+        return self._publish(incidents, started, len(keys), len(left))
+
+    def _link(self, values, flags):
+        """
+        Linked pairs over sliding windows of window_steps (half overlapping).
+        Each window only takes the series flagged inside it, so the pairwise
+        work follows the anomalies rather than the number of series, and
+        slow trends outside the window do not count as correlation.
+        """
+        widened = dilate(flags, self.tolerance)
+        width = flags.shape[1]
+        stride = max(1, self.window // 2)
+        found = ([], [], [], [])
+        for begin in range(0, max(1, width - self.window + stride), stride):
+            columns = slice(begin, min(begin + self.window, width))
+            rows = np.flatnonzero(flags[:, columns].any(axis=1))
+            if len(rows) < 2:
+                continue
+            pairs = linked_pairs(standardize(values[rows, columns]), widened[rows, columns],
+                                 self.min_cooccurrence, self.min_correlation, self.block_size)
+            for part, found_part in zip((rows[pairs[0]], rows[pairs[1]], pairs[2], pairs[3]), found):
+                found_part.append(part)
+        if not found[0]:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+        left, right, correlation, cooccurrence = (np.concatenate(part) for part in found)
+        # Overlapping windows can link a pair twice; keep its strongest correlation
+        order = np.lexsort((-np.abs(correlation), left * len(flags) + right))
+        pair_codes = (left * len(flags) + right)[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = pair_codes[1:] != pair_codes[:-1]
+        keep = order[first]
+        return left[keep], right[keep], correlation[keep], cooccurrence[keep]
+
+    def _split(self, members, flags, start, scores, metadata, mean_correlation, mean_cooccurrence):
+        """Incidents of one cluster: runs of anomalous steps no more than split_gap apart"""
+        steps = np.flatnonzero(flags.any(axis=0))
+        breaks = np.flatnonzero(np.diff(steps) > self.split_gap) + 1
+        incidents = []
+        for run in np.split(steps, breaks):
+            first, last = int(run[0]), int(run[-1])
+            involved = [row for row in range(len(members)) if flags[row, first:last + 1].any()]
+            if len(involved) < 2:
+                continue
+            run_start, run_end = start + first * self.step, start + (last + 1) * self.step
+            series_stats = []
+            for row in involved:
+                points = {ts: score for ts, score in scores[members[row]].items() if run_start <= ts < run_end}
+                series_stats.append((members[row], min(points), max(points.values()), len(points)))
+            # The series whose anomalies started first is the likeliest origin
+            root = min(series_stats, key=lambda item: (item[1], -item[2]))[0]
+            incident_id = hashlib.sha1(f"{root}|{run_start}".encode()).hexdigest()[:16]
+            incidents.append({
+                'incident_id': incident_id,
+                'started_at': isoformat(run_start),
+                'ended_at': isoformat(run_end),
+                'series_count': len(series_stats),
+                'series': [key for key, _, _, _ in series_stats],
+                'services': sorted({metadata.get(key, {}).get('service') for key, _, _, _ in series_stats} - {None}),
+                'root_candidate': root,
+                'anomaly_count': sum(count for _, _, _, count in series_stats),
+                'peak_score': max(peak for _, _, peak, _ in series_stats),
+                'mean_correlation': round(mean_correlation, 4),
+                'mean_cooccurrence': round(mean_cooccurrence, 4)
+            })
+        return incidents
+
+    def _publish(self, incidents, started, series_count, pair_count):
+        with self._lock:
+            for incident in incidents:
+                incident['new'] = incident['incident_id'] not in self.incidents
+            self.incidents = {incident['incident_id']: incident for incident in incidents}
+            self.stats['runs'] += 1
+            self.stats['series_correlated'] += series_count
+            self.stats['pairs_linked'] += pair_count
+            self.stats['grouped_incidents_emitted'] += sum(1 for incident in incidents if incident['new'])
+            self.stats['last_run_seconds'] = round(time.perf_counter() - started, 4)
+        return incidents
+
+    def list_incidents(self):
+        with self._lock:
+            return sorted(self.incidents.values(), key=lambda incident: incident['started_at'], reverse=True)
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'grouped_incidents': len(self.incidents),
+                'step_seconds': self.step,
+                'min_cooccurrence': self.min_cooccurrence,
+                'min_correlation': self.min_correlation,
+                **self.stats
+            }
@@ -0,0 +1,158 @@
+"""
+Detection Planner for the Python Runner
+Gives anomaly detection a time budget per collection cycle. Every series with unscored
+points gets a cheap pre-screen score from the values already in the local
+store (z-score of its newest points against the window, volatility, and
+how long since it was last fully scored); the expensive detector then runs
+on the highest scores first until the budget is spent, and the rest keep
+their points pending for a later cycle. A series whose last full check is
+older than the maximum interval is overdue and always scored, budget or
+not, so every series is checked at least that often.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger('DetectionPlanner')
+
+DEFAULT_BUDGET_SECONDS = 120
+DEFAULT_MAX_INTERVAL_SECONDS = 3600
+# Detector seconds per series assumed until the first batch has been timed
+DEFAULT_SECONDS_PER_SERIES = 0.2
+COST_SMOOTHING = 0.3
+
+Z_SCORE_WEIGHT = 1.0
+VOLATILITY_WEIGHT = 0.5
+STALENESS_WEIGHT = 1.0
+MAX_Z_SCORE = 10.0
+
+
+def prescreen_features(values, first_new):
+    """
+    (largest |z| of the new points against the points before them, coefficient
+    of variation of the window) for one series' values in the lookback window
+    """
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return 0.0, 0.0
+    first_new = min(first_new, len(values) - 1)
+    context, new = values[:first_new], values[first_new:]
+    z = 0.0
+    if len(context) > 1:
+        mean, std = context.mean(), context.std()
+        deviation = np.abs(new - mean).max()
+        z = deviation / std if std > 0 else (MAX_Z_SCORE if deviation > 0 else 0.0)
+    mean = abs(values.mean())
+    volatility = values.std() / mean if mean > 0 else 0.0
+    return min(float(z), MAX_Z_SCORE), float(volatility)
+
+
+class DetectionPlanner:
+    def __init__(self, budget_seconds=None, max_interval_seconds=None):
+        # 0 disables the budget: every pending series is scored every cycle
+        self.budget = float(budget_seconds if budget_seconds is not None else os.getenv(
+            'ANOMALY_CYCLE_BUDGET_SECONDS', DEFAULT_BUDGET_SECONDS))
+        self.max_interval = float(max_interval_seconds or os.getenv(
+            'ANOMALY_MAX_CHECK_INTERVAL_SECONDS', DEFAULT_MAX_INTERVAL_SECONDS))
+
+        self.last_checked = {}  # series key -> epoch of its last full scoring
+        self.first_seen = {}    # series key -> epoch it first had points pending
+        self.seconds_per_series = DEFAULT_SECONDS_PER_SERIES
+        self.spent = 0.0
+        self._lock = threading.Lock()
+        self.cycle_stats = {'scored': 0, 'overdue': 0, 'deferred': 0, 'spent_seconds': 0.0}
+        self.stats = {
+            'cycles': 0,
+            'series_scored': 0,
+            'overdue_scored': 0,
+            'series_deferred': 0,
+            'budget_exhausted_cycles': 0
+        }
+
+    def begin_cycle(self):
+        """Start a collection cycle's budget; every detection run until the next call draws on it"""
+        with self._lock:
+            self.spent = 0.0
+            self.cycle_stats = {'scored': 0, 'overdue': 0, 'deferred': 0, 'spent_seconds': 0.0}
+            self.stats['cycles'] += 1
+
+    def prescreen(self, key, values, first_new, now=None):
+        """Priority of a series with unscored points; higher is scored first"""
+        now = now if now is not None else time.time()
+        z, volatility = prescreen_features(values, first_new)
+        with self._lock:
+            since = self.last_checked.get(key, self.first_seen.setdefault(key, now))
+        staleness = min((now - since) / self.max_interval, 1.0) if self.max_interval > 0 else 0.0
+        return (Z_SCORE_WEIGHT * z / 3 + VOLATILITY_WEIGHT * min(volatility, 1.0)
+                + STALENESS_WEIGHT * staleness)
+
+    def plan(self, priorities, now=None):
+        """
+        Order {key: priority} for scoring: (overdue keys oldest first,
+        remaining keys by priority, highest first)
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            since = {key: self.last_checked.get(key, self.first_seen.get(key, now)) for key in priorities}
+        overdue = sorted((key for key in priorities if now - since[key] >= self.max_interval), key=since.get)
+        overdue_set = set(overdue)
+        ranked = sorted((key for key in priorities if key not in overdue_set), key=priorities.get, reverse=True)
+        return overdue, ranked
+
+    def affordable(self):
+        """How many more series the remaining budget is expected to cover; None without a budget"""
+        if self.budget <= 0:
+            return None
+        with self._lock:
+            return max(0, int((self.budget - self.spent) / max(self.seconds_per_series, 1e-6)))
+
+    def charge(self, keys, seconds, overdue=False, now=None):
+        """Record a detector batch: its time counts against the budget and its series are checked"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            self.spent += seconds
+            if keys:
+                self.seconds_per_series += COST_SMOOTHING * (seconds / len(keys) - self.seconds_per_series)
+            for key in keys:
+                self.last_checked[key] = now
+                self.first_seen.pop(key, None)
+            self.cycle_stats['scored'] += len(keys)
+            self.cycle_stats['spent_seconds'] = round(self.spent, 3)
+            self.stats['series_scored'] += len(keys)
+            if overdue:
+                self.cycle_stats['overdue'] += len(keys)
+                self.stats['overdue_scored'] += len(keys)
+
+    def defer(self, keys):
+        """Series left for a later cycle because the budget ran out"""
+        if not keys:
+            return
+        with self._lock:
+            if not self.cycle_stats['deferred']:
+                # Collection and monitoring may both defer within one cycle
+                self.stats['budget_exhausted_cycles'] += 1
+            self.cycle_stats['deferred'] += len(keys)
+            self.stats['series_deferred'] += len(keys)
+        logger.info(f"Detection budget spent; deferred {len(keys)} lower-priority series")
+
+    def forget(self, keys):
+        """Drop the check history of series the store no longer holds"""
+        with self._lock:
+            for key in keys:
+                self.last_checked.pop(key, None)
+                self.first_seen.pop(key, None)
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'budget_seconds': self.budget,
+                'max_interval_seconds': self.max_interval,
+                'seconds_per_series': round(self.seconds_per_series, 4),
+                'tracked_series': len(self.last_checked),
+                'last_cycle': dict(self.cycle_stats),
+                **self.stats
+            }
@@ -0,0 +1,223 @@
+"""
+Runtime Instrumentation for the Python Runner
+Minimal Prometheus-compatible counters, gauges and histograms rendered in the
+text exposition format. Recording a sample is a dict lookup and a few
+additions under a lock, so it is safe to leave on in hot loops.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+DEFAULT_SIZE_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+DEFAULT_COUNT_BUCKETS = (0, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @property
+    def sample_name(self):
+        """Name of the samples, which the HELP and TYPE lines must use too"""
+        return self.name
+
+    def render(self):
+        lines = [
+            f"# HELP {self.sample_name} {self.documentation}",
+            f"# TYPE {self.sample_name} {self.metric_type}"
+        ]
+        with self._lock:
+            children = sorted(self._children.items())
+            lines.extend(self._render_children(children))
+        return lines
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    @property
+    def sample_name(self):
+        return f"{self.name}_total"
+
+    def _render_children(self, children):
+        return [f"{self.sample_name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in children]
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _render_children(self, children):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in children]
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                # Per-bucket (non-cumulative) counts, plus sum and count
+                child = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._children[key] = child
+            child[0][idx] += 1
+            child[1] += value
+            child[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_children(self, children):
+        lines = []
+        for key, (counts, total, count) in children:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Global registry shared by the collector and the Flask app
+registry = Registry()
+
+COLLECTION_CYCLE_SECONDS = registry.histogram(
+    'collector_cycle_duration_seconds', 'Wall time of a full metrics collection cycle')
+SERVICE_COLLECTION_SECONDS = registry.histogram(
+    'collector_service_collection_duration_seconds', 'Time spent collecting one service for one account/region',
+    ['service'])
+CYCLE_DATAPOINTS = registry.histogram(
+    'collector_cycle_datapoints', 'Datapoints collected per cycle', buckets=DEFAULT_COUNT_BUCKETS)
+AWS_API_CALL_SECONDS = registry.histogram(
+    'collector_aws_api_call_duration_seconds', 'Latency of AWS API calls including rate-limiter waits',
+    ['operation'])
+AWS_API_CALLS = registry.counter(
+    'collector_aws_api_calls', 'AWS API calls by operation and outcome', ['operation', 'outcome'])
+STORE_SECONDS = registry.histogram(
+    'collector_store_duration_seconds', 'Latency of POSTing metrics to node-service')
+STORE_PAYLOAD_BYTES = registry.histogram(
+    'collector_store_payload_bytes', 'Size of metrics payloads POSTed to node-service', buckets=DEFAULT_SIZE_BUCKETS)
+ANOMALY_REQUEST_SECONDS = registry.histogram(
+    'collector_anomaly_request_duration_seconds', 'Latency of anomaly detection requests to ai-service',
+    ['endpoint'])
+ALERT_EVENTS = registry.counter(
+    'collector_alert_events', 'Incident notifications emitted by the alert state store', ['event'])
+SCRIPT_RUN_SECONDS = registry.histogram(
+    'runner_script_run_duration_seconds', 'Duration of script executions', ['kind', 'outcome'])
+REPO_CLONE_SECONDS = registry.histogram(
+    'runner_repo_clone_duration_seconds', 'Time to clone a repository for a GitHub script run', ['strategy'])
+REPO_CLONE_BYTES = registry.histogram(
+    'runner_repo_git_dir_bytes', 'On-disk size of .git after the clone for a GitHub script run', ['strategy'],
+    buckets=DEFAULT_SIZE_BUCKETS)
+RESULT_CACHE_REQUESTS = registry.counter(
+    'runner_result_cache_requests', 'Script runs that opted into the result cache, by outcome', ['outcome'])
+SCRIPT_QUEUE_DEPTH = registry.gauge(
+    'runner_script_queue_depth', 'Script executions currently in progress', ['kind'])
@@ -0,0 +1,266 @@
+"""
+Logging Pipeline for the Python Runner
+Takes log I/O off the collection threads. Loggers hand records to a bounded
+in-memory queue (a non-blocking put; records are dropped and counted when
+the queue is full), and one background writer drains it in batches, formats
+each record as a JSON line and writes it to stdout and a size-rotated log
+file.
+
+The writer also aggregates repeated warnings: per call site (or per
+`aggregate` key passed in `extra`), the first few records of a window are
+written and the rest are folded into one summary at the end of the window,
+e.g. "37 resources throttled". A record can carry `count` (what it stands
+for, default 1) and `summary` (a format string with {count}, {records} and
+{seconds}) in `extra` to shape that summary.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_AGGREGATE_WINDOW_SECONDS = 10
+DEFAULT_AGGREGATE_BURST = 5
+BATCH_SIZE = 500
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+_CONTROL_ATTRIBUTES = {'aggregate', 'summary'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the `extra` fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and name not in _CONTROL_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class WarningAggregator:
+    """Folds repeats of a warning beyond the first few per window into one summary record"""
+
+    def __init__(self, window_seconds=DEFAULT_AGGREGATE_WINDOW_SECONDS, burst=DEFAULT_AGGREGATE_BURST,
+                 level=logging.WARNING):
+        self.window = float(window_seconds)
+        self.burst = int(burst)
+        self.level = level
+        # key -> [window start, records written, records suppressed, count suppressed, last suppressed record]
+        self.windows = {}
+        self.suppressed = 0
+
+    @staticmethod
+    def _key(record):
+        return getattr(record, 'aggregate', None) or (record.name, record.pathname, record.lineno)
+
+    def process(self, record, now):
+        """Records to write for an incoming record: any summary of an ended window, then the record itself"""
+        if self.window <= 0 or record.levelno < self.level:
+            return [record]
+        key = self._key(record)
+        state = self.windows.get(key)
+        output = []
+        if state is None or now - state[0] >= self.window:
+            if state is not None and state[2]:
+                output.append(self._summary(state))
+            state = self.windows[key] = [now, 0, 0, 0, None]
+        if state[1] < self.burst:
+            state[1] += 1
+            output.append(record)
+        else:
+            count = getattr(record, 'count', 1)
+            state[2] += 1
+            state[3] += count if isinstance(count, (int, float)) and not isinstance(count, bool) else 1
+            state[4] = record
+            self.suppressed += 1
+        return output
+
+    def flush(self, now, force=False):
+        """Summaries of the windows that have ended (all windows when forced)"""
+        output = []
+        for key, state in list(self.windows.items()):
+            if force or now - state[0] >= self.window:
+                if state[2]:
+                    output.append(self._summary(state))
+                del self.windows[key]
+        return output
+
+    def _summary(self, state):
+        _, _, records, count, last = state
+        template = getattr(last, 'summary', None)
+        message = None
+        if template:
+            try:
+                message = template.format(count=count, records=records, seconds=self.window)
+            except (KeyError, IndexError, ValueError, AttributeError, TypeError):
+                pass
+        if message is None:
+            message = f"{last.getMessage()} (repeated {records} more times in {self.window:.0f}s)"
+        fields = {name: value for name, value in vars(last).items() if name not in _CONTROL_ATTRIBUTES}
+        fields.update(msg=message, args=None, exc_info=None, exc_text=None, created=time.time(),
+                      suppressed_records=records, count=count)
+        return logging.makeLogRecord(fields)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues without blocking or formatting; a full queue drops the record"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Message arguments are merged now (they may change later); formatting, including
+        # tracebacks, is left to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    def __init__(self, handlers, queue_size=DEFAULT_QUEUE_SIZE, aggregator=None):
+        self.handlers = handlers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queue_handler = NonBlockingQueueHandler(self.queue)
+        self.aggregator = aggregator or WarningAggregator()
+        self.reported_drops = 0
+        self.stats = {
+            'written': 0,
+            'batches': 0,
+            'summaries': 0,
+            'failed_batches': 0
+        }
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self.queue.get(timeout=min(1.0, self.aggregator.window or 1.0))]
+            except queue.Empty:
+                batch = []
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = self._stop.is_set() and self.queue.empty()
+            try:
+                self._write(batch, force=stopping)
+            except Exception as e:
+                # A bad record (e.g. a non-numeric `count`, a broken `summary`) must not
+                # stop the writer; logging it would loop, so it goes to stderr
+                self.stats['failed_batches'] += 1
+                print(f"Log writer failed on a batch of {len(batch)} records: {e!r}", file=sys.stderr)
+            if stopping:
+                return
+
+    def _write(self, batch, force=False):
+        now = time.time()
+        records = []
+        for record in batch:
+            records.extend(self.aggregator.process(record, now))
+        summaries = self.aggregator.flush(now, force)
+        records.extend(summaries)
+        dropped = self.queue_handler.dropped - self.reported_drops
+        if dropped:
+            self.reported_drops += dropped
+            records.append(logging.makeLogRecord({
+                'name': 'LogPipeline', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"Log queue full: dropped {dropped} records", 'dropped_records': dropped
+            }))
+        for record in records:
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        if records:
+            self.stats['written'] += len(records)
+            self.stats['batches'] += 1
+            self.stats['summaries'] += len(summaries)
+
+    def stop(self, timeout=5):
+        """Write out what is queued, then close the handlers"""
+        self._stop.set()
+        self._thread.join(timeout)
+        for handler in self.handlers:
+            handler.close()
+
+    def get_status(self):
+        return {
+            'queued': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'dropped': self.queue_handler.dropped,
+            'suppressed': self.aggregator.suppressed,
+            'aggregate_window_seconds': self.aggregator.window,
+            **self.stats
+        }
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def configure_logging(log_file, level=logging.INFO):
+    """
+    Route the root logger through the pipeline (once per process). Output is
+    JSON unless LOG_FORMAT=text; the file rotates at LOG_MAX_BYTES keeping
+    LOG_BACKUP_COUNT old files.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            return _pipeline
+        if os.getenv('LOG_FORMAT', 'json').lower() == 'text':
+            formatter = logging.Formatter(TEXT_FORMAT)
+        else:
+            formatter = JsonFormatter()
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv('LOG_MAX_BYTES', DEFAULT_MAX_BYTES)),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', DEFAULT_BACKUP_COUNT)))
+        stream_handler = logging.StreamHandler(sys.stdout)
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        _pipeline = LogPipeline(
+            [file_handler, stream_handler],
+            queue_size=int(os.getenv('LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)),
+            aggregator=WarningAggregator(
+                window_seconds=float(os.getenv('LOG_AGGREGATE_WINDOW_SECONDS', DEFAULT_AGGREGATE_WINDOW_SECONDS)),
+                burst=int(os.getenv('LOG_AGGREGATE_BURST', DEFAULT_AGGREGATE_BURST))))
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(_pipeline.queue_handler)
+        atexit.register(_pipeline.stop)
+        return _pipeline
+
+
+def get_log_pipeline():
+    return _pipeline
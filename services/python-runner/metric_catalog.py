@@ -0,0 +1,332 @@
+"""
+Declarative Metric Catalog for the Python Runner
+Describes, per service, how resources are discovered and which CloudWatch
+metrics are collected for them: namespace, dimension mapping, metrics,
+statistics and period. A single generic engine in the collector turns the
+catalog into batched GetMetricData requests, so covering another namespace
+is a catalog entry rather than a new collect_* method.
+
+The built-in catalog can be extended or overridden with a JSON or YAML file
+(METRIC_CATALOG_FILE). Entries in the file replace built-in services of the
+same name; `enabled: false` turns a service off. A metric's `priority`
+(high, normal or low) decides which series are deferred first when the AWS
+API budget runs short.
+
+Value specs used for ids, names and dimensions are JMESPath expressions
+evaluated against one inventory item, or a dict with `path` (expression),
+`after` (keep the text after this marker, e.g. an ARN prefix), `value`
+(a literal) or `format` (a string formatted with the resource id).
+
+Inventory calls are paginated when the API supports it. Inventories that
+list a global resource type (S3 buckets) name a per-resource `region`
+lookup, so each resource is collected only in the region CloudWatch
+publishes its metrics in.
+"""
+
+import json
+import logging
+import os
+
+import jmespath
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+logger = logging.getLogger('MetricCatalog')
+
+# GetMetricData accepts at most 500 queries per request
+MAX_QUERIES_PER_REQUEST = 500
+
+STATISTICS = ('Average', 'Sum', 'Maximum', 'Minimum', 'SampleCount')
+PRIORITIES = ('high', 'normal', 'low')
+
+DEFAULT_METRIC_CATALOG = {
+    'ec2': {
+        'namespace': 'AWS/EC2',
+        'period': 300,
+        'inventory': {
+            'client': 'ec2',
+            'method': 'describe_instances',
+            'items': "Reservations[].Instances[] | [?State.Name=='running']",
+            'id': 'InstanceId',
+            'name': "Tags[?Key=='Name'].Value | [0]",
+            'default_name': {'format': 'EC2-{id}'},
+            'tags': 'Tags'
+        },
+        'dimensions': {'InstanceId': 'InstanceId'},
+        'metrics': [
+            {'name': 'CPUUtilization', 'unit': 'Percent', 'statistics': ['Average', 'Maximum'],
+             'aliases': {'Maximum': 'CPUUtilizationMax'}}
+        ]
+    },
+    'rds': {
+        'namespace': 'AWS/RDS',
+        'period': 300,
+        'inventory': {
+            'client': 'rds',
+            'method': 'describe_db_instances',
+            'items': "DBInstances[?DBInstanceStatus=='available']",
+            'id': 'DBInstanceIdentifier',
+            'tags': 'TagList'
+        },
+        'dimensions': {'DBInstanceIdentifier': 'DBInstanceIdentifier'},
+        'metrics': [
+            {'name': 'CPUUtilization', 'unit': 'Percent', 'statistics': ['Average']},
+            {'name': 'DatabaseConnections', 'unit': 'Count', 'statistics': ['Average']},
+            {'name': 'ReadLatency', 'unit': 'Seconds', 'statistics': ['Average']},
+            {'name': 'WriteLatency', 'unit': 'Seconds', 'statistics': ['Average']}
+        ]
+    },
+    'lambda': {
+        'namespace': 'AWS/Lambda',
+        'period': 300,
+        'inventory': {
+            'client': 'lambda',
+            'method': 'list_functions',
+            'items': 'Functions[]',
+            'id': 'FunctionName'
+        },
+        'dimensions': {'FunctionName': 'FunctionName'},
+        'metrics': [
+            {'name': 'Invocations', 'unit': 'Count', 'statistics': ['Sum']},
+            {'name': 'Duration', 'unit': 'Milliseconds', 'statistics': ['Average']},
+            {'name': 'Errors', 'unit': 'Count', 'statistics': ['Average']},
+            {'name': 'Throttles', 'unit': 'Count', 'statistics': ['Average']}
+        ]
+    },
+    's3': {
+        'namespace': 'AWS/S3',
+        # Storage metrics are published once a day
+        'period': 86400,
+        'inventory': {
+            'client': 's3',
+            'method': 'list_buckets',
+            'items': 'Buckets[]',
+            'id': 'Name',
+            # Buckets of every region are listed; each is collected in its own region
+            'region': {
+                'method': 'get_bucket_location',
+                'param': 'Bucket',
+                'path': 'LocationConstraint',
+                # us-east-1 has no location constraint; EU is the legacy name of eu-west-1
+                'default': 'us-east-1',
+                'aliases': {'EU': 'eu-west-1'}
+            }
+        },
+        'dimensions': {'BucketName': 'Name'},
+        'metrics': [
+            {'name': 'BucketSizeBytes', 'unit': 'Bytes', 'statistics': ['Average'],
+             'dimensions': {'StorageType': {'value': 'StandardStorage'}}},
+            {'name': 'NumberOfObjects', 'unit': 'Count', 'statistics': ['Average'],
+             'dimensions': {'StorageType': {'value': 'AllStorageTypes'}}}
+        ]
+    },
+    'elb': {
+        'namespace': 'AWS/ApplicationELB',
+        'period': 300,
+        'inventory': {
+            'client': 'elbv2',
+            'method': 'describe_load_balancers',
+            'items': "LoadBalancers[?Type=='application']",
+            'id': {'path': 'LoadBalancerArn', 'after': ':loadbalancer/'},
+            'name': 'LoadBalancerName'
+        },
+        'dimensions': {'LoadBalancer': {'path': 'LoadBalancerArn', 'after': ':loadbalancer/'}},
+        'metrics': [
+            {'name': 'RequestCount', 'unit': 'Count', 'statistics': ['Sum']},
+            {'name': 'TargetResponseTime', 'unit': 'Seconds', 'statistics': ['Average']},
+            {'name': 'HTTPCode_Target_5XX_Count', 'unit': 'Count', 'statistics': ['Sum']},
+            {'name': 'HTTPCode_ELB_5XX_Count', 'unit': 'Count', 'statistics': ['Sum']}
+        ]
+    },
+    'dynamodb': {
+        'namespace': 'AWS/DynamoDB',
+        'period': 300,
+        'inventory': {
+            'client': 'dynamodb',
+            'method': 'list_tables',
+            'items': 'TableNames[]',
+            'id': '@'
+        },
+        'dimensions': {'TableName': '@'},
+        'metrics': [
+            {'name': 'ConsumedReadCapacityUnits', 'unit': 'Count', 'statistics': ['Sum']},
+            {'name': 'ConsumedWriteCapacityUnits', 'unit': 'Count', 'statistics': ['Sum']},
+            {'name': 'ReadThrottleEvents', 'unit': 'Count', 'statistics': ['Sum']},
+            {'name': 'WriteThrottleEvents', 'unit': 'Count', 'statistics': ['Sum']}
+        ]
+    },
+    'ecs': {
+        'namespace': 'AWS/ECS',
+        'period': 300,
+        'inventory': {
+            'client': 'ecs',
+            'method': 'list_clusters',
+            'items': 'clusterArns[]',
+            'id': {'path': '@', 'after': ':cluster/'}
+        },
+        'dimensions': {'ClusterName': {'path': '@', 'after': ':cluster/'}},
+        'metrics': [
+            {'name': 'CPUUtilization', 'unit': 'Percent', 'statistics': ['Average', 'Maximum'],
+             'aliases': {'Maximum': 'CPUUtilizationMax'}},
+            {'name': 'MemoryUtilization', 'unit': 'Percent', 'statistics': ['Average', 'Maximum'],
+             'aliases': {'Maximum': 'MemoryUtilizationMax'}}
+        ]
+    }
+}
+
+
+_EXPRESSIONS = {}
+
+
+def _compiled(expression):
+    compiled = _EXPRESSIONS.get(expression)
+    if compiled is None:
+        compiled = _EXPRESSIONS[expression] = jmespath.compile(expression)
+    return compiled
+
+
+def extract(item, spec, resource_id=None):
+    """Resolve a value spec (expression string or path/after/value/format dict) against one item"""
+    if spec is None:
+        return None
+    if isinstance(spec, str):
+        return _compiled(spec).search(item)
+    if 'value' in spec:
+        return spec['value']
+    if 'format' in spec:
+        return spec['format'].format(id=resource_id)
+    value = _compiled(spec['path']).search(item)
+    if value is not None and spec.get('after'):
+        value = str(value).split(spec['after'], 1)[-1]
+    return value
+
+
+def _tags(value):
+    # Tags come as [{'Key': ..., 'Value': ...}] in EC2/RDS and as a plain dict elsewhere
+    if isinstance(value, list):
+        return {tag['Key']: tag['Value'] for tag in value if 'Key' in tag}
+    return dict(value or {})
+
+
+def discover_resources(spec, response):
+    """Inventory response -> [{'id', 'name', 'tags', 'item'}] for one catalog service"""
+    inventory = spec['inventory']
+    resources = []
+    for item in _compiled(inventory['items']).search(response) or []:
+        resource_id = extract(item, inventory['id'])
+        if resource_id is None:
+            continue
+        resource_id = str(resource_id)
+        name = extract(item, inventory.get('name'), resource_id) or \
+            extract(item, inventory.get('default_name'), resource_id) or resource_id
+        resources.append({
+            'id': resource_id,
+            'name': name,
+            'tags': _tags(extract(item, inventory.get('tags'))),
+            'item': item
+        })
+    return resources
+
+
+def resource_region(lookup, response):
+    """Region of a resource from its inventory `region` lookup response"""
+    region = _compiled(lookup['path']).search(response) or lookup.get('default')
+    return lookup.get('aliases', {}).get(region, region)
+
+
+class MetricQuery:
+    """One resource/metric/statistic of a GetMetricData request and how to label its results"""
+
+    __slots__ = ('query_id', 'resource', 'metric', 'statistic', 'period', 'dimensions', 'poll_key')
+
+    def __init__(self, query_id, resource, metric, statistic, period, dimensions, poll_key):
+        self.query_id = query_id
+        self.resource = resource
+        self.metric = metric
+        self.statistic = statistic
+        self.period = period
+        self.dimensions = dimensions
+        self.poll_key = poll_key
+
+    @property
+    def metric_name(self):
+        """Name the datapoints are stored under (aliases keep e.g. CPUUtilizationMax)"""
+        return self.metric.get('aliases', {}).get(self.statistic, self.metric['name'])
+
+    @property
+    def priority(self):
+        return self.metric.get('priority', 'normal')
+
+    def to_request(self, namespace):
+        return {
+            'Id': self.query_id,
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': namespace,
+                    'MetricName': self.metric['name'],
+                    'Dimensions': [{'Name': name, 'Value': value} for name, value in self.dimensions.items()]
+                },
+                'Period': self.period,
+                'Stat': self.statistic
+            },
+            'ReturnData': True
+        }
+
+
+def resource_dimensions(spec, metric, resource):
+    """Dimension name -> value for one resource and metric"""
+    dimensions = {}
+    for name, value_spec in list(spec.get('dimensions', {}).items()) + list(metric.get('dimensions', {}).items()):
+        value = extract(resource['item'], value_spec, resource['id'])
+        if value is not None:
+            dimensions[name] = str(value)
+    return dimensions
+
+
+def validate_catalog(catalog):
+    """Raise ValueError describing the first malformed service entry"""
+    for service, spec in catalog.items():
+        for field in ('namespace', 'inventory', 'metrics'):
+            if field not in spec:
+                raise ValueError(f"Metric catalog entry '{service}' is missing '{field}'")
+        for field in ('client', 'method', 'items', 'id'):
+            if field not in spec['inventory']:
+                raise ValueError(f"Metric catalog entry '{service}' inventory is missing '{field}'")
+        for field in ('method', 'param', 'path'):
+            if 'region' in spec['inventory'] and field not in spec['inventory']['region']:
+                raise ValueError(f"Metric catalog entry '{service}' inventory region is missing '{field}'")
+        for metric in spec['metrics']:
+            if 'name' not in metric or not metric.get('statistics'):
+                raise ValueError(f"Metric catalog entry '{service}' has a metric without name or statistics")
+            unknown = set(metric['statistics']) - set(STATISTICS)
+            if unknown:
+                raise ValueError(f"Metric catalog entry '{service}' uses unknown statistics: {sorted(unknown)}")
+            if metric.get('priority', 'normal') not in PRIORITIES:
+                raise ValueError(f"Metric catalog entry '{service}' has an unknown priority for {metric['name']}")
+            if not spec.get('period') and not metric.get('period'):
+                raise ValueError(f"Metric catalog entry '{service}' has no period for {metric['name']}")
+    return catalog
+
+
+def load_metric_catalog(path=None):
+    """Built-in catalog merged with METRIC_CATALOG_FILE (JSON or YAML); disabled services are dropped"""
+    catalog = json.loads(json.dumps(DEFAULT_METRIC_CATALOG))
+    path = path or os.getenv('METRIC_CATALOG_FILE')
+    if path:
+        with open(path) as f:
+            if path.endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise ValueError("PyYAML is required to load a YAML metric catalog")
+                overrides = yaml.safe_load(f) or {}
+            else:
+                overrides = json.load(f)
+        catalog.update(overrides.get('services', overrides))
+        logger.info(f"Loaded metric catalog overrides for {len(overrides.get('services', overrides))} services from {path}")
+
+    return validate_catalog({
+        service: spec for service, spec in catalog.items()
+        if spec and spec.get('enabled', True)
+    })
@@ -4,44 +4,125 @@ Collects metrics from AWS CloudWatch and stores them in the database
 Runs as a background service with configurable intervals
 """
 
-import boto3
 import json
 import logging
 import time
 import threading
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
-import schedule
-import sys
 import os
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/metrics_collector.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
+from alert_state import AlertStateStore
+from api_accounting import ApiAccounting
+from correlation import AnomalyCorrelator
+from detection_planner import DetectionPlanner
+from anomaly_pipeline import AnomalyPipeline
+from aws_sessions import AWSClientPool, AccountConfig
+from log_pipeline import configure_logging, get_log_pipeline
+from instrumentation import (
+    ALERT_EVENTS, ANOMALY_REQUEST_SECONDS, AWS_API_CALL_SECONDS, AWS_API_CALLS, COLLECTION_CYCLE_SECONDS,
+    CYCLE_DATAPOINTS, SERVICE_COLLECTION_SECONDS, STORE_PAYLOAD_BYTES, STORE_SECONDS
+)
+from metric_catalog import (
+    MAX_QUERIES_PER_REQUEST, PRIORITIES, MetricQuery, discover_resources, load_metric_catalog, resource_dimensions,
+    resource_region
 )
+from polling_planner import PollingPlanner
+from profiling import CycleProfiler
+from rate_limiter import AdaptiveRateLimiter, is_throttling_error
+from rollups import RollupEngine, parse_timestamp, series_key
+from tsdb import TimeSeriesStore
+from scheduler import Scheduler, OVERLAP_SKIP, CATCH_UP_RUN_ONCE
+from series_index import SelectorError, SeriesIndex, labels_for, matches, parse_selector
+
+# Configure logging
+LOG_DIR = os.getenv('METRICS_LOG_DIR', '/app/logs')
+os.makedirs(LOG_DIR, exist_ok=True)
+
+# Records are queued and written as JSON lines by a background thread, with
+# size-based rotation; repeated warnings are aggregated per window
+configure_logging(os.path.join(LOG_DIR, 'metrics_collector.log'))
 logger = logging.getLogger('MetricsCollector')
 
 class AWSMetricsCollector:
     def __init__(self):
-        self.cloudwatch_client = None
-        self.ec2_client = None
-        self.rds_client = None
-        self.lambda_client = None
-        self.s3_client = None
+        # Per-account/per-region boto3 clients, created lazily and reused across cycles
+        # botocore retries are disabled: the rate limiter owns throttling backoff and retries
+        # Every client reports its calls, metrics requested and response bytes to the accounting
+        self.api_accounting = ApiAccounting(
+            cycle_seconds=int(os.getenv('COLLECTION_INTERVAL_MINUTES', 5)) * 60)
+        self.client_pool = AWSClientPool(client_config=Config(
+            max_pool_connections=20,
+            retries={'mode': 'standard', 'max_attempts': 1}
+        ), on_client_created=self.api_accounting.attach)
+        self.rate_limiter = AdaptiveRateLimiter(budgets=json.loads(os.getenv('AWS_API_BUDGETS', '{}')))
+        self.collection_workers = int(os.getenv('COLLECTION_WORKERS', 4))
+        self.accounts_file = os.getenv('AWS_ACCOUNTS_FILE')
         
         self.node_service_url = os.getenv('NODE_SERVICE_URL', 'http://node-service:3000')
         self.ai_service_url = os.getenv('AI_SERVICE_URL', 'http://ai-service:9000')
+        self.anomaly_request_timeout = float(os.getenv('ANOMALY_REQUEST_TIMEOUT_SECONDS', 120))
+        
+        # One keep-alive connection pool for node-service and ai-service requests
+        self.http = requests.Session()
+        self.http.headers.update({'Content-Type': 'application/json'})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, self.collection_workers))
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        
+        self._collection_interval = int(os.getenv('COLLECTION_INTERVAL_MINUTES', 5))
+        self._anomaly_check_interval = int(os.getenv('ANOMALY_CHECK_INTERVAL_MINUTES', 15))
+        self.schedule_jitter_seconds = float(os.getenv('SCHEDULE_JITTER_SECONDS', 5))
+        self.scheduler = None
+        
+        # Namespaces, dimensions and metrics to collect, extendable through METRIC_CATALOG_FILE
+        self.metric_catalog = load_metric_catalog()
+        # (account_id, service, resource_id) -> region of resources listed globally (S3 buckets)
+        self._resource_regions = {}
+        self._resource_regions_lock = threading.Lock()
+        
+        # Skips CloudWatch calls for series that cannot have new data yet (daily
+        # metrics) or have been idle, backing off up to POLL_MAX_BACKOFF_SECONDS
+        self.planner = PollingPlanner(base_interval_seconds=self._collection_interval * 60)
         
-        self.collection_interval = int(os.getenv('COLLECTION_INTERVAL_MINUTES', 5))
-        self.anomaly_check_interval = int(os.getenv('ANOMALY_CHECK_INTERVAL_MINUTES', 15))
+        # Recent raw datapoints in a local memory-mapped store, plus hourly/daily
+        # aggregates of everything collected, restored from the last snapshot
+        self.tsdb = TimeSeriesStore(on_series_dropped=self._forget_series)
+        self.rollups = RollupEngine(raw_store=self.tsdb)
+        self.rollups.load()
+        
+        # Catalog of known series with an inverted index over their labels and resource tags;
+        # selectors narrow what is collected and which series go through anomaly detection
+        self.series_index = SeriesIndex()
+        for key, metadata in self.tsdb.catalog.items():
+            self.series_index.add_series(key, metadata)
+        # An invalid selector is logged and ignored, covering every series
+        self.collection_selector = self._env_selector('COLLECTION_SELECTOR') or parse_selector('')
+        self.anomaly_selector = self._env_selector('ANOMALY_SERIES_SELECTOR')
+        self.monitoring_window_seconds = int(os.getenv('ANOMALY_MONITORING_WINDOW_MINUTES', 120)) * 60
+        # Detection gets a time budget per cycle; the riskiest series are scored first
+        self.detection_planner = DetectionPlanner()
+        self.anomaly_pipeline = AnomalyPipeline(
+            self.tsdb, lookback_seconds=self.monitoring_window_seconds, planner=self.detection_planner)
+        self.alert_threshold = float(os.getenv('ANOMALY_ALERT_THRESHOLD', 0.8))
+        # High-severity anomalies become incidents; repeats of an already reported
+        # point are suppressed and only new or changed incidents are notified
+        self.alert_state = AlertStateStore()
+        self.alert_state.load()
+        # Incidents of different series that share one cause are grouped together
+        self.correlator = AnomalyCorrelator()
+        
+        self.profiler = CycleProfiler()
+        self.cycle_number = 0
+        self.last_profile_id = None
         
         self.is_running = False
+        self.is_stopping = False
+        self._cycle_lock = threading.Lock()
         self.last_collection_time = None
         self.collection_stats = {
             'total_collections': 0,
@@ -49,35 +130,124 @@ class AWSMetricsCollector:
             'failed_collections': 0,
             'last_error': None
         }
+
+    @staticmethod
+    def _env_selector(name):
+        """Parsed selector from an environment variable; None when unset or invalid"""
+        text = os.getenv(name)
+        if not text:
+            return None
+        try:
+            return parse_selector(text)
+        except SelectorError as e:
+            logger.error(f"Ignoring invalid {name}, it applies to all series: {e}")
+            return None
+
+    @property
+    def collection_interval(self):
+        return self._collection_interval
+
+    @collection_interval.setter
+    def collection_interval(self, minutes):
+        """Update the collection interval; applies to a running scheduler immediately"""
+        self._collection_interval = int(minutes)
+        self.planner.base_interval = self._collection_interval * 60
+        self.api_accounting.cycle_seconds = self._collection_interval * 60
+        if self.scheduler:
+            self.scheduler.set_interval('collection', self._collection_interval * 60)
+
+    @property
+    def anomaly_check_interval(self):
+        return self._anomaly_check_interval
+
+    @anomaly_check_interval.setter
+    def anomaly_check_interval(self, minutes):
+        """Update the anomaly check interval; applies to a running scheduler immediately"""
+        self._anomaly_check_interval = int(minutes)
+        if self.scheduler:
+            self.scheduler.set_interval('anomaly_monitoring', self._anomaly_check_interval * 60)
         
     def initialize_aws_clients(self, aws_access_key_id, aws_secret_access_key, region='us-east-1'):
-        """Initialize AWS clients with provided credentials"""
+        """Initialize AWS clients for a single account with provided credentials"""
+        return self.configure_accounts([{
+            'account_id': 'default',
+            'aws_access_key_id': aws_access_key_id,
+            'aws_secret_access_key': aws_secret_access_key,
+            'regions': [region]
+        }])
+
+    def configure_accounts(self, accounts):
+        """Configure the accounts to collect from and test connectivity to each of them"""
         try:
-            session = boto3.Session(
-                aws_access_key_id=aws_access_key_id,
-                aws_secret_access_key=aws_secret_access_key,
-                region_name=region
-            )
-            
-            self.cloudwatch_client = session.client('cloudwatch')
-            self.ec2_client = session.client('ec2')
-            self.rds_client = session.client('rds')
-            self.lambda_client = session.client('lambda')
-            self.s3_client = session.client('s3')
-            
-            # Test connectivity
-            self.cloudwatch_client.list_metrics(MaxRecords=1)
-            logger.info(f"Successfully initialized AWS clients for region: {region}")
+            accounts = [AccountConfig.from_dict(a) if isinstance(a, dict) else a for a in accounts]
+            self.client_pool.set_accounts(accounts)
+            
+            # Test connectivity for the accounts this instance owns
+            for account in self.client_pool.owned_accounts():
+                region = account.regions[0]
+                client = self.client_pool.get_client(account.account_id, region, 'cloudwatch')
+                self.rate_limiter.call('ListMetrics', client.list_metrics, scope=(account.account_id, region))
+                logger.info(f"Successfully initialized AWS clients for account {account.name} ({', '.join(account.regions)})")
             return True
             
         except Exception as e:
             logger.error(f"Failed to initialize AWS clients: {e}")
+            self.client_pool.set_accounts([])
             return False
+
+    def _aws_call(self, target, service_name, method_name, paginate=False, **params):
+        """
+        Call an AWS API through the shared adaptive rate limiter. With
+        paginate, APIs that page their results return all pages merged into
+        one response; a throttled page retries the whole listing.
+        """
+        client = target.client(service_name)
+        operation = client.meta.method_to_api_mapping.get(method_name, method_name)
+        method = getattr(client, method_name)
+        if paginate and client.can_paginate(method_name):
+            paginator = client.get_paginator(method_name)
+            method = lambda **kwargs: paginator.paginate(**kwargs).build_full_result()
+        started = time.perf_counter()
+        outcome = 'success'
+        try:
+            return self.rate_limiter.call(
+                operation,
+                method,
+                scope=(target.account_id, target.region),
+                **params
+            )
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            AWS_API_CALL_SECONDS.observe(time.perf_counter() - started, operation=operation)
+            AWS_API_CALLS.inc(operation=operation, outcome=outcome)
+
+    def get_aws_accounts(self):
+        """Load the account list from AWS_ACCOUNTS_FILE, falling back to the node-service credential"""
+        if self.accounts_file:
+            try:
+                with open(self.accounts_file) as f:
+                    accounts = json.load(f)
+                return accounts.get('accounts', []) if isinstance(accounts, dict) else accounts
+            except Exception as e:
+                logger.error(f"Failed to read AWS accounts file {self.accounts_file}: {e}")
+                return None
+        
+        creds = self.get_aws_credentials_from_node_service()
+        if not creds:
+            return None
+        return [{
+            'account_id': 'default',
+            'aws_access_key_id': creds['aws_access_key_id'],
+            'aws_secret_access_key': creds['aws_secret_access_key'],
+            'regions': [creds['region']]
+        }]
     
     def get_aws_credentials_from_node_service(self):
         """Retrieve AWS credentials from node-service"""
         try:
-            response = requests.get(f"{self.node_service_url}/api/aws-credentials")
+            response = self.http.get(f"{self.node_service_url}/api/aws-credentials")
             if response.status_code == 200:
                 creds = response.json()
                 if creds:
@@ -91,280 +261,215 @@ class AWSMetricsCollector:
             logger.error(f"Failed to get AWS credentials: {e}")
             return None
 
-    def collect_ec2_metrics(self, start_time, end_time):
-        """Collect EC2 metrics from CloudWatch"""
-        metrics = []
-        
-        try:
-            # Get EC2 instances
-            ec2_response = self.ec2_client.describe_instances()
-            instances = []
-            
-            for reservation in ec2_response['Reservations']:
-                for instance in reservation['Instances']:
-                    if instance['State']['Name'] == 'running':
-                        instances.append({
-                            'InstanceId': instance['InstanceId'],
-                            'InstanceType': instance.get('InstanceType'),
-                            'Tags': {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
-                        })
-            
-            # Collect CPU utilization for each instance
-            for instance in instances:
-                instance_id = instance['InstanceId']
-                resource_name = instance['Tags'].get('Name', f"EC2-{instance_id}")
-                
+    def _in_region(self, target, service, inventory, resources):
+        """
+        Resources of a globally listed inventory that live in the target's
+        region. Regions are looked up once per resource and cached; a failed
+        lookup places the resource in the account's first region.
+        """
+        lookup = inventory['region']
+        listed = {(target.account_id, service, resource['id']) for resource in resources}
+        with self._resource_regions_lock:
+            for key in [key for key in self._resource_regions if key[:2] == (target.account_id, service)
+                        and key not in listed]:
+                del self._resource_regions[key]
+        kept = []
+        for resource in resources:
+            key = (target.account_id, service, resource['id'])
+            with self._resource_regions_lock:
+                region = self._resource_regions.get(key)
+            if region is None:
                 try:
-                    response = self.cloudwatch_client.get_metric_statistics(
-                        Namespace='AWS/EC2',
-                        MetricName='CPUUtilization',
-                        Dimensions=[
-                            {
-                                'Name': 'InstanceId',
-                                'Value': instance_id
-                            }
-                        ],
-                        StartTime=start_time,
-                        EndTime=end_time,
-                        Period=300,  # 5 minutes
-                        Statistics=['Average', 'Maximum']
-                    )
-                    
-                    for datapoint in response['Datapoints']:
-                        metrics.extend([
-                            {
-                                'source': 'aws',
-                                'service': 'ec2',
-                                'resourceId': instance_id,
-                                'resourceName': resource_name,
-                                'region': self.cloudwatch_client.meta.region_name,
-                                'metricName': 'CPUUtilization',
-                                'metricUnit': 'Percent',
-                                'metricValue': datapoint['Average'],
-                                'timestamp': datapoint['Timestamp'].isoformat(),
-                                'period': 300,
-                                'statistic': 'Average',
-                                'dimensions': {'InstanceId': instance_id},
-                                'tags': instance['Tags']
-                            },
-                            {
-                                'source': 'aws',
-                                'service': 'ec2',
-                                'resourceId': instance_id,
-                                'resourceName': resource_name,
-                                'region': self.cloudwatch_client.meta.region_name,
-                                'metricName': 'CPUUtilizationMax',
-                                'metricUnit': 'Percent',
-                                'metricValue': datapoint['Maximum'],
-                                'timestamp': datapoint['Timestamp'].isoformat(),
-                                'period': 300,
-                                'statistic': 'Maximum',
-                                'dimensions': {'InstanceId': instance_id},
-                                'tags': instance['Tags']
-                            }
-                        ])
-                        
+                    response = self._aws_call(target, inventory['client'], lookup['method'],
+                                              **{lookup['param']: resource['id']})
+                    region = resource_region(lookup, response)
+                    with self._resource_regions_lock:
+                        self._resource_regions[key] = region
                 except ClientError as e:
-                    logger.warning(f"Failed to get CPU metrics for instance {instance_id}: {e}")
-                    
-            logger.info(f"Collected {len(metrics)} EC2 metrics")
-            
-        except Exception as e:
-            logger.error(f"Error collecting EC2 metrics: {e}")
-            
-        return metrics
+                    logger.warning(f"Could not look up the region of {service} resource {resource['id']}: {e}")
+                    region = target.account.regions[0]
+            if region == target.region:
+                kept.append(resource)
+        return kept
 
-    def collect_rds_metrics(self, start_time, end_time):
-        """Collect RDS metrics from CloudWatch"""
-        metrics = []
-        
-        try:
-            # Get RDS instances
-            rds_response = self.rds_client.describe_db_instances()
-            
-            for db_instance in rds_response['DBInstances']:
-                if db_instance['DBInstanceStatus'] == 'available':
-                    db_instance_id = db_instance['DBInstanceIdentifier']
-                    
-                    # Collect various RDS metrics
-                    rds_metrics = [
-                        ('CPUUtilization', 'Percent'),
-                        ('DatabaseConnections', 'Count'),
-                        ('ReadLatency', 'Seconds'),
-                        ('WriteLatency', 'Seconds')
-                    ]
-                    
-                    for metric_name, unit in rds_metrics:
-                        try:
-                            response = self.cloudwatch_client.get_metric_statistics(
-                                Namespace='AWS/RDS',
-                                MetricName=metric_name,
-                                Dimensions=[
-                                    {
-                                        'Name': 'DBInstanceIdentifier',
-                                        'Value': db_instance_id
-                                    }
-                                ],
-                                StartTime=start_time,
-                                EndTime=end_time,
-                                Period=300,  # 5 minutes
-                                Statistics=['Average']
-                            )
-                            
-                            for datapoint in response['Datapoints']:
-                                metrics.append({
-                                    'source': 'aws',
-                                    'service': 'rds',
-                                    'resourceId': db_instance_id,
-                                    'resourceName': db_instance_id,
-                                    'region': self.cloudwatch_client.meta.region_name,
-                                    'metricName': metric_name,
-                                    'metricUnit': unit,
-                                    'metricValue': datapoint['Average'],
-                                    'timestamp': datapoint['Timestamp'].isoformat(),
-                                    'period': 300,
-                                    'statistic': 'Average',
-                                    'dimensions': {'DBInstanceIdentifier': db_instance_id},
-                                    'tags': {}
-                                })
-                                
-                        except ClientError as e:
-                            logger.warning(f"Failed to get {metric_name} for RDS {db_instance_id}: {e}")
-            
-            logger.info(f"Collected {len(metrics)} RDS metrics")
-            
-        except Exception as e:
-            logger.error(f"Error collecting RDS metrics: {e}")
-            
-        return metrics
+    def _sync_inventory(self, target, service, resources):
+        """Reconcile the series index and polling planner with a fresh {resource_id: tags} inventory"""
+        self.series_index.sync_inventory(target.account_id, target.region, service, resources)
+        self.planner.retain_resources(target.account_id, target.region, service, resources)
+
+    def _forget_series(self, keys):
+        """Drop series the time-series store no longer retains from the index and detection state"""
+        for key in keys:
+            self.series_index.remove_series(key)
+        self.anomaly_pipeline.forget(keys)
+        self.detection_planner.forget(keys)
+
+    def _selected(self, target, service, resource_id, metric_names, tags=None):
+        """Whether the collection selector keeps any of the given metrics of a resource"""
+        if self.collection_selector[0] == 'all':
+            return True
+        labels = labels_for({
+            'accountId': target.account_id,
+            'region': target.region,
+            'service': service,
+            'resourceId': resource_id
+        }, tags=tags or {})
+        # Labels only known once datapoints arrive (statistic, resourceName) do not exclude a resource
+        return any(matches(self.collection_selector, {**labels, 'metricName': name}, missing=True)
+                   for name in metric_names)
 
-    def collect_lambda_metrics(self, start_time, end_time):
-        """Collect Lambda metrics from CloudWatch"""
+    def collect_service_metrics(self, service, start_time, end_time, target):
+        """Collect one catalog service: discover its resources, then fetch due series with batched GetMetricData"""
+        spec = self.metric_catalog[service]
         metrics = []
         
         try:
-            # Get Lambda functions
-            lambda_response = self.lambda_client.list_functions()
-            
-            for function in lambda_response['Functions']:
-                function_name = function['FunctionName']
-                
-                # Collect Lambda metrics
-                lambda_metrics = [
-                    ('Invocations', 'Count'),
-                    ('Duration', 'Milliseconds'),
-                    ('Errors', 'Count'),
-                    ('Throttles', 'Count')
-                ]
-                
-                for metric_name, unit in lambda_metrics:
+            inventory = spec['inventory']
+            response = self._aws_call(target, inventory['client'], inventory['method'], paginate=True,
+                                      **inventory.get('params', {}))
+            resources = discover_resources(spec, response)
+            if 'region' in inventory:
+                resources = self._in_region(target, service, inventory, resources)
+            self._sync_inventory(target, service, {resource['id']: resource['tags'] for resource in resources})
+            
+            queries = []
+            for resource in resources:
+                for metric in spec['metrics']:
+                    names = [metric.get('aliases', {}).get(stat, metric['name']) for stat in metric['statistics']]
+                    if not self._selected(target, service, resource['id'], names, resource['tags']):
+                        continue
+                    period = metric.get('period', spec['period'])
+                    poll_key = (target.account_id, target.region, service, resource['id'], metric['name'])
+                    if not self.planner.is_due(poll_key, period):
+                        continue
+                    dimensions = resource_dimensions(spec, metric, resource)
+                    for statistic in metric['statistics']:
+                        queries.append(MetricQuery(f"q{len(queries)}", resource, metric, statistic,
+                                                   period, dimensions, poll_key))
+            
+            # Under an API budget the most important series are requested first:
+            # catalog priority, then series that are changing before idle ones
+            queries.sort(key=lambda q: (PRIORITIES.index(q.priority), self.planner.is_idle(q.poll_key)))
+            batches = self._batch_by_window(queries, start_time)
+            for index, batch in enumerate(batches):
+                allowed = self._within_api_budget(
+                    service, batch, [query for later in batches[index + 1:] for query in later])
+                if allowed:
                     try:
-                        response = self.cloudwatch_client.get_metric_statistics(
-                            Namespace='AWS/Lambda',
-                            MetricName=metric_name,
-                            Dimensions=[
-                                {
-                                    'Name': 'FunctionName',
-                                    'Value': function_name
-                                }
-                            ],
-                            StartTime=start_time,
-                            EndTime=end_time,
-                            Period=300,  # 5 minutes
-                            Statistics=['Sum' if metric_name == 'Invocations' else 'Average']
-                        )
-                        
-                        statistic = 'Sum' if metric_name == 'Invocations' else 'Average'
-                        
-                        for datapoint in response['Datapoints']:
-                            value = datapoint[statistic]
-                            metrics.append({
-                                'source': 'aws',
-                                'service': 'lambda',
-                                'resourceId': function_name,
-                                'resourceName': function_name,
-                                'region': self.cloudwatch_client.meta.region_name,
-                                'metricName': metric_name,
-                                'metricUnit': unit,
-                                'metricValue': value,
-                                'timestamp': datapoint['Timestamp'].isoformat(),
-                                'period': 300,
-                                'statistic': statistic,
-                                'dimensions': {'FunctionName': function_name},
-                                'tags': {}
-                            })
-                            
+                        metrics.extend(self._get_metric_data(service, spec, allowed, start_time, end_time, target))
                     except ClientError as e:
-                        logger.warning(f"Failed to get {metric_name} for Lambda {function_name}: {e}")
+                        self._log_batch_failure(service, target, allowed, e)
+                if len(allowed) < len(batch):
+                    break
             
-            logger.info(f"Collected {len(metrics)} Lambda metrics")
+            logger.info(f"Collected {len(metrics)} {service} metrics from {target.account_id}/{target.region} "
+                        f"({len(resources)} resources, {len(queries)} series polled)")
             
         except Exception as e:
-            logger.error(f"Error collecting Lambda metrics: {e}")
+            logger.error(f"Error collecting {service} metrics: {e}")
             
         return metrics
 
-    def collect_s3_metrics(self, start_time, end_time):
-        """Collect S3 metrics from CloudWatch"""
+    def _batch_by_window(self, queries, start_time):
+        """
+        GetMetricData batches of queries with similar window starts, so a
+        backed-off or newly seen series widens only its own batch's window.
+        Starts are grouped per collection interval; groups keep the order of
+        their first (highest-priority) query.
+        """
+        groups = {}
+        for query in queries:
+            start = self.planner.window_start(query.poll_key, query.period, start_time)
+            slot = int((start - datetime(1970, 1, 1)).total_seconds() // self.planner.base_interval)
+            groups.setdefault(slot, []).append(query)
+        return [group[offset:offset + MAX_QUERIES_PER_REQUEST]
+                for group in groups.values()
+                for offset in range(0, len(group), MAX_QUERIES_PER_REQUEST)]
+
+    @staticmethod
+    def _log_batch_failure(service, target, queries, error):
+        """Warn about a failed GetMetricData batch; repeats within a log window are summarized"""
+        resources = len({query.resource['id'] for query in queries})
+        if is_throttling_error(error):
+            logger.warning(
+                f"Throttled getting {service} metrics for {resources} resources in "
+                f"{target.account_id}/{target.region}",
+                extra={'aggregate': ('throttled', service, target.account_id, target.region),
+                       'count': resources, 'service': service,
+                       'account_id': target.account_id, 'region': target.region,
+                       'summary': f"{{count}} more {service} resources throttled in "
+                                  f"{target.account_id}/{target.region} in the last {{seconds:.0f}}s"})
+        else:
+            logger.warning(f"Failed to get {service} metrics for {len(queries)} series: {error}",
+                           extra={'count': resources, 'service': service,
+                                  'account_id': target.account_id, 'region': target.region})
+
+    def _within_api_budget(self, service, batch, rest):
+        """
+        The part of a GetMetricData batch the cycle's API allowance covers,
+        cut at a series boundary; the series left out (and every later one)
+        are deferred and stay due for the next cycle
+        """
+        affordable = self.api_accounting.affordable('cloudwatch', 'GetMetricData', len(batch))
+        if affordable >= len(batch):
+            return batch
+        keep = affordable
+        # All statistics of a series are requested together
+        while 0 < keep < len(batch) and batch[keep].poll_key == batch[keep - 1].poll_key:
+            keep -= 1
+        deferred = {query.poll_key for query in batch[keep:]} | {query.poll_key for query in rest}
+        self.api_accounting.defer(len(deferred), len(batch) - keep + len(rest))
+        logger.warning(f"AWS API budget reached: deferred {len(deferred)} {service} series to the next cycle")
+        return batch[:keep]
+
+    def _get_metric_data(self, service, spec, queries, start_time, end_time, target):
+        """One GetMetricData batch (following NextToken pages) turned into collector datapoints"""
+        params = {
+            'MetricDataQueries': [query.to_request(spec['namespace']) for query in queries],
+            # Backed-off and daily series need a wider window than the regular one
+            'StartTime': min(self.planner.window_start(q.poll_key, q.period, start_time) for q in queries),
+            'EndTime': end_time,
+            'ScanBy': 'TimestampAscending'
+        }
+        results = {}
+        while True:
+            response = self._aws_call(target, 'cloudwatch', 'get_metric_data', **params)
+            for result in response['MetricDataResults']:
+                timestamps, values = results.setdefault(result['Id'], ([], []))
+                timestamps.extend(result.get('Timestamps', []))
+                values.extend(result.get('Values', []))
+            if not response.get('NextToken'):
+                break
+            params['NextToken'] = response['NextToken']
+        
         metrics = []
+        recorded = set()
+        for query in queries:
+            timestamps, values = results.get(query.query_id, ([], []))
+            if query.poll_key not in recorded:
+                # The first statistic of a metric decides whether the series is active
+                self.planner.record(query.poll_key, query.period, list(zip(timestamps, values)))
+                recorded.add(query.poll_key)
+            
+            resource = query.resource
+            for timestamp, value in zip(timestamps, values):
+                metrics.append({
+                    'source': 'aws',
+                    'service': service,
+                    'resourceId': resource['id'],
+                    'resourceName': resource['name'],
+                    'accountId': target.account_id,
+                    'region': target.region,
+                    'metricName': query.metric_name,
+                    'metricUnit': query.metric.get('unit'),
+                    'metricValue': value,
+                    'timestamp': timestamp.isoformat(),
+                    'period': query.period,
+                    'statistic': query.statistic,
+                    'dimensions': query.dimensions,
+                    'tags': resource['tags']
+                })
         
-        try:
-            # Get S3 buckets
-            s3_response = self.s3_client.list_buckets()
-            
-            for bucket in s3_response['Buckets']:
-                bucket_name = bucket['Name']
-                
-                # S3 metrics are usually daily, so we collect different metrics
-                s3_metrics = [
-                    ('BucketSizeBytes', 'Bytes', 'StandardStorage'),
-                    ('NumberOfObjects', 'Count', 'AllStorageTypes')
-                ]
-                
-                for metric_name, unit, storage_type in s3_metrics:
-                    try:
-                        dimensions = [
-                            {'Name': 'BucketName', 'Value': bucket_name}
-                        ]
-                        
-                        if storage_type:
-                            dimensions.append({'Name': 'StorageType', 'Value': storage_type})
-                        
-                        response = self.cloudwatch_client.get_metric_statistics(
-                            Namespace='AWS/S3',
-                            MetricName=metric_name,
-                            Dimensions=dimensions,
-                            StartTime=start_time,
-                            EndTime=end_time,
-                            Period=86400,  # Daily for S3
-                            Statistics=['Average']
-                        )
-                        
-                        for datapoint in response['Datapoints']:
-                            metrics.append({
-                                'source': 'aws',
-                                'service': 's3',
-                                'resourceId': bucket_name,
-                                'resourceName': bucket_name,
-                                'region': self.cloudwatch_client.meta.region_name,
-                                'metricName': metric_name,
-                                'metricUnit': unit,
-                                'metricValue': datapoint['Average'],
-                                'timestamp': datapoint['Timestamp'].isoformat(),
-                                'period': 86400,
-                                'statistic': 'Average',
-                                'dimensions': {'BucketName': bucket_name, 'StorageType': storage_type},
-                                'tags': {}
-                            })
-                            
-                    except ClientError as e:
-                        logger.warning(f"Failed to get {metric_name} for S3 bucket {bucket_name}: {e}")
-            
-            logger.info(f"Collected {len(metrics)} S3 metrics")
-            
-        except Exception as e:
-            logger.error(f"Error collecting S3 metrics: {e}")
-            
         return metrics
 
     def store_metrics_in_database(self, metrics):
@@ -373,12 +478,16 @@ class AWSMetricsCollector:
             return True
             
         try:
-            response = requests.post(
-                f"{self.node_service_url}/api/metrics-history/store",
-                json=metrics,
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
+            payload = json.dumps(metrics).encode('utf-8')
+            STORE_PAYLOAD_BYTES.observe(len(payload))
+            
+            with STORE_SECONDS.time():
+                response = self.http.post(
+                    f"{self.node_service_url}/api/metrics-history/store",
+                    data=payload,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=30
+                )
             
             if response.status_code in [200, 201]:
                 logger.info(f"Successfully stored {len(metrics)} metrics in database")
@@ -391,63 +500,177 @@ class AWSMetricsCollector:
             logger.error(f"Error storing metrics in database: {e}")
             return False
 
-    def run_anomaly_detection(self, metrics):
-        """Run anomaly detection on collected metrics"""
-        if not metrics or len(metrics) < 10:
-            logger.info("Insufficient metrics for anomaly detection")
-            return
-            
+    def run_anomaly_detection(self, metrics, profile_session=None, selector=None):
+        """Score the new datapoints of the collected series; returns the new anomalies per series"""
+        keys = list(dict.fromkeys(series_key(metric) for metric in metrics or []))
+        return self.score_series(keys, profile_session, selector)
+
+    def score_series(self, keys, profile_session=None, selector=None):
+        """Send the unscored points of each series (plus rolling-feature context) to the detector in batches"""
+        selector = selector or self.anomaly_selector
+        if selector:
+            # Only series matching the selector are sent to the detector
+            try:
+                selected = self.series_index.select(selector)
+                keys = [key for key in keys if key in selected]
+            except SelectorError as e:
+                logger.error(f"Invalid anomaly series selector, scoring all series: {e}")
+        
+        def detect_batch(work):
+            try:
+                with ANOMALY_REQUEST_SECONDS.time(endpoint='detect-anomalies-batch'):
+                    response = self.http.post(
+                        f"{self.ai_service_url}/api/detect-anomalies/batch",
+                        json={
+                            'method': 'isolation_forest',
+                            'groups': [
+                                {'name': key, 'metrics_data': metrics_data, 'score_after': score_after}
+                                for key, (metrics_data, score_after) in work.items()
+                            ],
+                            'profile': profile_session is not None
+                        },
+                        timeout=self.anomaly_request_timeout
+                    )
+                
+                if response.status_code != 200:
+                    logger.error(f"Batch anomaly detection failed for {len(work)} series: {response.text}")
+                    return {}
+                
+                results = response.json().get('results', {})
+                if profile_session is not None and results.get('profile'):
+                    profile_session.attach('detector', f"batch-{len(work)}-series", results['profile'])
+                
+                anomalies = {}
+                for key, result in results.get('groups', {}).items():
+                    if result.get('error'):
+                        logger.error(f"Anomaly detection failed for {key}: {result['error']}")
+                        continue
+                    anomalies[key] = result.get('anomalies', [])
+                return anomalies
+                
+            except Exception as e:
+                logger.error(f"Error in batch anomaly detection for {len(work)} series: {e}")
+                return {}
+        
         try:
-            # Group metrics by service and metric name
-            grouped_metrics = {}
-            for metric in metrics:
-                key = f"{metric['service']}-{metric['metricName']}"
-                if key not in grouped_metrics:
-                    grouped_metrics[key] = []
-                grouped_metrics[key].append(metric)
-            
-            # Run anomaly detection for each group
-            for group_key, group_metrics in grouped_metrics.items():
-                if len(group_metrics) >= 10:  # Minimum data points for anomaly detection
-                    try:
-                        response = requests.post(
-                            f"{self.ai_service_url}/api/detect-anomalies",
-                            json={
-                                'metrics_data': group_metrics,
-                                'method': 'isolation_forest'
-                            },
-                            headers={'Content-Type': 'application/json'},
-                            timeout=60
-                        )
-                        
-                        if response.status_code == 200:
-                            result = response.json()
-                            anomalies = result.get('results', {}).get('anomalies', [])
-                            
-                            if anomalies:
-                                logger.warning(f"Found {len(anomalies)} anomalies in {group_key}")
-                                # Here you could send alerts, update database flags, etc.
-                                
-                        else:
-                            logger.error(f"Anomaly detection failed for {group_key}: {response.text}")
-                            
-                    except Exception as e:
-                        logger.error(f"Error in anomaly detection for {group_key}: {e}")
-            
+            found = self.anomaly_pipeline.run(keys, detect_batch)
         except Exception as e:
             logger.error(f"Error running anomaly detection: {e}")
+            return {}
+        
+        if found:
+            logger.info(f"Found new anomalies in {len(found)} series")
+            self.process_alerts(found)
+        return found
+
+    def process_alerts(self, anomalies_by_series):
+        """Fold high-severity anomalies into incidents and notify the new or changed ones"""
+        try:
+            high_severity = {
+                key: [a for a in anomalies if a.get('anomaly_score', 0) >= self.alert_threshold]
+                for key, anomalies in anomalies_by_series.items()
+            }
+            events = self.alert_state.process(
+                high_severity, metadata={key: self.tsdb.catalog.get(key, {}) for key in high_severity})
+        except Exception as e:
+            logger.error(f"Error processing anomaly alerts: {e}")
+            return []
+        
+        for event in events:
+            ALERT_EVENTS.inc(event=event['event'])
+            if event['event'] == 'resolved':
+                logger.info(f"Incident {event['incident_id']} on {event['series']} resolved")
+            else:
+                logger.warning(
+                    f"Incident {event['incident_id']} on {event['series']} {event['event']}: "
+                    f"{event['point_count']} anomalous points since {event['started_at']}, "
+                    f"peak score {event['peak_score']:.2f}")
+        return events
+
+    def correlate_alerts(self, anomalies_by_series):
+        """Group the alerting series whose anomalies co-occur and whose values move together"""
+        if len(anomalies_by_series) < 2:
+            return []
+        try:
+            now = time.time()
+            series = {}
+            for key in anomalies_by_series:
+                result = self.tsdb.read(key, now - self.monitoring_window_seconds, now)
+                if result is not None:
+                    series[key] = result
+            incidents = self.correlator.correlate(
+                series, anomalies_by_series, metadata={key: self.tsdb.catalog.get(key, {}) for key in series})
+        except Exception as e:
+            logger.error(f"Error correlating anomalies: {e}")
+            return []
+        
+        for incident in incidents:
+            if incident['new']:
+                ALERT_EVENTS.inc(event='correlated')
+                logger.warning(
+                    f"Correlated incident {incident['incident_id']} across {incident['series_count']} series "
+                    f"({', '.join(incident['services']) or 'unknown services'}) since {incident['started_at']}, "
+                    f"likely origin {incident['root_candidate']}")
+        return incidents
+
+    def collect_target_metrics(self, target, start_time, end_time, cancel_event=None):
+        """Collect metrics from all services for one account/region pair"""
+        metrics = []
+        
+        # Stop early between services if the scheduler was stopped
+        for service in self.metric_catalog:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            with SERVICE_COLLECTION_SECONDS.time(service=service):
+                metrics.extend(self.collect_service_metrics(service, start_time, end_time, target))
+        
+        return metrics
+
+    def collect_all_metrics(self, cancel_event=None, profile=False):
+        """
+        Main method to collect all AWS metrics, optionally under the profiler.
+        Returns None without collecting while another cycle (scheduled or
+        manual) is in flight: cycles share the API and detection budgets and
+        the polling planner.
+        """
+        if not self._cycle_lock.acquire(blocking=False):
+            logger.warning("A metrics collection cycle is already running, not starting another one")
+            return None
+        try:
+            return self._collect_all_metrics(cancel_event, profile)
+        finally:
+            self._cycle_lock.release()
 
-    def collect_all_metrics(self):
-        """Main method to collect all AWS metrics"""
-        if not self.cloudwatch_client:
+    def is_collecting(self):
+        return self._cycle_lock.locked()
+
+    def _collect_all_metrics(self, cancel_event=None, profile=False):
+        self.cycle_number += 1
+        
+        if profile or self.profiler.should_sample(self.cycle_number):
+            metadata = {
+                'cycle': self.cycle_number,
+                'trigger': 'request' if profile else f"every {self.profiler.every_n_cycles} cycles"
+            }
+            with self.profiler.profile('collect_all_metrics', metadata,
+                                       thread_name_prefixes=('metrics-collect',)) as session:
+                self.last_profile_id = session.profile_id
+                return self._run_collection_cycle(cancel_event, session)
+        
+        return self._run_collection_cycle(cancel_event)
+
+    def _run_collection_cycle(self, cancel_event=None, profile_session=None):
+        """Collect, store and analyse one cycle of AWS metrics"""
+        if not self.client_pool.has_accounts():
             logger.warning("AWS clients not initialized, attempting to get credentials...")
-            creds = self.get_aws_credentials_from_node_service()
-            if not creds or not self.initialize_aws_clients(**creds):
+            accounts = self.get_aws_accounts()
+            if not accounts or not self.configure_accounts(accounts):
                 logger.error("Failed to initialize AWS clients")
                 return False
         
         logger.info("Starting metrics collection cycle...")
         self.collection_stats['total_collections'] += 1
+        cycle_started = time.perf_counter()
         
         try:
             # Define time range (last 15 minutes)
@@ -455,14 +678,33 @@ class AWSMetricsCollector:
             start_time = end_time - timedelta(minutes=15)
             
             all_metrics = []
-            
-            # Collect metrics from all services
-            all_metrics.extend(self.collect_ec2_metrics(start_time, end_time))
-            all_metrics.extend(self.collect_rds_metrics(start_time, end_time))
-            all_metrics.extend(self.collect_lambda_metrics(start_time, end_time))
-            all_metrics.extend(self.collect_s3_metrics(start_time, end_time))
+            targets = self.client_pool.targets()
+            # A cycle expected to overspend the API budget polls at a coarser resolution
+            self.planner.begin_cycle(stretch=self.api_accounting.begin_cycle())
+            # Detection runs of this cycle, from collection and monitoring alike, share one budget
+            self.detection_planner.begin_cycle()
+            
+            # Account/region pairs are collected in parallel; boto3 clients are thread-safe
+            with ThreadPoolExecutor(max_workers=max(1, min(self.collection_workers, len(targets) or 1)),
+                                    thread_name_prefix='metrics-collect') as executor:
+                results = executor.map(
+                    lambda target: self.collect_target_metrics(target, start_time, end_time, cancel_event),
+                    targets
+                )
+                for target_metrics in results:
+                    all_metrics.extend(target_metrics)
+            
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("Metrics collection cycle cancelled")
+                return False
             
             logger.info(f"Total metrics collected: {len(all_metrics)}")
+            CYCLE_DATAPOINTS.observe(len(all_metrics))
+            
+            # Keep new datapoints in the local store and fold them into the 1h/1d rollups
+            self.series_index.add_metrics(all_metrics, series_key)
+            self.tsdb.append_metrics(all_metrics, series_key, parse_timestamp)
+            self.rollups.ingest(all_metrics)
             
             if all_metrics:
                 # Store metrics in database
@@ -470,7 +712,7 @@ class AWSMetricsCollector:
                     self.collection_stats['successful_collections'] += 1
                     
                     # Run anomaly detection
-                    self.run_anomaly_detection(all_metrics)
+                    self.run_anomaly_detection(all_metrics, profile_session)
                 else:
                     self.collection_stats['failed_collections'] += 1
                     return False
@@ -484,41 +726,70 @@ class AWSMetricsCollector:
             self.collection_stats['last_error'] = str(e)
             logger.error(f"Metrics collection failed: {e}")
             return False
+        
+        finally:
+            COLLECTION_CYCLE_SECONDS.observe(time.perf_counter() - cycle_started)
 
     def start_scheduled_collection(self):
         """Start the scheduled metrics collection"""
         logger.info(f"Starting scheduled metrics collection (interval: {self.collection_interval} minutes)")
         
-        # Schedule regular collections
-        schedule.every(self.collection_interval).minutes.do(self.collect_all_metrics)
+        scheduler = Scheduler()
         
-        # Schedule anomaly checks
-        schedule.every(self.anomaly_check_interval).minutes.do(self.run_anomaly_monitoring)
+        # Collection and anomaly monitoring run on independent executors,
+        # so a slow collection cycle never delays anomaly checks
+        scheduler.add_job(
+            'collection',
+            lambda: self.collect_all_metrics(cancel_event=scheduler.stop_event),
+            self.collection_interval * 60,
+            jitter_seconds=self.schedule_jitter_seconds,
+            overlap=OVERLAP_SKIP,
+            catch_up=CATCH_UP_RUN_ONCE,
+            run_immediately=True
+        )
+        scheduler.add_job(
+            'anomaly_monitoring',
+            self.run_anomaly_monitoring,
+            self.anomaly_check_interval * 60,
+            jitter_seconds=self.schedule_jitter_seconds,
+            overlap=OVERLAP_SKIP,
+            catch_up=CATCH_UP_RUN_ONCE
+        )
         
+        self.scheduler = scheduler
         self.is_running = True
+        scheduler.start()
         
-        # Run an initial collection
-        self.collect_all_metrics()
-        
-        # Keep the scheduler running
-        while self.is_running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+        # Block until stop_collection() is called, then until the cycles in flight
+        # have seen the cancellation; a new start is refused while this thread lives
+        scheduler.wait()
+        self.is_running = False
+        self.is_stopping = True
+        scheduler.join()
+        self.is_stopping = False
             
     def run_anomaly_monitoring(self):
         """Run comprehensive anomaly monitoring across all services"""
+        services = list(self.metric_catalog)
+        
+        # Hot data is read from the local store; ai-service only has to re-fetch it
+        # from node-service when this runner has not collected anything yet
+        if self.tsdb.series_keys():
+            return self.run_local_anomaly_monitoring(services)
+        
         try:
             logger.info("Running scheduled anomaly monitoring...")
             
-            response = requests.post(
-                f"{self.ai_service_url}/api/monitor-anomalies",
-                json={
-                    'services': ['ec2', 'rds', 'lambda', 's3'],
-                    'alertThreshold': 0.8
-                },
-                headers={'Content-Type': 'application/json'},
-                timeout=120
-            )
+            with ANOMALY_REQUEST_SECONDS.time(endpoint='monitor-anomalies'):
+                response = self.http.post(
+                    f"{self.ai_service_url}/api/monitor-anomalies",
+                    json={
+                        'services': services,
+                        'alertThreshold': self.alert_threshold
+                    },
+                    headers={'Content-Type': 'application/json'},
+                    timeout=120
+                )
             
             if response.status_code == 200:
                 result = response.json()
@@ -526,38 +797,99 @@ class AWSMetricsCollector:
                 
                 if alerts:
                     logger.warning(f"Anomaly monitoring found {len(alerts)} high-severity alerts")
-                    # Here you could send notifications, update dashboards, etc.
                 else:
                     logger.info("No high-severity anomalies detected")
+                # ai-service reports per service, so incidents are per service here
+                self.process_alerts({f"service/{alert['service']}": alert['anomalies'] for alert in alerts})
             else:
                 logger.error(f"Anomaly monitoring failed: {response.text}")
                 
         except Exception as e:
             logger.error(f"Error in anomaly monitoring: {e}")
 
+    def run_local_anomaly_monitoring(self, services):
+        """Anomaly monitoring over the recent window held in the local time-series store"""
+        try:
+            logger.info("Running scheduled anomaly monitoring from the local store...")
+            
+            # Only points the collection cycles have not scored yet go to the detector;
+            # everything else in the window comes from the result cache
+            keys = self.tsdb.series_keys(lambda meta: meta.get('service') in services)
+            self.score_series(keys)
+            
+            recent = self.anomaly_pipeline.cached_anomalies(
+                keys, since=time.time() - self.monitoring_window_seconds, min_score=self.alert_threshold)
+            alerts = {key: anomalies for key, anomalies in recent.items() if anomalies}
+            
+            if alerts:
+                logger.warning(f"Anomaly monitoring found high-severity anomalies in {len(alerts)} series")
+            else:
+                logger.info("No high-severity anomalies detected")
+            # Anomalies already reported by the collection cycles are suppressed as duplicates
+            self.process_alerts(alerts)
+            self.correlate_alerts(alerts)
+            
+        except Exception as e:
+            logger.error(f"Error in anomaly monitoring: {e}")
+
     def stop_collection(self):
         """Stop the scheduled collection"""
         logger.info("Stopping metrics collection...")
         self.is_running = False
+        if self.scheduler:
+            self.scheduler.stop()
         
     def get_collection_status(self):
         """Get the current status of the metrics collector"""
         return {
             'is_running': self.is_running,
+            'is_stopping': self.is_stopping,
+            'is_collecting': self.is_collecting(),
             'last_collection_time': self.last_collection_time.isoformat() if self.last_collection_time else None,
             'collection_interval_minutes': self.collection_interval,
             'anomaly_check_interval_minutes': self.anomaly_check_interval,
             'statistics': self.collection_stats,
-            'aws_clients_initialized': self.cloudwatch_client is not None,
+            'last_profile_id': self.last_profile_id,
+            'profile_every_n_cycles': self.profiler.every_n_cycles,
+            'scheduler': self.scheduler.get_status() if self.scheduler else {},
+            'aws_clients_initialized': self.client_pool.has_accounts(),
+            'accounts': [account.describe() for account in self.client_pool.accounts.values()],
+            'client_pool': self.client_pool.get_status(),
+            'rate_limiter': self.rate_limiter.get_status(),
+            'polling_planner': self.planner.get_status(),
+            'api_accounting': self.api_accounting.get_status(),
+            'logging': get_log_pipeline().get_status() if get_log_pipeline() else {},
+            'rollups': self.rollups.get_status(),
+            'tsdb': self.tsdb.get_status(),
+            'anomaly_pipeline': self.anomaly_pipeline.get_status(),
+            'detection_planner': self.detection_planner.get_status(),
+            'alert_state': self.alert_state.get_status(),
+            'correlation': self.correlator.get_status(),
+            'series_index': self.series_index.get_status(),
             'node_service_url': self.node_service_url,
             'ai_service_url': self.ai_service_url
         }
 
 # Global metrics collector instance
-metrics_collector = AWSMetricsCollector()
+_metrics_collector = None
+_metrics_collector_lock = threading.Lock()
+
+def get_metrics_collector(create=True):
+    """
+    The process-wide collector, built on first use: construction opens the
+    local stores and restores snapshots, which importing this module should not do
+    """
+    global _metrics_collector
+    if _metrics_collector is None and create:
+        with _metrics_collector_lock:
+            if _metrics_collector is None:
+                _metrics_collector = AWSMetricsCollector()
+    return _metrics_collector
 
 def start_collection_thread():
     """Start the metrics collection in a separate thread"""
+    metrics_collector = get_metrics_collector()
+    
     def run_collector():
         try:
             metrics_collector.start_scheduled_collection()
@@ -584,4 +916,4 @@ if __name__ == "__main__":
             time.sleep(60)
     except KeyboardInterrupt:
         logger.info("Shutting down metrics collector...")
-        metrics_collector.stop_collection()
\ No newline at end of file
+        get_metrics_collector().stop_collection()
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+Adaptive Polling Planner for the Python Runner
+Decides per series whether a collection cycle needs to call CloudWatch at
+all. Each series' native period and last change are tracked: daily metrics
+are polled once their next datapoint can exist, series whose values stop
+changing (idle Lambda functions, empty queues) back off exponentially up to
+a cap, and any activity on a resource re-promotes all of its series to
+polling every cycle. Query windows stretch back to the previous poll, so a
+backed-off series never loses datapoints.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger('PollingPlanner')
+
+DEFAULT_MAX_BACKOFF_SECONDS = 3600
+
+
+class SeriesPollState:
+    """Polling history of one series"""
+
+    __slots__ = ('period', 'last_poll', 'last_change', 'last_timestamp', 'last_value', 'idle_polls', 'next_due')
+
+    def __init__(self, period):
+        self.period = period
+        self.last_poll = None
+        self.last_change = None
+        self.last_timestamp = None
+        self.last_value = None
+        self.idle_polls = 0
+        self.next_due = 0.0
+
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'last_poll': self.last_poll,
+            'last_change': self.last_change,
+            'last_timestamp': self.last_timestamp,
+            'idle_polls': self.idle_polls,
+            'next_due': self.next_due
+        }
+
+
+class PollingPlanner:
+    def __init__(self, base_interval_seconds=300, max_backoff_seconds=None):
+        # The collection interval; every series is polled at least this rarely
+        self.base_interval = float(base_interval_seconds)
+        self.max_backoff = float(max_backoff_seconds if max_backoff_seconds is not None
+                                 else os.getenv('POLL_MAX_BACKOFF_SECONDS', DEFAULT_MAX_BACKOFF_SECONDS))
+
+        # Multiplies polling intervals while the AWS API budget is short; the
+        # wider query windows keep every datapoint, only fresher data is delayed
+        self.stretch = 1
+
+        self.series = {}
+        self._by_resource = {}
+        self._lock = threading.Lock()
+        self.cycle_stats = {'polled': 0, 'skipped': 0}
+        self.stats = {
+            'polled': 0,
+            'skipped': 0,
+            'promotions': 0
+        }
+
+    @staticmethod
+    def _resource_key(key):
+        # Poll keys are (accountId, region, service, resourceId, metricName)
+        return key[:4]
+
+    def begin_cycle(self, stretch=1):
+        with self._lock:
+            self.stretch = max(1, int(stretch))
+            self.cycle_stats = {'polled': 0, 'skipped': 0}
+
+    def is_due(self, key, period, now=None):
+        """Whether the series should be polled in this cycle"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            state = self.series.get(key)
+            # Half a cycle of slack so scheduling jitter never pushes a poll a whole cycle later
+            next_due = state.next_due if state is not None else 0.0
+            if state is not None and state.last_poll is not None and self.stretch > 1:
+                interval = state.next_due - state.last_poll
+                next_due = state.last_poll + max(interval, min(interval * self.stretch, self.max_backoff))
+            due = state is None or now + self.base_interval / 2 >= next_due
+            outcome = 'polled' if due else 'skipped'
+            self.cycle_stats[outcome] += 1
+            self.stats[outcome] += 1
+            return due
+
+    def is_idle(self, key):
+        """Whether the series has been backed off for showing no activity"""
+        with self._lock:
+            state = self.series.get(key)
+            return state is not None and state.idle_polls > 0
+
+    def window_start(self, key, period, default_start, now=None):
+        """
+        Query start for a poll: the regular window, widened back to the
+        previous poll for backed-off series and to two periods for coarse
+        metrics that have not been seen yet. Returns a naive UTC datetime.
+        """
+        now = now if now is not None else time.time()
+        start = (default_start - datetime(1970, 1, 1)).total_seconds()
+        with self._lock:
+            state = self.series.get(key)
+            if state is None or state.last_timestamp is None:
+                start = min(start, now - 2 * period)
+            if state is not None and state.last_poll is not None:
+                start = min(start, state.last_poll - period)
+        start = max(start, now - self.max_backoff - 2 * period)
+        return datetime.utcfromtimestamp(start)
+
+    def record(self, key, period, datapoints, now=None):
+        """
+        Update a series after polling it. `datapoints` is a list of
+        (timestamp, value) pairs; returns whether the series showed activity.
+        """
+        now = now if now is not None else time.time()
+        points = sorted(
+            (ts.timestamp() if isinstance(ts, datetime) else float(ts), value)
+            for ts, value in datapoints
+        )
+
+        with self._lock:
+            state = self.series.get(key)
+            if state is None:
+                state = self.series[key] = SeriesPollState(period)
+                self._by_resource.setdefault(self._resource_key(key), set()).add(key)
+            state.period = period
+
+            active = False
+            for ts, value in points:
+                if state.last_timestamp is not None and ts <= state.last_timestamp:
+                    continue
+                if state.last_value is None or value != state.last_value:
+                    active = True
+                state.last_timestamp = ts
+                state.last_value = value
+
+            state.last_poll = now
+            if active:
+                state.last_change = now
+                state.idle_polls = 0
+            else:
+                state.idle_polls += 1
+
+            backoff = min(self.base_interval * 2 ** state.idle_polls, self.max_backoff) \
+                if state.idle_polls else self.base_interval
+            state.next_due = now + backoff
+            if state.last_timestamp is not None and period > self.base_interval:
+                # A coarse datapoint is only published once its period has closed
+                state.next_due = max(state.next_due, state.last_timestamp + 2 * period)
+
+            if active:
+                self._promote_siblings(key, now)
+            return active
+
+    def _promote_siblings(self, key, now):
+        for sibling in self._by_resource.get(self._resource_key(key), ()):
+            state = self.series[sibling]
+            if sibling != key and state.idle_polls and state.period <= self.base_interval:
+                state.idle_polls = 0
+                state.next_due = now
+                self.stats['promotions'] += 1
+
+    def retain_resources(self, account_id, region, service, resource_ids):
+        """Forget series of resources that are no longer in the inventory"""
+        resource_ids = set(resource_ids)
+        with self._lock:
+            for resource in list(self._by_resource):
+                if resource[:3] == (account_id, region, service) and resource[3] not in resource_ids:
+                    for key in self._by_resource.pop(resource):
+                        self.series.pop(key, None)
+
+    def get_status(self, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            states = list(self.series.values())
+            return {
+                'base_interval_seconds': self.base_interval,
+                'max_backoff_seconds': self.max_backoff,
+                'stretch': self.stretch,
+                'series': len(states),
+                'backed_off': sum(1 for s in states if s.idle_polls),
+                'due_next_cycle': sum(1 for s in states if now + self.base_interval * 1.5 >= s.next_due),
+                'last_cycle': dict(self.cycle_stats),
+                **self.stats
+            }
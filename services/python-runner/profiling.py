@@ -0,0 +1,209 @@
+"""
+On-Demand Profiling for Collection Cycles
+Wraps a block of work with cProfile (top-N functions) and a sampling
+profiler (flamegraph-compatible folded stacks), and keeps the captured
+profiles on local disk for the /profiles endpoints
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger('Profiler')
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9a-zA-Z_-]+$')
+
+
+class StackSampler:
+    """Samples the stacks of selected threads at a fixed interval"""
+
+    def __init__(self, thread_ids, thread_name_prefixes=(), interval_seconds=0.005):
+        self.thread_ids = set(thread_ids)
+        self.thread_name_prefixes = tuple(thread_name_prefixes)
+        self.interval = interval_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sampled_thread_ids(self):
+        ids = set(self.thread_ids)
+        if self.thread_name_prefixes:
+            for thread in threading.enumerate():
+                if thread.name.startswith(self.thread_name_prefixes):
+                    ids.add(thread.ident)
+        return ids
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self._sampled_thread_ids():
+                if thread_id == own_id or thread_id not in frames:
+                    continue
+                stack = []
+                frame = frames[thread_id]
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def folded(self):
+        """Stacks in Brendan Gregg's folded format, one 'frame;frame;frame count' per line"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+
+class ProfileSession:
+    """Handle for the profile being captured; extra sections can be attached while it runs"""
+
+    def __init__(self, profile_id, name, metadata):
+        self.profile_id = profile_id
+        self.name = name
+        self.metadata = dict(metadata or {})
+        self.attachments = {}
+
+    def attach(self, section, key, data):
+        self.attachments.setdefault(section, {})[key] = data
+
+
+class CycleProfiler:
+    def __init__(self, directory=None, top_n=None, sample_interval_seconds=None, max_profiles=None,
+                 every_n_cycles=None):
+        self.directory = directory or os.getenv('PROFILE_DIR', '/app/logs/profiles')
+        self.top_n = int(top_n or os.getenv('PROFILE_TOP_N', 40))
+        self.sample_interval = float(sample_interval_seconds or os.getenv('PROFILE_SAMPLE_INTERVAL_SECONDS', 0.005))
+        self.max_profiles = int(max_profiles or os.getenv('PROFILE_MAX_STORED', 50))
+        self.every_n_cycles = int(every_n_cycles if every_n_cycles is not None
+                                  else os.getenv('PROFILE_EVERY_N_CYCLES', 0))
+        self._lock = threading.Lock()
+
+    def should_sample(self, cycle_number):
+        """Whether a scheduled cycle should be profiled under the every-Nth-cycle policy"""
+        return self.every_n_cycles > 0 and cycle_number % self.every_n_cycles == 0
+
+    @contextmanager
+    def profile(self, name, metadata=None, thread_name_prefixes=()):
+        """Profile the enclosed block; worker threads matching the prefixes are sampled too"""
+        session = ProfileSession(
+            f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}", name, metadata)
+        profiler = cProfile.Profile()
+        sampler = StackSampler([threading.get_ident()], thread_name_prefixes, self.sample_interval)
+
+        started = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            yield session
+        finally:
+            profiler.disable()
+            sampler.stop()
+            duration = time.perf_counter() - started
+            try:
+                self._save(session, profiler, sampler, duration)
+            except Exception as e:
+                logger.error(f"Failed to save profile {session.profile_id}: {e}")
+
+    def _top_stats(self, profiler):
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                'function': f"{function} ({os.path.basename(filename)}:{line})",
+                'ncalls': nc,
+                'primitive_calls': cc,
+                'tottime': round(tt, 6),
+                'cumtime': round(ct, 6)
+            })
+        rows.sort(key=lambda row: row['cumtime'], reverse=True)
+        return rows[:self.top_n]
+
+    def _save(self, session, profiler, sampler, duration):
+        os.makedirs(self.directory, exist_ok=True)
+        record = {
+            'id': session.profile_id,
+            'name': session.name,
+            'created': datetime.utcnow().isoformat(),
+            'duration_seconds': round(duration, 6),
+            'metadata': session.metadata,
+            'top_functions': self._top_stats(profiler),
+            'samples': sampler.samples,
+            'sample_interval_seconds': self.sample_interval,
+            'attachments': session.attachments
+        }
+        base = os.path.join(self.directory, session.profile_id)
+        with open(f"{base}.json", 'w') as f:
+            json.dump(record, f, default=str)
+        with open(f"{base}.folded", 'w') as f:
+            f.write(sampler.folded())
+        logger.info(f"Saved profile {session.profile_id} ({duration:.2f}s, {sampler.samples} samples)")
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            profiles = sorted(self._profile_ids())
+            for profile_id in profiles[:max(0, len(profiles) - self.max_profiles)]:
+                for ext in ('.json', '.folded'):
+                    try:
+                        os.remove(os.path.join(self.directory, profile_id + ext))
+                    except FileNotFoundError:
+                        pass
+
+    def _profile_ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')]
+
+    def list_profiles(self):
+        summaries = []
+        for profile_id in sorted(self._profile_ids(), reverse=True):
+            record = self.get_profile(profile_id)
+            if record:
+                summaries.append({
+                    'id': record['id'],
+                    'name': record['name'],
+                    'created': record['created'],
+                    'duration_seconds': record['duration_seconds'],
+                    'samples': record['samples'],
+                    'metadata': record['metadata']
+                })
+        return summaries
+
+    def get_profile(self, profile_id):
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get_folded_stacks(self, profile_id):
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.folded")) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,211 @@
+"""
+Adaptive Rate Limiting for AWS API Calls
+Token buckets per account/region/operation whose rates adapt with AIMD:
+additive increase after successful calls, multiplicative decrease when AWS
+throttles. Throttled calls, transient server errors and network failures
+(connection errors, read timeouts, dropped connections; botocore's own
+retries are disabled) are retried with full-jitter exponential backoff.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+
+logger = logging.getLogger('RateLimiter')
+
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'SlowDown',
+    'ProvisionedThroughputExceededException'
+}
+
+TRANSIENT_ERROR_CODES = {
+    'InternalError',
+    'InternalFailure',
+    'ServiceUnavailable',
+    'RequestTimeout',
+    'RequestTimeoutException'
+}
+
+# Requests per second per account and region; CloudWatch quotas are per account/region/operation
+DEFAULT_API_BUDGETS = {
+    'GetMetricStatistics': 50.0,
+    'GetMetricData': 25.0,
+    'ListMetrics': 25.0,
+    'DescribeInstances': 20.0,
+    'DescribeDBInstances': 10.0,
+    'ListFunctions': 10.0,
+    'ListBuckets': 10.0,
+    'DescribeLoadBalancers': 10.0,
+    'ListTables': 10.0,
+    'ListClusters': 10.0
+}
+
+
+def is_throttling_error(error):
+    return isinstance(error, ClientError) and \
+        error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def is_transient_error(error):
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError)):
+        # EndpointConnectionError, ConnectTimeoutError, ReadTimeoutError, ConnectionClosedError, ...
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get('Error', {}).get('Code')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+    return code in TRANSIENT_ERROR_CODES or status >= 500
+
+
+class TokenBucket:
+    """Token bucket whose refill rate can be changed while in use"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Take one token, sleeping until it is available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = (1.0 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            self.capacity = max(1.0, self.rate)
+            self.tokens = min(self.tokens, self.capacity)
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, budgets=None, default_rate=None, min_rate=None, increase_step=None,
+                 decrease_factor=None, max_retries=None, base_delay=None, max_delay=None):
+        self.budgets = dict(DEFAULT_API_BUDGETS)
+        if budgets:
+            self.budgets.update(budgets)
+        self.default_rate = float(default_rate or os.getenv('AWS_API_DEFAULT_RATE', 10))
+        self.min_rate = float(min_rate or os.getenv('AWS_API_MIN_RATE', 0.5))
+        self.increase_step = float(increase_step or os.getenv('AWS_API_RATE_INCREASE', 0.5))
+        self.decrease_factor = float(decrease_factor or os.getenv('AWS_API_RATE_DECREASE', 0.5))
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv('AWS_API_MAX_RETRIES', 6))
+        self.base_delay = float(base_delay or os.getenv('AWS_API_BACKOFF_BASE_SECONDS', 0.5))
+        self.max_delay = float(max_delay or os.getenv('AWS_API_BACKOFF_MAX_SECONDS', 20))
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._stats = {}
+
+    def _bucket(self, scope, operation):
+        key = (scope, operation)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.budgets.get(operation, self.default_rate))
+                self._buckets[key] = bucket
+            return bucket
+
+    def _stat(self, operation):
+        stat = self._stats.get(operation)
+        if stat is None:
+            stat = {
+                'calls': 0,
+                'throttled': 0,
+                'retries': 0,
+                'failed': 0,
+                'wait_seconds': 0.0
+            }
+            self._stats[operation] = stat
+        return stat
+
+    def call(self, operation, func, scope=None, **kwargs):
+        """Invoke func(**kwargs) under the operation's budget, retrying throttled and transient failures"""
+        bucket = self._bucket(scope, operation)
+        attempt = 0
+
+        while True:
+            waited = bucket.acquire()
+            with self._lock:
+                stat = self._stat(operation)
+                stat['calls'] += 1
+                stat['wait_seconds'] += waited
+
+            try:
+                result = func(**kwargs)
+            except (ClientError, BotocoreConnectionError, HTTPClientError) as e:
+                # Only throttling slows the bucket down; network failures just back off
+                throttled = is_throttling_error(e)
+                if not throttled and not is_transient_error(e):
+                    raise
+
+                with self._lock:
+                    if throttled:
+                        stat['throttled'] += 1
+                        self._decrease(bucket)
+                    if attempt >= self.max_retries:
+                        stat['failed'] += 1
+                        raise
+                    stat['retries'] += 1
+
+                # Full jitter: sleep a random time up to the exponential backoff ceiling
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            self._increase(bucket, operation)
+            return result
+
+    def _decrease(self, bucket):
+        bucket.set_rate(max(self.min_rate, bucket.rate * self.decrease_factor))
+
+    def _increase(self, bucket, operation):
+        ceiling = self.budgets.get(operation, self.default_rate)
+        if bucket.rate < ceiling:
+            # Additive increase is spread over roughly one second of calls
+            bucket.set_rate(min(ceiling, bucket.rate + self.increase_step / max(bucket.rate, 1.0)))
+
+    def get_status(self):
+        with self._lock:
+            operations = {}
+            for operation, stat in self._stats.items():
+                rates = [b.rate for (scope, op), b in self._buckets.items() if op == operation]
+                operations[operation] = {
+                    **stat,
+                    'wait_seconds': round(stat['wait_seconds'], 3),
+                    'budget_per_second': self.budgets.get(operation, self.default_rate),
+                    'current_rate_per_second': round(min(rates), 3) if rates else None
+                }
+            return {
+                'operations': operations,
+                'total_calls': sum(s['calls'] for s in self._stats.values()),
+                'total_throttled': sum(s['throttled'] for s in self._stats.values()),
+                'total_retries': sum(s['retries'] for s in self._stats.values()),
+                'total_failed': sum(s['failed'] for s in self._stats.values())
+            }
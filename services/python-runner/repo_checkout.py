@@ -0,0 +1,128 @@
+"""
+Repository Checkout for the Python Runner
+Fetches only what a GitHub script run needs. The repository is cloned
+shallow with a blob filter (commits and trees only), then a cone-mode sparse
+checkout downloads the blobs of the top-level files (root requirements.txt),
+the script's directory (its main.py and requirements.txt) and any extra
+paths the request declares. On a multi-GB monorepo that is a few hundred KB
+instead of the whole tree. When the partial clone or the sparse checkout
+fails (old git, server without filter support), the workspace is emptied
+and a plain shallow clone runs instead.
+"""
+
+import logging
+import os
+import posixpath
+import shutil
+import time
+
+import git
+
+logger = logging.getLogger('RepoCheckout')
+
+SPARSE = 'sparse'
+FULL = 'full'
+
+
+def authenticated_url(repo_url, github_token=None):
+    """repo_url with the token injected for private GitHub repositories"""
+    if github_token and 'github.com' in repo_url:
+        return repo_url.replace('https://', f'https://{github_token}@')
+    return repo_url
+
+
+def resolve_commit(repo_url, branch, timeout=None):
+    """
+    Commit a branch or tag points to, from one ls-remote round trip; None
+    when it cannot be resolved within `timeout` seconds
+    """
+    if len(branch) == 40 and all(c in '0123456789abcdef' for c in branch.lower()):
+        return branch.lower()
+    try:
+        output = git.cmd.Git().ls_remote(repo_url, branch, kill_after_timeout=timeout)
+    except git.exc.GitCommandError:
+        return None
+    refs = {}
+    for line in output.splitlines():
+        sha, _, ref = line.partition('\t')
+        refs[ref] = sha
+    # Annotated tags list the tagged commit as ref^{}
+    return (refs.get(f"refs/heads/{branch}") or refs.get(f"refs/tags/{branch}^{{}}")
+            or refs.get(f"refs/tags/{branch}"))
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def clear_directory(path):
+    for entry in os.listdir(path):
+        full_path = os.path.join(path, entry)
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            shutil.rmtree(full_path, ignore_errors=True)
+        else:
+            os.remove(full_path)
+
+
+def sparse_directories(repo, script_path, extra_paths=()):
+    """Directories to check out: the script's directory plus the declared extras (files count by their directory)"""
+    directories = set()
+    for path in [script_path, *extra_paths]:
+        path = posixpath.normpath(str(path).strip('/'))
+        if path in ('', '.'):
+            continue
+        # ls-tree reads only trees; cat-file on HEAD:<path> could fetch a missing blob
+        # from the promisor remote before the sparse set is in place
+        entry = repo.git.ls_tree('HEAD', '--', path)
+        # "<mode> <type> <object>\t<path>"; missing paths are left to the caller's not-found handling
+        kind = entry.split(None, 2)[1] if entry else 'blob'
+        directory = path if kind == 'tree' else posixpath.dirname(path)
+        if directory:
+            directories.add(directory)
+    return sorted(directories)
+
+
+def checkout(repo_url, workspace, branch, script_path, extra_paths=(), sparse=True):
+    """
+    Clone repo_url into workspace for running script_path. Returns the
+    strategy used, total clone time (including a failed sparse attempt), the
+    on-disk size of .git afterwards (a proxy for what was fetched, not bytes
+    transferred) and, after a fallback, why the sparse checkout was abandoned.
+    """
+    started = time.perf_counter()
+    fallback_reason = None
+    if sparse:
+        try:
+            repo = git.Repo.clone_from(
+                repo_url, workspace, branch=branch, depth=1, multi_options=['--filter=blob:none', '--sparse'])
+            directories = sparse_directories(repo, script_path, extra_paths)
+            if directories:
+                # Blobs of the selected directories are fetched here, in one batch
+                repo.git.sparse_checkout('set', *directories)
+            return {
+                'strategy': SPARSE,
+                'clone_seconds': round(time.perf_counter() - started, 3),
+                'git_dir_bytes': directory_size(os.path.join(workspace, '.git')),
+                'sparse_paths': directories
+            }
+        except git.exc.GitCommandError as e:
+            fallback_reason = str(e).splitlines()[0] if str(e) else type(e).__name__
+            # The token may be part of the URL git echoes back
+            fallback_reason = fallback_reason.replace(repo_url, '<repo_url>')
+            logger.warning(f"Sparse checkout failed, falling back to a full shallow clone: {fallback_reason}")
+            clear_directory(workspace)
+
+    git.Repo.clone_from(repo_url, workspace, branch=branch, depth=1)
+    return {
+        'strategy': FULL,
+        'clone_seconds': round(time.perf_counter() - started, 3),
+        'git_dir_bytes': directory_size(os.path.join(workspace, '.git')),
+        'fallback_reason': fallback_reason
+    }
@@ -0,0 +1,243 @@
+"""
+Result Cache for the Python Runner
+Memoizes script results for callers that opt in (dashboards re-running the
+same inventory or report script). Entries are keyed by a hash of what
+determines the result - script text or repository commit and path, env vars
+and the credential identity (never the secret itself, but a keyed hash
+of it, so a request with a wrong secret misses) - and live on local disk as
+one JSON file each, with a per-entry TTL and least-recently-used eviction
+once the cache exceeds its size limit. Identical requests that arrive while
+the first is still running wait for its result instead of running the
+script again (single flight).
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('ResultCache')
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_TTL_SECONDS = 24 * 3600
+IDENTITY_KEY_FILE = '.identity_key'
+
+HIT = 'HIT'
+MISS = 'MISS'
+COALESCED = 'COALESCED'
+
+
+def make_key(*parts):
+    """Stable hash of JSON-serializable parts"""
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class _Flight:
+    """A computation in progress that identical requests wait on"""
+
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class ResultCache:
+    def __init__(self, directory=None, max_bytes=None, max_ttl_seconds=None):
+        self.directory = directory or os.getenv('RESULT_CACHE_DIR') or os.path.join(
+            os.getenv('METRICS_DATA_DIR', '/app/data'), 'result_cache')
+        self.max_bytes = int(max_bytes or os.getenv('RESULT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.max_ttl = float(max_ttl_seconds or os.getenv('RESULT_CACHE_MAX_TTL_SECONDS', DEFAULT_MAX_TTL_SECONDS))
+
+        self.entries = OrderedDict()    # key -> [expires epoch, size in bytes], least recently used first
+        self.total_bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expired': 0
+        }
+        self._load()
+        self.identity_key = self._load_identity_key()
+
+    def _load_identity_key(self):
+        """
+        Server-side key for hashing credential secrets: RESULT_CACHE_SECRET, or
+        a random key kept next to the entries so they survive a restart
+        """
+        secret = os.getenv('RESULT_CACHE_SECRET')
+        if secret:
+            return secret.encode()
+        path = os.path.join(self.directory, IDENTITY_KEY_FILE)
+        try:
+            with open(path, 'rb') as f:
+                key = f.read()
+            if len(key) >= 32:
+                return key
+        except OSError:
+            pass
+        key = os.urandom(32)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(key)
+        except OSError as e:
+            # Entries keyed with this key stop matching after a restart
+            logger.warning(f"Could not store the result cache identity key: {e}")
+        return key
+
+    def identity_digest(self, *secrets):
+        """HMAC-SHA256 of credential secrets under the server-side key; None without any secret"""
+        if not any(secrets):
+            return None
+        message = json.dumps([secret or '' for secret in secrets]).encode()
+        return hmac.new(self.identity_key, message, hashlib.sha256).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self):
+        """Index the entries left on disk by an earlier process, oldest access first"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            files = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError as e:
+            logger.error(f"Result cache directory unavailable: {e}")
+            return
+        found = []
+        for name in files:
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    expires = json.load(f)['expires']
+                found.append((os.path.getmtime(path), name[:-len('.json')], expires, os.path.getsize(path)))
+            except (OSError, ValueError, KeyError):
+                self._remove_file(path)
+        for _, key, expires, size in sorted(found):
+            self.entries[key] = [expires, size]
+            self.total_bytes += size
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _drop(self, key):
+        expires, size = self.entries.pop(key)
+        self.total_bytes -= size
+        self._remove_file(self._path(key))
+
+    def get(self, key, now=None):
+        """The cached entry ({status, body, created, expires}) or None when missing or expired"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            meta = self.entries.get(key)
+            if meta is None:
+                return None
+            if meta[0] <= now:
+                self._drop(key)
+                self.stats['expired'] += 1
+                return None
+            self.entries.move_to_end(key)
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+            # The file's mtime keeps the access order across restarts
+            os.utime(self._path(key))
+            return entry
+        except (OSError, ValueError):
+            with self._lock:
+                if key in self.entries:
+                    self._drop(key)
+            return None
+
+    def put(self, key, status, body, ttl, now=None):
+        now = now if now is not None else time.time()
+        entry = {'status': status, 'body': body, 'created': now, 'expires': now + min(float(ttl), self.max_ttl)}
+        encoded = json.dumps(entry, default=str)
+        if len(encoded) > self.max_bytes:
+            return entry
+        try:
+            tmp_path = f"{self._path(key)}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(encoded)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.error(f"Failed to store cached result: {e}")
+            return entry
+
+        with self._lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = [entry['expires'], len(encoded)]
+            self.total_bytes += len(encoded)
+            self.stats['stores'] += 1
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                self._drop(next(iter(self.entries)))
+                self.stats['evictions'] += 1
+        return entry
+
+    def get_or_compute(self, key, ttl, compute, refresh=False):
+        """
+        (entry, state): the cached entry (HIT), the result of an identical
+        request already running (COALESCED), or compute()'s (status, body)
+        as a fresh entry (MISS). Only status 200 results are stored; refresh
+        skips the lookup but still stores the new result.
+        """
+        entry = None if refresh else self.get(key)
+        if entry is not None:
+            with self._lock:
+                self.stats['hits'] += 1
+            return entry, HIT
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            with self._lock:
+                self.stats['coalesced'] += 1
+            return flight.result, COALESCED
+
+        try:
+            status, body = compute()
+            now = time.time()
+            if status == 200:
+                flight.result = self.put(key, status, body, ttl, now)
+            else:
+                flight.result = {'status': status, 'body': body, 'created': now, 'expires': now}
+            with self._lock:
+                self.stats['misses'] += 1
+            return flight.result, MISS
+        finally:
+            # Waiters of a failed computation get an error instead of hanging
+            if flight.result is None:
+                flight.result = {'status': 500, 'body': {'error': 'Coalesced execution failed'},
+                                 'created': time.time(), 'expires': time.time()}
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'in_flight': len(self._inflight),
+                **self.stats
+            }
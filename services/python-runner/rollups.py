@@ -0,0 +1,425 @@
+"""
+Metric Rollups for the Python Runner
+Incrementally aggregates collected datapoints into 1h and 1d buckets
+(min/max/avg/sum/count plus a DDSketch for percentiles) as they arrive, and
+answers range queries from the coarsest resolution that satisfies the
+requested step. Raw points come from an attached TimeSeriesStore when there
+is one, otherwise a short raw window is kept in memory. Bucket sketches
+merge, so percentiles over any window and across series (regions, accounts)
+are answered without rescanning raw points.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sketches import DDSketch
+
+logger = logging.getLogger('MetricsRollups')
+
+RAW = 0
+HOUR = 3600
+DAY = 86400
+
+RESOLUTION_NAMES = {RAW: 'raw', HOUR: '1h', DAY: '1d'}
+
+DEFAULT_RETENTION_SECONDS = {
+    RAW: 2 * DAY,
+    HOUR: 35 * DAY,
+    DAY: 400 * DAY
+}
+
+
+def series_key(metric):
+    """Stable identifier of the series a collected datapoint belongs to"""
+    return '/'.join([
+        str(metric.get('accountId', 'default')),
+        str(metric.get('region', '')),
+        str(metric.get('service', '')),
+        str(metric.get('resourceId', '')),
+        str(metric.get('metricName', '')),
+        str(metric.get('statistic', ''))
+    ])
+
+
+def parse_timestamp(value):
+    """Epoch seconds from an ISO-8601 string, datetime or number; naive values are UTC"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RollupBucket:
+    """Aggregates for one series over one resolution-aligned interval"""
+
+    __slots__ = ('start', 'min', 'max', 'sum', 'count', 'sketch', 'encoded')
+
+    def __init__(self, start):
+        self.start = start
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+        self.count = 0
+        self.sketch = DDSketch()
+        # JSON of dump(), kept until the bucket changes; sealed buckets are encoded once
+        self.encoded = None
+
+    def add(self, value):
+        self.encoded = None
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sum += value
+        self.count += 1
+        self.sketch.add(value)
+
+    def to_dict(self, resolution):
+        return {
+            'timestamp': datetime.fromtimestamp(self.start, tz=timezone.utc).isoformat(),
+            'resolution': RESOLUTION_NAMES.get(resolution, resolution),
+            'min': self.min,
+            'max': self.max,
+            'avg': self.sum / self.count if self.count else None,
+            'sum': self.sum,
+            'count': self.count,
+            'p95': self.sketch.quantile(0.95),
+            'p99': self.sketch.quantile(0.99)
+        }
+
+    def dump(self):
+        return [self.start, self.min, self.max, self.sum, self.count, self.sketch.to_dict()]
+
+    def dump_json(self):
+        if self.encoded is None:
+            self.encoded = json.dumps(self.dump())
+        return self.encoded
+
+    @classmethod
+    def load(cls, data):
+        bucket = cls(data[0])
+        bucket.min, bucket.max, bucket.sum, bucket.count = data[1:5]
+        bucket.sketch = DDSketch.from_dict(data[5])
+        return bucket
+
+
+class SeriesRollups:
+    """Raw window and rollup buckets of a single series"""
+
+    def __init__(self, resolutions):
+        self.last_timestamp = None
+        self.raw = deque()
+        self.buckets = {resolution: deque() for resolution in resolutions}
+
+
+class RollupEngine:
+    def __init__(self, resolutions=(HOUR, DAY), retention_seconds=None, snapshot_path=None,
+                 snapshot_interval_seconds=None, raw_store=None):
+        self.resolutions = tuple(sorted(resolutions))
+        self.retention = dict(DEFAULT_RETENTION_SECONDS)
+        if retention_seconds:
+            self.retention.update(retention_seconds)
+        self.raw_store = raw_store
+        if raw_store is not None:
+            self.retention[RAW] = raw_store.window_seconds
+        self.snapshot_path = snapshot_path if snapshot_path is not None else os.path.join(
+            os.getenv('METRICS_DATA_DIR', '/app/data'), 'rollups.json')
+        self.snapshot_interval = float(snapshot_interval_seconds if snapshot_interval_seconds is not None
+                                       else os.getenv('ROLLUP_SNAPSHOT_INTERVAL_SECONDS', 300))
+
+        self.series = {}
+        self.metadata = {}
+        self._lock = threading.RLock()
+        self._last_snapshot = time.monotonic()
+        self._saving = False
+        self.stats = {
+            'points_ingested': 0,
+            'points_skipped_duplicate': 0,
+            'buckets_sealed': 0
+        }
+
+    def ingest(self, metrics):
+        """Fold newly collected datapoints into the raw window and rollup buckets"""
+        ingested = 0
+        with self._lock:
+            for metric in sorted(metrics, key=lambda m: m['timestamp']):
+                key = series_key(metric)
+                ts = parse_timestamp(metric['timestamp'])
+                value = float(metric['metricValue'])
+
+                state = self.series.get(key)
+                if state is None:
+                    state = SeriesRollups(self.resolutions)
+                    self.series[key] = state
+                    self.metadata[key] = {
+                        name: metric.get(name)
+                        for name in ('accountId', 'region', 'service', 'resourceId', 'resourceName',
+                                     'metricName', 'metricUnit', 'statistic')
+                    }
+
+                # Collection windows overlap, so the same datapoint arrives several times
+                if state.last_timestamp is not None and ts <= state.last_timestamp:
+                    self.stats['points_skipped_duplicate'] += 1
+                    continue
+                state.last_timestamp = ts
+
+                if self.raw_store is None:
+                    state.raw.append((ts, value))
+                for resolution in self.resolutions:
+                    buckets = state.buckets[resolution]
+                    start = ts - (ts % resolution)
+                    if not buckets or buckets[-1].start != start:
+                        if buckets:
+                            self.stats['buckets_sealed'] += 1
+                        buckets.append(RollupBucket(start))
+                    buckets[-1].add(value)
+
+                self._expire(state, ts)
+                ingested += 1
+
+            self.stats['points_ingested'] += ingested
+
+        if self.snapshot_path and time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.save_in_background()
+        return ingested
+
+    def _expire(self, state, now):
+        raw_cutoff = now - self.retention[RAW]
+        while state.raw and state.raw[0][0] < raw_cutoff:
+            state.raw.popleft()
+        for resolution, buckets in state.buckets.items():
+            cutoff = now - self.retention.get(resolution, DEFAULT_RETENTION_SECONDS[DAY])
+            while buckets and buckets[0].start < cutoff:
+                buckets.popleft()
+
+    def choose_resolution(self, start, end, step_seconds=None, max_points=None, now=None):
+        """Coarsest resolution no wider than the requested step that still covers the range start"""
+        now = now if now is not None else time.time()
+        if step_seconds is None:
+            step_seconds = (end - start) / max_points if max_points else 0
+
+        covering = [r for r in (RAW,) + self.resolutions if start >= now - self.retention.get(r, 0)]
+        if not covering:
+            return self.resolutions[-1]
+        fitting = [r for r in covering if r <= step_seconds]
+        return max(fitting) if fitting else min(covering)
+
+    def query(self, key, start, end, step_seconds=None, max_points=None, resolution=None):
+        """Range read for one series, served from raw points or the chosen rollup"""
+        with self._lock:
+            state = self.series.get(key)
+            if state is None:
+                return None
+            if resolution is None:
+                resolution = self.choose_resolution(start, end, step_seconds, max_points)
+
+            if resolution == RAW and self.raw_store is not None:
+                timestamps, values = self.raw_store.read(key, start, end) or ((), ())
+                points = [
+                    {'timestamp': datetime.fromtimestamp(int(ts), tz=timezone.utc).isoformat(), 'value': float(value)}
+                    for ts, value in zip(timestamps, values)
+                ]
+            elif resolution == RAW:
+                points = [
+                    {'timestamp': datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(), 'value': value}
+                    for ts, value in state.raw if start <= ts <= end
+                ]
+            else:
+                points = [
+                    bucket.to_dict(resolution)
+                    for bucket in state.buckets[resolution]
+                    if start <= bucket.start + resolution and bucket.start <= end
+                ]
+
+            return {
+                'series': key,
+                'metadata': self.metadata.get(key, {}),
+                'resolution': RESOLUTION_NAMES.get(resolution, resolution),
+                'resolution_seconds': resolution,
+                'points': points
+            }
+
+    def _raw_points(self, key, state, start, end, inclusive_end):
+        if self.raw_store is not None:
+            result = self.raw_store.read(key, start, end)
+            points = zip(result[0].tolist(), result[1].tolist()) if result is not None else ()
+        else:
+            points = iter(state.raw)
+        return [value for ts, value in points if start <= ts and (ts <= end if inclusive_end else ts < end)]
+
+    def window_sketch(self, key, start, end, now=None):
+        """
+        Sketch of one series over [start, end]: daily then hourly buckets that
+        lie inside the window are merged, and the partial-hour edges are filled
+        from raw points while they are retained (otherwise from the
+        overlapping hourly bucket). None for an unknown series.
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            state = self.series.get(key)
+            if state is None:
+                return None
+            sketch = DDSketch()
+            covered = []
+            for resolution in sorted(self.resolutions, reverse=True):
+                for bucket in state.buckets[resolution]:
+                    bucket_end = bucket.start + resolution
+                    if bucket.start >= start and bucket_end <= end and \
+                            not any(a <= bucket.start < b for a, b in covered):
+                        sketch.merge(bucket.sketch)
+                        covered.append((bucket.start, bucket_end))
+
+            gaps = []
+            cursor = start
+            for a, b in sorted(covered):
+                if a > cursor:
+                    gaps.append((cursor, a, False))
+                cursor = max(cursor, b)
+            if cursor <= end:
+                gaps.append((cursor, end, True))
+
+            raw_from = now - self.retention[RAW]
+            finest = self.resolutions[0]
+            for gap_start, gap_end, inclusive_end in gaps:
+                if gap_start >= raw_from:
+                    for value in self._raw_points(key, state, gap_start, gap_end, inclusive_end):
+                        sketch.add(value)
+                    continue
+                # Older than the raw window: the overlapping buckets approximate the edge
+                for bucket in state.buckets[finest]:
+                    if bucket.start < gap_end and bucket.start + finest > gap_start and \
+                            not any(a <= bucket.start < b for a, b in covered):
+                        sketch.merge(bucket.sketch)
+            return sketch
+
+    def quantiles(self, keys, start, end, quantiles=(0.5, 0.95, 0.99), per_series=False):
+        """
+        Quantiles over [start, end] of one or more series merged together (e.g.
+        the same metric across regions), plus count/min/max/avg. With
+        per_series, each series' own quantiles are included under per_series.
+        """
+        def summary(sketch):
+            return {
+                'count': sketch.count,
+                'min': sketch.min if sketch.count else None,
+                'max': sketch.max if sketch.count else None,
+                'avg': sketch.avg,
+                'quantiles': {str(q): sketch.quantile(q) for q in quantiles}
+            }
+
+        merged = DDSketch()
+        series = {}
+        for key in keys:
+            sketch = self.window_sketch(key, start, end)
+            if sketch is None:
+                continue
+            merged.merge(sketch)
+            if per_series:
+                series[key] = summary(sketch)
+
+        result = {
+            'series_count': len(series) if per_series else sum(1 for key in keys if key in self.series),
+            'relative_accuracy': merged.relative_accuracy,
+            **summary(merged)
+        }
+        if per_series:
+            result['per_series'] = series
+        return result
+
+    def list_series(self):
+        with self._lock:
+            return [{'series': key, **meta} for key, meta in sorted(self.metadata.items())]
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'series': len(self.series),
+                'raw_points': sum(len(s.raw) for s in self.series.values()),
+                'rollup_buckets': {
+                    RESOLUTION_NAMES[r]: sum(len(s.buckets[r]) for s in self.series.values())
+                    for r in self.resolutions
+                },
+                'sketch_bins': sum(len(b.sketch) for s in self.series.values() for r in self.resolutions
+                                   for b in s.buckets[r]),
+                **self.stats
+            }
+
+    def save_in_background(self):
+        """Start a snapshot on its own thread unless one is already being written"""
+        with self._lock:
+            if self._saving:
+                return
+            self._saving = True
+            self._last_snapshot = time.monotonic()
+
+        def run():
+            try:
+                self.save()
+            finally:
+                with self._lock:
+                    self._saving = False
+
+        threading.Thread(target=run, name='rollup-snapshot', daemon=True).start()
+
+    def save(self):
+        """
+        Write a snapshot so rollups survive runner restarts. Buckets keep their
+        encoded JSON until they change, so only open buckets are serialized again.
+        """
+        with self._lock:
+            parts = []
+            for key, state in self.series.items():
+                buckets = ','.join(
+                    f'"{r}":[' + ','.join(b.dump_json() for b in state.buckets[r]) + ']' for r in self.resolutions)
+                parts.append(
+                    f'{json.dumps(key)}:{{"metadata":{json.dumps(self.metadata.get(key, {}))},'
+                    f'"last_timestamp":{json.dumps(state.last_timestamp)},'
+                    f'"raw":{json.dumps(list(state.raw))},"buckets":{{{buckets}}}}}')
+            self._last_snapshot = time.monotonic()
+        snapshot = f'{{"resolutions":{json.dumps(list(self.resolutions))},"series":{{{",".join(parts)}}}}}'
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            logger.error(f"Failed to save rollup snapshot: {e}")
+
+    def load(self):
+        """Restore a snapshot written by save(); returns the number of series loaded"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return 0
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load rollup snapshot: {e}")
+            return 0
+
+        skipped = 0
+        with self._lock:
+            for key, data in snapshot.get('series', {}).items():
+                try:
+                    state = SeriesRollups(self.resolutions)
+                    state.last_timestamp = data.get('last_timestamp')
+                    state.raw = deque(tuple(p) for p in data.get('raw', []))
+                    for resolution in self.resolutions:
+                        state.buckets[resolution] = deque(
+                            RollupBucket.load(b) for b in data.get('buckets', {}).get(str(resolution), []))
+                except Exception as e:
+                    # An older layout or a partial entry loses that series' rollups, not the collector
+                    skipped += 1
+                    logger.warning(f"Skipping rollups of {key} that do not match the snapshot format: {e!r}")
+                    continue
+                self.series[key] = state
+                self.metadata[key] = data.get('metadata', {})
+        logger.info(f"Loaded rollups for {len(self.series)} series" + (f", skipped {skipped}" if skipped else ""))
+        return len(self.series)
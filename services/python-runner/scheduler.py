@@ -0,0 +1,236 @@
+"""
+Job Scheduler for the Metrics Collector
+Runs periodic jobs against monotonic-clock deadlines, each on its own executor
+so a slow job never delays another one
+"""
+
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger('MetricsScheduler')
+
+# What to do when a deadline passes while the previous run is still executing
+OVERLAP_SKIP = 'skip'    # drop the tick
+OVERLAP_QUEUE = 'queue'  # run once more as soon as the current run finishes
+
+# What to do when the scheduler itself wakes up after several missed deadlines
+CATCH_UP_SKIP = 'skip'          # drop missed ticks, wait for the next one
+CATCH_UP_RUN_ONCE = 'run_once'  # fire once for all missed ticks, then realign
+
+
+class ScheduledJob:
+    """A periodic job with its own timer and executor threads"""
+
+    def __init__(self, name, func, interval_seconds, jitter_seconds=0.0,
+                 overlap=OVERLAP_SKIP, catch_up=CATCH_UP_RUN_ONCE, run_immediately=False):
+        if overlap not in (OVERLAP_SKIP, OVERLAP_QUEUE):
+            raise ValueError(f"Unknown overlap policy: {overlap}")
+        if catch_up not in (CATCH_UP_SKIP, CATCH_UP_RUN_ONCE):
+            raise ValueError(f"Unknown catch-up policy: {catch_up}")
+
+        self.name = name
+        self.func = func
+        self.interval = float(interval_seconds)
+        self.jitter = float(jitter_seconds)
+        self.overlap = overlap
+        self.catch_up = catch_up
+        self.run_immediately = run_immediately
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = None
+        self._work_ready = threading.Condition(self._lock)
+        self._running = False
+        self._pending = 0
+        self._anchor = None
+        self._timer_thread = None
+        self._worker_thread = None
+
+        self.stats = {
+            'runs': 0,
+            'failures': 0,
+            'skipped_overlap': 0,
+            'queued_overlap': 0,
+            'missed_ticks': 0,
+            'last_started': None,
+            'last_duration_seconds': None,
+            'last_error': None
+        }
+
+    def start(self, stop_event):
+        """Start the timer and executor threads for this job"""
+        self._stop_event = stop_event
+        self._anchor = time.monotonic()
+        if self.run_immediately:
+            self._submit()
+
+        self._worker_thread = threading.Thread(
+            target=self._worker_loop, name=f"{self.name}-executor", daemon=True)
+        self._timer_thread = threading.Thread(
+            target=self._timer_loop, name=f"{self.name}-timer", daemon=True)
+        self._worker_thread.start()
+        self._timer_thread.start()
+
+    def set_interval(self, interval_seconds):
+        """Change the interval of a live job; the next deadline is recomputed immediately"""
+        with self._lock:
+            self.interval = float(interval_seconds)
+            self._anchor = time.monotonic()
+        self._wakeup.set()
+
+    def _timer_loop(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                deadline = self._anchor + self.interval
+            delay = self.jitter * random.random() if self.jitter > 0 else 0.0
+            timeout = deadline + delay - time.monotonic()
+
+            if timeout > 0:
+                self._wakeup.wait(timeout)
+                if self._wakeup.is_set():
+                    # Interval changed or scheduler stopping: recompute the deadline
+                    self._wakeup.clear()
+                    continue
+                if self._stop_event.is_set():
+                    break
+
+            now = time.monotonic()
+            with self._lock:
+                missed = int((now - self._anchor) // self.interval) if self.interval > 0 else 1
+                # Keep deadlines on a fixed grid so they never drift
+                self._anchor += max(missed, 1) * self.interval
+                if missed > 1:
+                    self.stats['missed_ticks'] += missed - 1
+
+            if missed > 1 and self.catch_up == CATCH_UP_SKIP:
+                logger.warning(f"Job {self.name} missed {missed - 1} deadlines, skipping to next tick")
+                continue
+
+            self._submit()
+
+    def _submit(self):
+        with self._lock:
+            if self._running or self._pending:
+                if self.overlap == OVERLAP_SKIP:
+                    self.stats['skipped_overlap'] += 1
+                    logger.warning(f"Job {self.name} is still running, skipping this tick")
+                    return
+                # Coalesce into at most one queued run
+                if self._pending:
+                    self.stats['skipped_overlap'] += 1
+                    return
+                self.stats['queued_overlap'] += 1
+            self._pending = 1
+            self._work_ready.notify()
+
+    def _worker_loop(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._stop_event.is_set():
+                    self._work_ready.wait()
+                if self._stop_event.is_set():
+                    self._pending = 0
+                    return
+                self._pending = 0
+                self._running = True
+                self.stats['last_started'] = time.time()
+
+            started = time.monotonic()
+            error = None
+            try:
+                self.func()
+            except Exception as e:
+                error = e
+                logger.error(f"Job {self.name} failed: {e}")
+            finally:
+                with self._lock:
+                    if error is None:
+                        self.stats['runs'] += 1
+                    else:
+                        self.stats['failures'] += 1
+                        self.stats['last_error'] = str(error)
+                    self.stats['last_duration_seconds'] = round(time.monotonic() - started, 3)
+                    self._running = False
+
+    def wake(self):
+        """Interrupt any wait so the threads observe a stop request"""
+        self._wakeup.set()
+        with self._lock:
+            self._work_ready.notify_all()
+
+    def is_running(self):
+        with self._lock:
+            return self._running
+
+    def join(self, timeout=None):
+        """Wait for the threads of a stopped job; False if a run is still executing after timeout"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in (self._timer_thread, self._worker_thread):
+            if thread is not None:
+                thread.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+        return not any(thread is not None and thread.is_alive()
+                       for thread in (self._timer_thread, self._worker_thread))
+
+    def get_status(self):
+        with self._lock:
+            seconds_until_next = max(0.0, self._anchor + self.interval - time.monotonic()) \
+                if self._anchor is not None else None
+            return {
+                'interval_seconds': self.interval,
+                'jitter_seconds': self.jitter,
+                'overlap_policy': self.overlap,
+                'catch_up_policy': self.catch_up,
+                'executing': self._running,
+                'queued': bool(self._pending),
+                'seconds_until_next_run': round(seconds_until_next, 3) if seconds_until_next is not None else None,
+                **self.stats
+            }
+
+
+class Scheduler:
+    """Owns a set of ScheduledJobs and stops all of them at once"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.stop_event = threading.Event()
+        self._started = False
+
+    def add_job(self, name, func, interval_seconds, **kwargs):
+        job = ScheduledJob(name, func, interval_seconds, **kwargs)
+        self.jobs[name] = job
+        if self._started:
+            job.start(self.stop_event)
+        return job
+
+    def start(self):
+        self.stop_event.clear()
+        self._started = True
+        for job in self.jobs.values():
+            job.start(self.stop_event)
+
+    def set_interval(self, name, interval_seconds):
+        job = self.jobs.get(name)
+        if job:
+            job.set_interval(interval_seconds)
+
+    def stop(self):
+        """Stop all timers immediately; running jobs finish their current call"""
+        self.stop_event.set()
+        for job in self.jobs.values():
+            job.wake()
+        self._started = False
+
+    def wait(self, timeout=None):
+        """Block until the scheduler is stopped"""
+        return self.stop_event.wait(timeout)
+
+    def join(self, timeout=None):
+        """After stop(), block until every job's current run has finished"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return all([job.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+                    for job in self.jobs.values()])
+
+    def get_status(self):
+        return {name: job.get_status() for name, job in self.jobs.items()}
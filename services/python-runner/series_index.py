@@ -0,0 +1,346 @@
+"""
+Series Index for the Python Runner
+Catalog of every known series with an inverted index from label values
+(service, region, account, resource, metric name, statistic and resource
+tags) to series ids, so selections like "prod-tagged EC2 CPU series" are
+set operations instead of scans over every datapoint. Resource tags come
+from the collector's inventory and are kept current as resources appear,
+change tags or disappear.
+
+Selector syntax:
+    service=ec2 and tag:env=prod and metricName=CPU*
+    (region=us-east-1 or region=eu-west-1) and not tag:team=data
+    tag:owner                        any value for the tag
+    metricName!=CPUUtilizationMax
+Values may use * and ? wildcards and may be quoted ("a b" or 'a b').
+"""
+
+import logging
+import re
+import threading
+from fnmatch import fnmatchcase
+
+logger = logging.getLogger('SeriesIndex')
+
+# Datapoint fields that become index labels; tags are indexed as tag:<Key>
+LABEL_FIELDS = ('accountId', 'region', 'service', 'resourceId', 'resourceName', 'metricName', 'statistic')
+TAG_PREFIX = 'tag:'
+
+_TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<lparen>\() | (?P<rparen>\)) |
+        (?P<op>!=|=) |
+        "(?P<dquoted>[^"]*)" | '(?P<squoted>[^']*)' |
+        (?P<word>[^\s()=!"']+)
+    )
+''', re.VERBOSE)
+
+_KEYWORDS = {'and', 'or', 'not'}
+
+
+class SelectorError(ValueError):
+    """Raised for selector strings that do not parse"""
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            raise SelectorError(f"Unexpected character at position {position}: {text[position:position + 10]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ('dquoted', 'squoted'):
+            tokens.append(('value', value))
+        elif kind == 'word' and value.lower() in _KEYWORDS:
+            tokens.append((value.lower(), value))
+        elif kind == 'word':
+            tokens.append(('value', value))
+        else:
+            tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser: or > and > not > term; terms are `label op value` or a bare label"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self, kind=None):
+        if self.position >= len(self.tokens):
+            raise SelectorError(f"Unexpected end of selector: {self.text!r}")
+        token = self.tokens[self.position]
+        if kind and token[0] != kind:
+            raise SelectorError(f"Expected {kind} but found {token[1]!r} in selector: {self.text!r}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            return ('all',)
+        node = self.parse_or()
+        if self.position != len(self.tokens):
+            raise SelectorError(f"Unexpected {self.tokens[self.position][1]!r} in selector: {self.text!r}")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == 'or':
+            self.take()
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        # Adjacent terms without a keyword are joined with and
+        while self.peek() in ('and', 'not', 'value', 'lparen'):
+            if self.peek() == 'and':
+                self.take()
+            node = ('and', node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == 'not':
+            self.take()
+            return ('not', self.parse_not())
+        return self.parse_term()
+
+    def parse_term(self):
+        if self.peek() == 'lparen':
+            self.take()
+            node = self.parse_or()
+            self.take('rparen')
+            return node
+        _, label = self.take('value')
+        if self.peek() == 'op':
+            _, op = self.take()
+            _, value = self.take('value')
+            node = ('eq', label, value)
+            return ('not', node) if op == '!=' else node
+        return ('has', label)
+
+
+def parse_selector(text):
+    """Parse a selector string into an expression tree; raises SelectorError"""
+    return _Parser(text or '').parse()
+
+
+def labels_for(metric, tags=None):
+    """Index labels of a datapoint, or of a resource when only some fields are known"""
+    labels = {field: str(metric[field]) for field in LABEL_FIELDS if metric.get(field) is not None}
+    for key, value in (tags if tags is not None else metric.get('tags') or {}).items():
+        labels[f"{TAG_PREFIX}{key}"] = str(value)
+    return labels
+
+
+def matches(expression, labels, missing=False):
+    """
+    Evaluate a parsed selector against a single label dict. Terms on labels
+    the dict does not carry at all evaluate to `missing`, which lets a
+    resource be pre-filtered before its metric names are known.
+    """
+    kind = expression[0]
+    if kind == 'all':
+        return True
+    if kind == 'and':
+        return matches(expression[1], labels, missing) and matches(expression[2], labels, missing)
+    if kind == 'or':
+        return matches(expression[1], labels, missing) or matches(expression[2], labels, missing)
+    if kind == 'not':
+        inner = expression[1]
+        if inner[0] in ('eq', 'has') and inner[1] not in labels and not inner[1].startswith(TAG_PREFIX):
+            return missing
+        return not matches(inner, labels, missing)
+    label = expression[1]
+    if label not in labels:
+        return False if label.startswith(TAG_PREFIX) else missing
+    if kind == 'has':
+        return True
+    return fnmatchcase(labels[label], expression[2])
+
+
+class SeriesIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.series = {}       # series id -> labels
+        self.postings = {}     # label -> value -> set of series ids
+        self.resources = {}    # (accountId, region, service, resourceId) -> {'tags': {...}, 'series': set()}
+        self.stats = {
+            'series_added': 0,
+            'series_removed': 0,
+            'resources_added': 0,
+            'resources_removed': 0,
+            'tag_updates': 0
+        }
+
+    @staticmethod
+    def _resource_key(labels):
+        return (labels.get('accountId'), labels.get('region'), labels.get('service'), labels.get('resourceId'))
+
+    def _post(self, series_id, labels):
+        for label, value in labels.items():
+            self.postings.setdefault(label, {}).setdefault(value, set()).add(series_id)
+
+    def _unpost(self, series_id, labels):
+        for label, value in labels.items():
+            values = self.postings.get(label)
+            if values is None or value not in values:
+                continue
+            values[value].discard(series_id)
+            if not values[value]:
+                del values[value]
+            if not values:
+                del self.postings[label]
+
+    def add_series(self, series_id, metric):
+        """Register one series from a datapoint (or metadata dict); tags come from the inventory when known"""
+        with self._lock:
+            if series_id in self.series:
+                return False
+            labels = labels_for(metric, tags={})
+            key = self._resource_key(labels)
+            resource = self.resources.get(key)
+            if resource is None:
+                # Until the next inventory the datapoint's own tags stand in for the resource's
+                tags = {k: str(v) for k, v in (metric.get('tags') or {}).items()}
+                resource = self.resources[key] = {'tags': tags, 'series': set()}
+                self.stats['resources_added'] += 1
+            labels.update({f"{TAG_PREFIX}{k}": v for k, v in resource['tags'].items()})
+            self.series[series_id] = labels
+            self._post(series_id, labels)
+            resource['series'].add(series_id)
+            self.stats['series_added'] += 1
+            return True
+
+    def add_metrics(self, metrics, key_func):
+        """Register the series of newly collected datapoints; returns the number of new series"""
+        added = 0
+        with self._lock:
+            for metric in metrics:
+                series_id = key_func(metric)
+                if series_id not in self.series:
+                    added += self.add_series(series_id, metric)
+        return added
+
+    def remove_series(self, series_id):
+        with self._lock:
+            labels = self.series.pop(series_id, None)
+            if labels is None:
+                return False
+            self._unpost(series_id, labels)
+            resource = self.resources.get(self._resource_key(labels))
+            if resource is not None:
+                resource['series'].discard(series_id)
+            self.stats['series_removed'] += 1
+            return True
+
+    def sync_inventory(self, account_id, region, service, resources):
+        """
+        Reconcile one account/region/service with a fresh inventory of
+        {resource_id: tags}. Tag changes are re-indexed on the resource's
+        series; resources missing from the inventory are dropped with their
+        series. Returns the ids of the removed series.
+        """
+        removed = []
+        with self._lock:
+            scope = (account_id, region, service)
+            current = {key for key in self.resources if key[:3] == scope}
+            for resource_id, tags in resources.items():
+                key = scope + (resource_id,)
+                tags = {k: str(v) for k, v in (tags or {}).items()}
+                resource = self.resources.get(key)
+                if resource is None:
+                    self.resources[key] = {'tags': tags, 'series': set()}
+                    self.stats['resources_added'] += 1
+                elif resource['tags'] != tags:
+                    self._retag(resource, tags)
+                current.discard(key)
+
+            for key in current:
+                resource = self.resources.pop(key)
+                for series_id in list(resource['series']):
+                    self.remove_series(series_id)
+                    removed.append(series_id)
+                self.stats['resources_removed'] += 1
+        return removed
+
+    def _retag(self, resource, tags):
+        for series_id in resource['series']:
+            labels = self.series.get(series_id)
+            if labels is None:
+                continue
+            old_tags = {label: value for label, value in labels.items() if label.startswith(TAG_PREFIX)}
+            self._unpost(series_id, old_tags)
+            for label in old_tags:
+                del labels[label]
+            new_tags = {f"{TAG_PREFIX}{k}": v for k, v in tags.items()}
+            labels.update(new_tags)
+            self._post(series_id, new_tags)
+        resource['tags'] = tags
+        self.stats['tag_updates'] += 1
+
+    def resource_tags(self, account_id, region, service, resource_id):
+        resource = self.resources.get((account_id, region, service, resource_id))
+        return dict(resource['tags']) if resource is not None else None
+
+    def _lookup(self, label, pattern):
+        values = self.postings.get(label, {})
+        if not any(ch in pattern for ch in '*?['):
+            return set(values.get(pattern, ()))
+        result = set()
+        for value, ids in values.items():
+            if fnmatchcase(value, pattern):
+                result |= ids
+        return result
+
+    def _evaluate(self, expression):
+        kind = expression[0]
+        if kind == 'all':
+            return set(self.series)
+        if kind == 'and':
+            left = self._evaluate(expression[1])
+            return left & self._evaluate(expression[2]) if left else left
+        if kind == 'or':
+            return self._evaluate(expression[1]) | self._evaluate(expression[2])
+        if kind == 'not':
+            return set(self.series) - self._evaluate(expression[1])
+        if kind == 'has':
+            result = set()
+            for ids in self.postings.get(expression[1], {}).values():
+                result |= ids
+            return result
+        return self._lookup(expression[1], expression[2])
+
+    def select(self, selector):
+        """Series ids matching a selector string or parsed expression"""
+        expression = parse_selector(selector) if isinstance(selector, str) or selector is None else selector
+        with self._lock:
+            return self._evaluate(expression)
+
+    def describe(self, series_ids):
+        with self._lock:
+            return [{'series': series_id, 'labels': dict(self.series[series_id])}
+                    for series_id in sorted(series_ids) if series_id in self.series]
+
+    def label_values(self, label):
+        with self._lock:
+            return {value: len(ids) for value, ids in sorted(self.postings.get(label, {}).items())}
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'series': len(self.series),
+                'resources': len(self.resources),
+                'labels': len(self.postings),
+                'postings': sum(len(values) for values in self.postings.values()),
+                **self.stats
+            }
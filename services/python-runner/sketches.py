@@ -0,0 +1,162 @@
+"""
+Quantile Sketches for the Python Runner
+DDSketch: a mergeable quantile sketch with relative-error guarantees. Values
+are counted in logarithmically sized bins, so any quantile is within
+`relative_accuracy` of the exact value, two sketches with the same accuracy
+merge by adding bin counts (across time buckets, regions or accounts), and
+memory is bounded by `max_bins` however many values were added. Serialized
+sketches are a few dozen numbers for a typical hour of datapoints.
+
+Reference: Masson, Rim, Lee - "DDSketch: A Fast and Fully-Mergeable Quantile
+Sketch with Relative-Error Guarantees" (VLDB 2019).
+"""
+
+import math
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+# Magnitudes below this are counted as zero
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class DDSketch:
+    __slots__ = ('relative_accuracy', 'max_bins', 'gamma', '_log_gamma', 'positive', 'negative',
+                 'zero_count', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_bins=DEFAULT_MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}   # bin index -> count
+        self.negative = {}   # bin index of |value| -> count
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, index):
+        # Midpoint (in relative terms) of the bin's (gamma^(i-1), gamma^i] range
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, weight=1):
+        value = float(value)
+        if math.isnan(value):
+            return
+        if value > MIN_INDEXABLE_VALUE:
+            index = self._index(value)
+            self.positive[index] = self.positive.get(index, 0) + weight
+            self._collapse(self.positive)
+        elif value < -MIN_INDEXABLE_VALUE:
+            index = self._index(-value)
+            self.negative[index] = self.negative.get(index, 0) + weight
+            self._collapse(self.negative)
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.sum += value * weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def _collapse(self, bins):
+        """Fold the smallest-magnitude bins together once there are more than max_bins"""
+        if len(bins) <= self.max_bins:
+            return
+        ordered = sorted(bins)
+        excess = ordered[:len(bins) - self.max_bins + 1]
+        total = sum(bins.pop(index) for index in excess)
+        bins[excess[-1]] = total
+
+    def merge(self, other):
+        """Add another sketch's counts into this one; both must use the same accuracy"""
+        if other.count == 0:
+            return self
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for source, target in ((other.positive, self.positive), (other.negative, self.negative)):
+            for index, count in source.items():
+                target[index] = target.get(index, 0) + count
+            self._collapse(target)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), within relative_accuracy; None for an empty sketch"""
+        if self.count == 0:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        rank = q * (self.count - 1)
+
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return max(-self._value(index), self.min)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else None
+
+    @staticmethod
+    def _dump_bins(bins):
+        # Dense [offset, counts...] when the bins are mostly contiguous, else [[index, count], ...]
+        if not bins:
+            return []
+        low, high = min(bins), max(bins)
+        if high - low + 1 <= 2 * len(bins):
+            return [low] + [bins.get(index, 0) for index in range(low, high + 1)]
+        return [[index, count] for index, count in sorted(bins.items())]
+
+    @staticmethod
+    def _load_bins(data):
+        if not data:
+            return {}
+        if isinstance(data[0], list):
+            return {index: count for index, count in data}
+        return {data[0] + offset: count for offset, count in enumerate(data[1:]) if count}
+
+    def to_dict(self):
+        return {
+            'a': self.relative_accuracy,
+            'n': self.count,
+            's': self.sum,
+            'lo': self.min if self.count else None,
+            'hi': self.max if self.count else None,
+            'z': self.zero_count,
+            'p': self._dump_bins(self.positive),
+            'm': self._dump_bins(self.negative)
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_bins=DEFAULT_MAX_BINS):
+        sketch = cls(data.get('a', DEFAULT_RELATIVE_ACCURACY), max_bins)
+        sketch.count = data.get('n', 0)
+        sketch.sum = data.get('s', 0.0)
+        sketch.min = data['lo'] if data.get('lo') is not None else math.inf
+        sketch.max = data['hi'] if data.get('hi') is not None else -math.inf
+        sketch.zero_count = data.get('z', 0)
+        sketch.positive = cls._load_bins(data.get('p'))
+        sketch.negative = cls._load_bins(data.get('m'))
+        return sketch
+
+    def __len__(self):
+        return len(self.positive) + len(self.negative) + (1 if self.zero_count else 0)
@@ -0,0 +1,414 @@
+"""
+Embedded Time-Series Store for the Python Runner
+Keeps a recent window of collected datapoints on local disk as
+memory-mapped, column-oriented segments per series (an int64 timestamp
+column and a float64 value column). A per-series time index of segment
+bounds makes range reads a bisect plus a searchsorted, and reads return
+NumPy views straight into the mapped files.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger('TimeSeriesStore')
+
+DEFAULT_SEGMENT_CAPACITY = 1024  # ~3.5 days of 5-minute points
+DEFAULT_WINDOW_SECONDS = 7 * 86400
+DEFAULT_MAX_OPEN_SERIES = 2048  # every mapped segment holds a file descriptor
+DEFAULT_RETENTION_SWEEP_SECONDS = 3600
+
+AGGREGATIONS = ('avg', 'min', 'max', 'sum', 'count', 'last')
+
+
+class Segment:
+    """Fixed-capacity columnar segment: [timestamps int64 x capacity][values float64 x capacity]"""
+
+    def __init__(self, path, capacity, create=False):
+        self.path = path
+        self.capacity = capacity
+        if create:
+            with open(path, 'wb') as f:
+                f.truncate(capacity * 16)
+        self._mmap = np.memmap(path, dtype=np.uint8, mode='r+', shape=(capacity * 16,))
+        self.timestamps = self._mmap[:capacity * 8].view(np.int64)
+        self.values = self._mmap[capacity * 8:].view(np.float64)
+        # Epoch timestamps are always positive, so the filled prefix is the non-zero part
+        self.count = int(np.count_nonzero(self.timestamps))
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    @property
+    def first_timestamp(self):
+        return int(self.timestamps[0]) if self.count else None
+
+    @property
+    def last_timestamp(self):
+        return int(self.timestamps[self.count - 1]) if self.count else None
+
+    def append(self, timestamps, values):
+        n = min(len(timestamps), self.capacity - self.count)
+        self.timestamps[self.count:self.count + n] = timestamps[:n]
+        self.values[self.count:self.count + n] = values[:n]
+        self.count += n
+        return n
+
+    def slice(self, start, end):
+        """Zero-copy views of the points with start <= ts <= end"""
+        ts = self.timestamps[:self.count]
+        lo = int(np.searchsorted(ts, start, side='left'))
+        hi = int(np.searchsorted(ts, end, side='right'))
+        return ts[lo:hi], self.values[lo:hi]
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        self.flush()
+        # The mapping itself is released once no views handed out by read() remain
+        self._mmap = self.timestamps = self.values = None
+
+
+class SeriesStore:
+    """Ordered segments of one series plus the index of their start timestamps"""
+
+    def __init__(self, directory, capacity):
+        self.directory = directory
+        self.capacity = capacity
+        self.segments = []
+        self.starts = []
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory), key=lambda n: int(n.split('.')[0]) if n[0].isdigit() else -1):
+            if name.endswith('.seg'):
+                segment = Segment(os.path.join(directory, name), capacity)
+                if segment.count:
+                    self.segments.append(segment)
+                    self.starts.append(segment.first_timestamp)
+                else:
+                    segment.close()
+                    os.remove(segment.path)
+
+    @property
+    def last_timestamp(self):
+        return self.segments[-1].last_timestamp if self.segments else None
+
+    @property
+    def point_count(self):
+        return sum(segment.count for segment in self.segments)
+
+    def append(self, timestamps, values):
+        offset = 0
+        while offset < len(timestamps):
+            if not self.segments or self.segments[-1].full:
+                path = os.path.join(self.directory, f"{int(timestamps[offset])}.seg")
+                self.segments.append(Segment(path, self.capacity, create=True))
+                self.starts.append(int(timestamps[offset]))
+            offset += self.segments[-1].append(timestamps[offset:], values[offset:])
+
+    def read(self, start, end):
+        """Views into every segment overlapping [start, end]"""
+        first = max(0, bisect_right(self.starts, start) - 1)
+        parts = []
+        for segment in self.segments[first:]:
+            if segment.first_timestamp > end:
+                break
+            ts, values = segment.slice(start, end)
+            if len(ts):
+                parts.append((ts, values))
+        return parts
+
+    def expire(self, cutoff):
+        """Drop whole segments that end before the cutoff"""
+        removed = 0
+        while len(self.segments) > 1 and self.segments[0].last_timestamp < cutoff:
+            segment = self.segments.pop(0)
+            self.starts.pop(0)
+            segment.close()
+            os.remove(segment.path)
+            removed += 1
+        return removed
+
+    def flush(self):
+        if self.segments:
+            self.segments[-1].flush()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    @staticmethod
+    def newest_timestamp(directory, capacity):
+        """Last stored timestamp of a closed series, reading only its newest non-empty segment"""
+        try:
+            names = [n for n in os.listdir(directory) if n.endswith('.seg') and n[0].isdigit()]
+        except FileNotFoundError:
+            return None
+        for name in sorted(names, key=lambda n: int(n.split('.')[0]), reverse=True):
+            segment = Segment(os.path.join(directory, name), capacity)
+            last = segment.last_timestamp
+            segment.close()
+            if last is not None:
+                return last
+        return None
+
+
+def downsample(timestamps, values, step, aggregation='avg'):
+    """Aggregate points into step-aligned buckets; returns (bucket_starts, aggregated_values)"""
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {aggregation}")
+    if len(timestamps) == 0:
+        return timestamps, values
+
+    buckets = timestamps - (timestamps % int(step))
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    if aggregation == 'avg':
+        sums = np.add.reduceat(values, starts)
+        counts = np.diff(np.append(starts, len(values)))
+        result = sums / counts
+    elif aggregation == 'sum':
+        result = np.add.reduceat(values, starts)
+    elif aggregation == 'min':
+        result = np.minimum.reduceat(values, starts)
+    elif aggregation == 'max':
+        result = np.maximum.reduceat(values, starts)
+    elif aggregation == 'count':
+        result = np.diff(np.append(starts, len(values))).astype(np.float64)
+    else:
+        result = values[np.append(starts[1:], len(values)) - 1]
+    return buckets[starts], result
+
+
+class TimeSeriesStore:
+    def __init__(self, directory=None, window_seconds=None, segment_capacity=None, max_open_series=None,
+                 retention_sweep_seconds=None, on_series_dropped=None):
+        self.directory = directory or os.path.join(os.getenv('METRICS_DATA_DIR', '/app/data'), 'tsdb')
+        self.window_seconds = int(window_seconds or os.getenv('TSDB_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS))
+        self.segment_capacity = int(segment_capacity or os.getenv('TSDB_SEGMENT_CAPACITY', DEFAULT_SEGMENT_CAPACITY))
+        self.max_open_series = int(max_open_series or os.getenv('TSDB_MAX_OPEN_SERIES', DEFAULT_MAX_OPEN_SERIES))
+        self.retention_sweep_seconds = int(retention_sweep_seconds or os.getenv(
+            'TSDB_RETENTION_SWEEP_SECONDS', DEFAULT_RETENTION_SWEEP_SECONDS))
+        # Called as on_series_dropped(keys) after retention removed whole series
+        self.on_series_dropped = on_series_dropped
+        self._last_sweep = 0.0
+
+        self._lock = threading.RLock()
+        self._series = OrderedDict()
+        self.catalog = {}
+        self.stats = {
+            'points_written': 0,
+            'points_skipped_duplicate': 0,
+            'segments_expired': 0,
+            'series_dropped': 0
+        }
+        self._load_catalog()
+
+    @staticmethod
+    def _series_dir_name(key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+    def _catalog_path(self):
+        return os.path.join(self.directory, 'catalog.json')
+
+    def _load_catalog(self):
+        try:
+            with open(self._catalog_path()) as f:
+                self.catalog = json.load(f)
+        except FileNotFoundError:
+            self.catalog = {}
+        except Exception as e:
+            logger.error(f"Failed to load time-series catalog: {e}")
+            self.catalog = {}
+
+    def _save_catalog(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._catalog_path()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.catalog, f)
+        os.replace(tmp_path, self._catalog_path())
+
+    def _cutoff(self):
+        return int(time.time()) - self.window_seconds
+
+    def _get_series(self, key, create=False):
+        store = self._series.get(key)
+        if store is not None:
+            self._series.move_to_end(key)
+        elif create or key in self.catalog:
+            directory = os.path.join(self.directory, self._series_dir_name(key))
+            store = SeriesStore(directory, self.segment_capacity)
+            # Closed series miss the per-append expiry, so they are trimmed as they are opened
+            self.stats['segments_expired'] += store.expire(self._cutoff())
+            self._series[key] = store
+            # Unmap the least recently used series to bound open file descriptors
+            while len(self._series) > self.max_open_series:
+                _, evicted = self._series.popitem(last=False)
+                evicted.close()
+        return store
+
+    def append(self, key, timestamps, values, metadata=None):
+        """Append points of one series; points not newer than the last stored one are skipped"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+
+        with self._lock:
+            if key not in self.catalog:
+                self.catalog[key] = metadata or {}
+            store = self._get_series(key, create=True)
+            last = store.last_timestamp
+            if last is not None:
+                newer = timestamps > last
+                self.stats['points_skipped_duplicate'] += int(len(timestamps) - newer.sum())
+                timestamps, values = timestamps[newer], values[newer]
+            # Drop duplicate timestamps inside the batch itself
+            if len(timestamps) > 1:
+                unique = np.concatenate(([True], timestamps[1:] != timestamps[:-1]))
+                self.stats['points_skipped_duplicate'] += int(len(timestamps) - unique.sum())
+                timestamps, values = timestamps[unique], values[unique]
+            if len(timestamps):
+                store.append(timestamps, values)
+                self.stats['points_written'] += len(timestamps)
+            return len(timestamps)
+
+    def append_metrics(self, metrics, key_func, timestamp_func):
+        """Group collector datapoint dicts by series and append them"""
+        grouped = {}
+        for metric in metrics:
+            key = key_func(metric)
+            entry = grouped.get(key)
+            if entry is None:
+                entry = grouped[key] = ([], [], metric)
+            entry[0].append(int(timestamp_func(metric['timestamp'])))
+            entry[1].append(float(metric['metricValue']))
+
+        written = 0
+        with self._lock:
+            new_series = [key for key in grouped if key not in self.catalog]
+            for key, (timestamps, values, sample) in grouped.items():
+                metadata = {
+                    name: sample.get(name)
+                    for name in ('accountId', 'region', 'service', 'resourceId', 'resourceName',
+                                 'metricName', 'metricUnit', 'statistic')
+                }
+                written += self.append(key, timestamps, values, metadata)
+            self.expire()
+            for store in self._series.values():
+                store.flush()
+            if new_series:
+                self._save_catalog()
+        return written
+
+    def read(self, key, start, end):
+        """
+        Points of one series in [start, end] as (timestamps, values) arrays.
+        Reads within a single segment are zero-copy views of the mapped file.
+        """
+        with self._lock:
+            store = self._get_series(key)
+            if store is None:
+                return None
+            parts = store.read(int(start), int(end))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def query(self, key, start, end, step=None, aggregation='avg'):
+        """Range read with optional step-aligned downsampling"""
+        result = self.read(key, start, end)
+        if result is None:
+            return None
+        timestamps, values = result
+        if step:
+            timestamps, values = downsample(timestamps, values, step, aggregation)
+        return timestamps, values
+
+    def covers(self, start):
+        """Whether the recent window still holds data as old as start"""
+        return start >= time.time() - self.window_seconds
+
+    def series_keys(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                return list(self.catalog)
+            return [key for key, meta in self.catalog.items() if predicate(meta)]
+
+    def expire(self, force=False):
+        """
+        Drop segments of open series that fell out of the window (closed series
+        are trimmed when next opened). Every retention_sweep_seconds, series
+        whose newest point is out of the window are dropped altogether, open or
+        not; returns the dropped keys.
+        """
+        cutoff = self._cutoff()
+        with self._lock:
+            for store in self._series.values():
+                self.stats['segments_expired'] += store.expire(cutoff)
+            if not force and time.time() - self._last_sweep < self.retention_sweep_seconds:
+                return []
+            self._last_sweep = time.time()
+            stale = []
+            for key in self.catalog:
+                store = self._series.get(key)
+                if store is not None:
+                    newest = store.last_timestamp
+                else:
+                    newest = SeriesStore.newest_timestamp(
+                        os.path.join(self.directory, self._series_dir_name(key)), self.segment_capacity)
+                if newest is None or newest < cutoff:
+                    stale.append(key)
+            for key in stale:
+                self._drop(key)
+            if stale:
+                self._save_catalog()
+                self.stats['series_dropped'] += len(stale)
+                logger.info(f"Retention dropped {len(stale)} series with no points in the last "
+                            f"{self.window_seconds}s")
+        if stale and self.on_series_dropped:
+            self.on_series_dropped(stale)
+        return stale
+
+    def _drop(self, key):
+        store = self._series.pop(key, None)
+        if store is not None:
+            store.close()
+        self.catalog.pop(key, None)
+        shutil.rmtree(os.path.join(self.directory, self._series_dir_name(key)), ignore_errors=True)
+
+    def drop_series(self, key):
+        with self._lock:
+            self._drop(key)
+            self._save_catalog()
+        if self.on_series_dropped:
+            self.on_series_dropped([key])
+
+    def get_status(self):
+        with self._lock:
+            open_series = list(self._series.values())
+            return {
+                'directory': self.directory,
+                'window_seconds': self.window_seconds,
+                'series': len(self.catalog),
+                'open_series': len(open_series),
+                'segments': sum(len(s.segments) for s in open_series),
+                'points': sum(s.point_count for s in open_series),
+                **self.stats
+            }
+
+    def close(self):
+        with self._lock:
+            for store in self._series.values():
+                store.close()
+            self._series = OrderedDict()